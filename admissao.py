@@ -0,0 +1,196 @@
+"""
+Controle de admissão: limite de taxa por CPF/IP e descarte de carga
+
+Dois mecanismos independentes, ambos em memória e por processo (worker):
+
+- Limite de taxa: um balde de tokens por chave (CPF ou IP do cliente) em cada
+  grupo de endpoints, com orçamento "requisições/segundos". Consultar um balde é
+  um acesso a dict mais a reposição proporcional ao tempo decorrido, O(1); os
+  baldes ficam em um LRU limitado a `max_chaves`, e o balde descartado volta
+  cheio, como uma chave que ficou tempo bastante sem requisições. Quem passa do
+  orçamento recebe 429 com `Retry-After` até o próximo token.
+- Descarte de carga: o middleware recusa com 503 as requisições dos caminhos
+  protegidos enquanto há requisições demais em andamento no processo ou enquanto
+  o event loop está atrasado (medido por uma tarefa que dorme em intervalos fixos
+  e compara o despertar com o esperado). Saúde e métricas continuam respondendo.
+
+Tudo roda na thread do event loop, sem locks, como as métricas.
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict
+
+from respostas import serializar
+
+
+def interpretar_orcamento(texto):
+    """"requisições/segundos" -> (capacidade, tokens por segundo); vazio ou "0" -> None"""
+    texto = (texto or "").strip()
+    if not texto or texto == "0":
+        return None
+    requisicoes, _, segundos = texto.partition("/")
+    capacidade = int(requisicoes)
+    periodo = float(segundos or 1)
+    if capacidade <= 0 or periodo <= 0:
+        raise ValueError(f"Orçamento inválido: {texto!r} (use requisições/segundos)")
+    return capacidade, capacidade / periodo
+
+
+class LimitadorTaxa:
+    """Baldes de tokens por chave: `capacidade` requisições de rajada, repostas a `taxa` por segundo"""
+
+    def __init__(self, capacidade, taxa, max_chaves=100000):
+        self.capacidade = capacidade
+        self.taxa = taxa
+        self.max_chaves = max_chaves
+        self._baldes = OrderedDict()   # chave -> [tokens, instante da última reposição]
+
+    def __len__(self):
+        return len(self._baldes)
+
+    def espera(self, chave, agora):
+        """Segundos até haver um token para a chave (0 se já há)"""
+        balde = self._baldes.get(chave)
+        if balde is None:
+            return 0.0
+        tokens = min(self.capacidade, balde[0] + (agora - balde[1]) * self.taxa)
+        balde[0], balde[1] = tokens, agora
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.taxa
+
+    def consumir(self, chave, agora):
+        """Gasta um token da chave; chamado depois de `espera` devolver 0"""
+        balde = self._baldes.get(chave)
+        if balde is None:
+            self._baldes[chave] = [self.capacidade - 1, agora]
+            while len(self._baldes) > self.max_chaves:
+                self._baldes.popitem(last=False)
+        else:
+            balde[0] -= 1
+            self._baldes.move_to_end(chave)
+
+
+def criar_limitadores(orcamentos, max_chaves=100000):
+    """{grupo: {tipo de chave: "requisições/segundos"}} -> {grupo: {tipo de chave: LimitadorTaxa}}
+
+    Orçamentos vazios ficam de fora: aquele tipo de chave não é limitado no grupo.
+    """
+    limitadores = {}
+    for grupo, por_chave in orcamentos.items():
+        for tipo, texto in por_chave.items():
+            orcamento = interpretar_orcamento(texto)
+            if orcamento is not None:
+                limitadores.setdefault(grupo, {})[tipo] = LimitadorTaxa(*orcamento, max_chaves)
+    return limitadores
+
+
+def admitir(limitadores, chaves, agora=None):
+    """Consome um token de cada limitador do grupo se todos tiverem; senão, segundos de espera
+
+    `chaves` dá a chave de cada tipo ({"cpf": ..., "ip": ...}). Nada é consumido
+    quando algum balde está vazio: a requisição recusada pelo IP não gasta o
+    orçamento do CPF, e vice-versa.
+    """
+    if not limitadores:
+        return 0.0
+    agora = agora if agora is not None else time.monotonic()
+    espera = max(limitador.espera(chaves[tipo], agora) for tipo, limitador in limitadores.items())
+    if espera == 0:
+        for tipo, limitador in limitadores.items():
+            limitador.consumir(chaves[tipo], agora)
+    return espera
+
+
+def retry_after(espera):
+    """Valor do cabeçalho Retry-After (segundos inteiros, no mínimo 1)"""
+    return str(max(1, math.ceil(espera)))
+
+
+class ControleCarga:
+    """Requisições em andamento e atraso do event loop; decide quando descartar
+
+    `max_em_andamento` e `limite_atraso` (segundos) iguais a 0 desligam cada critério.
+    O atraso é uma média móvel exponencial, para um único despertar atrasado não
+    derrubar uma rajada inteira de requisições.
+    """
+
+    def __init__(self, max_em_andamento=0, limite_atraso=0.0, intervalo=0.05, retry_after=1):
+        self.max_em_andamento = max_em_andamento
+        self.limite_atraso = limite_atraso
+        self.intervalo = intervalo
+        self.retry_after = retry_after
+        self.em_andamento = 0
+        self.atraso = 0.0
+
+    def sobrecarregado(self):
+        return ((self.max_em_andamento > 0 and self.em_andamento >= self.max_em_andamento)
+                or (self.limite_atraso > 0 and self.atraso > self.limite_atraso))
+
+    async def monitorar(self):
+        """Mede o atraso do event loop até ser cancelada"""
+        while True:
+            inicio = time.perf_counter()
+            await asyncio.sleep(self.intervalo)
+            atraso = max(0.0, time.perf_counter() - inicio - self.intervalo)
+            self.atraso += 0.2 * (atraso - self.atraso)
+
+    def estatisticas(self):
+        return {
+            "em_andamento": self.em_andamento,
+            "max_em_andamento": self.max_em_andamento,
+            "atraso_loop_ms": round(self.atraso * 1000, 3),
+            "limite_atraso_ms": self.limite_atraso * 1000,
+        }
+
+
+class MiddlewareDescarte:
+    """Middleware ASGI: conta as requisições em andamento e descarta as protegidas sob sobrecarga
+
+    `protegidos` mapeia prefixos de caminho para o grupo usado no rótulo das
+    métricas de admissão; os demais caminhos nunca são descartados, mas entram
+    na contagem de requisições em andamento.
+    """
+
+    def __init__(self, app, controle, metricas, protegidos):
+        self.app = app
+        self.controle = controle
+        self.metricas = metricas
+        self.protegidos = protegidos
+        corpo = serializar({"detail": "Servidor sobrecarregado, tente novamente em instantes"})
+        self._inicio_503 = {
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(corpo)).encode()),
+                (b"retry-after", str(controle.retry_after).encode()),
+            ],
+        }
+        self._corpo_503 = {"type": "http.response.body", "body": corpo}
+
+    def _grupo(self, caminho):
+        for prefixo, grupo in self.protegidos.items():
+            if caminho.startswith(prefixo):
+                return grupo
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        controle = self.controle
+        if controle.sobrecarregado():
+            grupo = self._grupo(scope["path"])
+            if grupo is not None:
+                self.metricas.contar_admissao(grupo, "descartada")
+                await send(self._inicio_503)
+                await send(self._corpo_503)
+                return
+
+        controle.em_andamento += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controle.em_andamento -= 1
@@ -4,24 +4,110 @@ API Bancária com FastAPI e JWT
 
 import os
 import json
+import base64
+import csv
+import io
+import asyncio
+import functools
+import random
+import secrets
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
-from typing import Optional, List
+from decimal import Decimal
+from typing import Literal, Optional, List
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, status
 from fastapi.security import HTTPBearer
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 import jwt
 
+from admissao import ControleCarga, MiddlewareDescarte, admitir, criar_limitadores, retry_after
+from armazenamento import CAMPOS_ESTADO_CONTA, ArmazenamentoJSON, ConflitoConcorrencia, CPFDuplicado
+from cache_clientes import CacheClientes
+from cache_tokens import CacheTokens
+from concorrencia import GerenciadorLocks, executar_em_thread
+from idempotencia import CacheIdempotencia, ChaveReutilizada, gravar_resposta, resposta_gravada
+from metricas import TIPO_CONTEUDO, Metricas, MiddlewareMetricas, medir_metodos
+from perfilamento import MiddlewarePerfil, Perfilador, chave_confere
+from respostas import RespostaJSON, serializar
+from senhas import FilaCheia, PoolSenhas, eh_hash
+from transacoes import (
+    CODIGOS_TIPO, MAX_CENTAVOS, SINAIS, Transacao, formatar_data, para_centavos, para_reais
+)
+
 # --- Configurações ---
 ARQUIVO_USUARIOS = "usuarios.json"
 ARQUIVO_CONTAS = "contas.json"
+ARQUIVO_JOURNAL = "journal.jsonl"
 SECRET_KEY = "sua-chave-secreta-super-segura"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+PROCESSOS_SENHA = int(os.getenv("PROCESSOS_SENHA", str(os.cpu_count() or 1)))
+FILA_SENHA = int(os.getenv("FILA_SENHA", "64"))
+CUSTO_BCRYPT = int(os.getenv("CUSTO_BCRYPT", "12"))
+RETRY_AFTER_SEGUNDOS = 1
+TAMANHO_CACHE_TOKENS = int(os.getenv("TAMANHO_CACHE_TOKENS", "10000"))  # 0 desativa o cache
+TTL_CACHE_TOKENS = float(os.getenv("TTL_CACHE_TOKENS", "0"))  # 0 = até o exp do token
+# Logouts gravados por CPF; acima disso o próximo logout revoga todas as sessões do CPF
+MAX_TOKENS_REVOGADOS = int(os.getenv("MAX_TOKENS_REVOGADOS", "100"))
+TAMANHO_CACHE_CLIENTES = int(os.getenv("TAMANHO_CACHE_CLIENTES", "10000"))  # 0 desativa o cache
+TAMANHO_CACHE_IDEMPOTENCIA = int(os.getenv("TAMANHO_CACHE_IDEMPOTENCIA", "10000"))  # 0 desativa o cache
+TTL_IDEMPOTENCIA = float(os.getenv("TTL_IDEMPOTENCIA", "86400"))  # Segundos em que uma chave é lembrada
+MAX_CHAVES_IDEMPOTENCIA = int(os.getenv("MAX_CHAVES_IDEMPOTENCIA", "20"))  # Chaves gravadas por conta
 AGENCIA = "0001"
 LIMITE_VALOR_SAQUE = 500
 LIMITE_SAQUES = 3
+MAX_OPERACOES_LOTE = 10000
+# Maior valor por operação, em reais: um lote inteiro deles ainda cabe no saldo int64 em centavos
+VALOR_MAXIMO = Decimal("1000000000000.00")
+PAGINA_EXPORTACAO = 1000  # Transações lidas do armazenamento por vez na exportação do extrato
+# Formatos de /api/v1/extrato/exportar: tipo de conteúdo e extensão do arquivo
+FORMATOS_EXPORTACAO = {"csv": ("text/csv; charset=utf-8", "csv"),
+                       "ndjson": ("application/x-ndjson", "ndjson")}
+COLUNAS_EXPORTACAO = ("data", "tipo", "valor", "saldo")
+TENTATIVAS_CONFLITO = 20  # Gravações recusadas por alteração concorrente de outro worker
+LIMITE_SAQUES_HORA = int(os.getenv("LIMITE_SAQUES_HORA", "0"))  # 0 = sem limite por hora
+# Janelas de contagem de saques: baldes do calendário local (o dia e a hora cheia),
+# não janelas deslizantes. A chave do período atual reinicia o contador: um saque às
+# 23:59 e outro às 00:00 contam em dias diferentes.
+FORMATOS_JANELA = {"dia": "%d-%m-%Y", "hora": "%d-%m-%Y %H"}
+INTERVALO_FLUSH = float(os.getenv("INTERVALO_FLUSH", "30.0"))
+LIMITE_JOURNAL = int(os.getenv("LIMITE_JOURNAL", "10000"))
+TIPO_ARMAZENAMENTO = os.getenv("ARMAZENAMENTO", "json")
+URL_BANCO = os.getenv("URL_BANCO", "sqlite+aiosqlite:///banco.db")
+TAMANHO_POOL = int(os.getenv("TAMANHO_POOL", "5"))
+THREADS_IO = int(os.getenv("THREADS_IO", "4"))
+JANELA_COMMIT_MS = float(os.getenv("JANELA_COMMIT_MS", "2"))
+MAX_LOTE_COMMIT = int(os.getenv("MAX_LOTE_COMMIT", "256"))
+# Backend JSON: transações com mais de N dias vão para o arquivo frio (0 = tudo em memória)
+ARQUIVAR_APOS_DIAS = float(os.getenv("ARQUIVAR_APOS_DIAS", "0"))
+INTERVALO_ARQUIVAMENTO = float(os.getenv("INTERVALO_ARQUIVAMENTO", "3600"))
+DIRETORIO_ARQUIVO = os.getenv("DIRETORIO_ARQUIVO", "arquivo_frio")
+# Métodos do armazenamento cronometrados como fases internas em /api/v1/metrics
+LEITURAS_ARMAZENAMENTO = ("obter_usuario", "obter_conta", "contar_contas", "cpf_por_numero",
+                          "listar_transacoes", "paginar_transacoes", "saldo_em", "carregar_usuarios",
+                          "carregar_contas")
+GRAVACOES_ARMAZENAMENTO = ("registrar_cliente", "atualizar_usuario", "registrar_transacao",
+                           "registrar_transacoes", "registrar_transferencia", "salvar_usuarios",
+                           "salvar_contas")
+PERFIL_AMOSTRAGEM = int(os.getenv("PERFIL_AMOSTRAGEM", "0"))  # 1 a cada N requisições; 0 = desligado
+PERFIL_DIRETORIO = os.getenv("PERFIL_DIRETORIO", "perfis")
+PERFIL_MAX_ARQUIVOS = int(os.getenv("PERFIL_MAX_ARQUIVOS", "200"))
+CHAVE_ADMIN = os.getenv("CHAVE_ADMIN")  # Habilita X-Perfilar e os endpoints de administração
+# Limite de taxa por grupo de endpoints e por chave, em "requisições/segundos" (vazio = sem limite)
+ORCAMENTOS_TAXA = {
+    "login": {"cpf": os.getenv("LIMITE_LOGIN_CPF", ""), "ip": os.getenv("LIMITE_LOGIN_IP", "")},
+    "transacoes": {"cpf": os.getenv("LIMITE_TRANSACOES_CPF", ""), "ip": os.getenv("LIMITE_TRANSACOES_IP", "")},
+}
+MAX_CHAVES_TAXA = int(os.getenv("MAX_CHAVES_TAXA", "100000"))  # Baldes mantidos por limitador (LRU)
+# Descarte de carga nos caminhos protegidos (0 = desligado)
+MAX_EM_ANDAMENTO = int(os.getenv("MAX_EM_ANDAMENTO", "0"))
+LIMITE_ATRASO_LOOP_MS = float(os.getenv("LIMITE_ATRASO_LOOP_MS", "0"))
+# Prefixos de caminho sujeitos ao descarte e o grupo de cada um nas métricas de admissão
+CAMINHOS_PROTEGIDOS = {"/api/v1/auth/login": "login", "/api/v1/transacoes/": "transacoes"}
 
 # --- Modelos ---
 
@@ -37,7 +123,13 @@ class UsuarioLogin(BaseModel):
     senha: str
 
 class TransacaoRequest(BaseModel):
-    valor: float = Field(..., gt=0)
+    valor: Decimal = Field(..., gt=0, le=VALOR_MAXIMO, decimal_places=2)
+
+class TransferenciaRequest(BaseModel):
+    valor: Decimal = Field(..., gt=0, le=VALOR_MAXIMO, decimal_places=2)
+    numero_conta_destino: Optional[str] = Field(None, description="Número da conta de destino")
+    cpf_destino: Optional[str] = Field(None, min_length=11, max_length=11,
+                                       description="CPF do titular de destino (alternativa ao número)")
 
 class TransacaoResponse(BaseModel):
     tipo: str
@@ -49,7 +141,35 @@ class ExtratoResponse(BaseModel):
     agencia: str
     titular: str
     saldo: float
+    saldo_inicial: float = Field(..., description="Saldo antes do início do período consultado")
+    saldo_final: float = Field(..., description="Saldo ao fim do período consultado")
     transacoes: List[TransacaoResponse]
+    proximo_cursor: Optional[str] = None
+
+class SaldoResponse(BaseModel):
+    agencia: str
+    numero_conta: str
+    titular: str
+    saldo: float
+    limite: float
+    em: Optional[str] = Field(None, description="Data de referência, quando o saldo é histórico")
+
+class PerfilResponse(BaseModel):
+    nome: Optional[str]
+    cpf: str
+    endereco: Optional[str]
+    data_nascimento: Optional[str]
+    data_criacao: Optional[str]
+    numero_conta: str
+    agencia: str
+
+class OperacaoLote(BaseModel):
+    tipo: Literal["deposito", "saque"]
+    valor: Decimal = Field(..., gt=0, le=VALOR_MAXIMO, decimal_places=2)
+
+class LoteRequest(BaseModel):
+    operacoes: List[OperacaoLote] = Field(..., min_length=1, max_length=MAX_OPERACOES_LOTE)
+    atomico: bool = Field(True, description="Tudo ou nada; se falso, aplica apenas as operações válidas")
 
 class TokenResponse(BaseModel):
     access_token: str
@@ -58,64 +178,331 @@ class TokenResponse(BaseModel):
 
 # --- Persistência ---
 
-def carregar_usuarios():
-    if not os.path.exists(ARQUIVO_USUARIOS):
-        return {}
-    try:
-        with open(ARQUIVO_USUARIOS, 'r', encoding='utf-8') as f:
-            dados = json.load(f)
-            return dados if isinstance(dados, dict) else {}
-    except:
-        return {}
+metricas = Metricas()
 
-def salvar_usuarios(usuarios):
-    with open(ARQUIVO_USUARIOS, 'w', encoding='utf-8') as f:
-        json.dump(usuarios, f, indent=4, ensure_ascii=False)
+def criar_armazenamento(tipo: str):
+    if tipo == "sqlite":
+        # Importado sob demanda: SQLAlchemy só é necessário para este backend
+        from armazenamento_sqlite import ArmazenamentoSQLite
+        backend = ArmazenamentoSQLite(URL_BANCO, TAMANHO_POOL)
+    elif tipo == "json":
+        backend = ArmazenamentoJSON(
+            ARQUIVO_USUARIOS, ARQUIVO_CONTAS, ARQUIVO_JOURNAL,
+            INTERVALO_FLUSH, LIMITE_JOURNAL, THREADS_IO,
+            JANELA_COMMIT_MS / 1000, MAX_LOTE_COMMIT,
+            DIRETORIO_ARQUIVO, ARQUIVAR_APOS_DIAS * 86400, INTERVALO_ARQUIVAMENTO
+        )
+    else:
+        raise ValueError(f"Armazenamento desconhecido: {tipo}")
+    return instrumentar_armazenamento(backend)
 
-def carregar_contas():
-    if not os.path.exists(ARQUIVO_CONTAS):
-        return {}
-    try:
-        with open(ARQUIVO_CONTAS, 'r', encoding='utf-8') as f:
-            dados = json.load(f)
-            return dados if isinstance(dados, dict) else {}
-    except:
-        return {}
+def instrumentar_armazenamento(backend):
+    medir_metodos(backend, metricas, "armazenamento_leitura", LEITURAS_ARMAZENAMENTO)
+    medir_metodos(backend, metricas, "armazenamento_gravacao", GRAVACOES_ARMAZENAMENTO)
+    medir_metodos(backend, metricas, "checkpoint", ("checkpoint",))
+    backend.observar_commits(metricas.commit_lote, metricas.commit_latencia)
+    return backend
 
-def salvar_contas(contas):
-    with open(ARQUIVO_CONTAS, 'w', encoding='utf-8') as f:
-        json.dump(contas, f, indent=4, ensure_ascii=False)
+armazenamento = criar_armazenamento(TIPO_ARMAZENAMENTO)
+locks = GerenciadorLocks()
+cache_clientes = CacheClientes(TAMANHO_CACHE_CLIENTES)
+cache_idempotencia = CacheIdempotencia(TAMANHO_CACHE_IDEMPOTENCIA)
+
+async def obter_cliente(cpf: str):
+    """Visão do cliente (titular + conta); None se o usuário ou a conta não existe"""
+    visao = cache_clientes.obter(cpf)
+    if visao is not None:
+        return visao
+    # Sob o lock do CPF: um depósito não pode cair entre as leituras e o preenchimento
+    async with locks.bloquear(cpf):
+        conta = await armazenamento.obter_conta(cpf)
+        usuario = await armazenamento.obter_usuario(cpf)
+        if conta is None or usuario is None:
+            return None
+        return cache_clientes.guardar(cpf, usuario, conta)
 
 # --- Autenticação ---
 
-def criar_token(cpf: str):
-    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    payload = {"sub": cpf, "exp": expire}
+cache_tokens = CacheTokens(TAMANHO_CACHE_TOKENS, TTL_CACHE_TOKENS)
+pool_senhas = PoolSenhas(PROCESSOS_SENHA, FILA_SENHA, CUSTO_BCRYPT)
+limitadores_taxa = criar_limitadores(ORCAMENTOS_TAXA, MAX_CHAVES_TAXA)
+controle_carga = ControleCarga(MAX_EM_ANDAMENTO, LIMITE_ATRASO_LOOP_MS / 1000, retry_after=RETRY_AFTER_SEGUNDOS)
+
+def servidor_ocupado():
+    return HTTPException(
+        status_code=503,
+        detail="Servidor ocupado, tente novamente em instantes",
+        headers={"Retry-After": str(RETRY_AFTER_SEGUNDOS)}
+    )
+
+def limitar_taxa(grupo: str, cpf: str, request: Request):
+    """Recusa com 429 a requisição que esgotou o orçamento do CPF ou do IP no grupo de endpoints
+
+    A decisão fica no estado da requisição: a reexecução de repetir_em_conflito
+    não gasta outro token.
+    """
+    if getattr(request.state, "admitida", False):
+        return
+    ip = request.client.host if request.client else "desconhecido"
+    espera = admitir(limitadores_taxa.get(grupo), {"cpf": cpf, "ip": ip})
+    if espera > 0:
+        metricas.contar_admissao(grupo, "limitada")
+        raise HTTPException(
+            status_code=429,
+            detail="Muitas requisições, tente novamente em instantes",
+            headers={"Retry-After": retry_after(espera)}
+        )
+    metricas.contar_admissao(grupo, "admitida")
+    request.state.admitida = True
+
+def criar_token(cpf: str, versao: int = 0):
+    agora = datetime.now(timezone.utc)
+    expire = agora + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    # jti aleatório: dois logins no mesmo segundo recebem tokens distintos, revogados um a um
+    payload = {"sub": cpf, "iat": agora, "exp": expire, "ver": versao, "jti": secrets.token_urlsafe(16)}
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
-def verificar_token(credentials) -> str:
+def identificador_token(token: str, payload: dict) -> str:
+    """jti do token; tokens emitidos antes do jti são identificados por eles mesmos"""
+    return payload.get("jti") or token
+
+async def verificar_token(credentials) -> str:
+    with metricas.medir("verificar_token"):
+        return await _verificar_token(credentials)
+
+async def _verificar_token(credentials) -> str:
+    token = credentials.credentials
+    cpf = cache_tokens.obter(token)
+    if cpf is not None:
+        return cpf
+    
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         cpf = payload.get("sub")
         if not cpf:
             raise HTTPException(status_code=401, detail="Token inválido")
-        return cpf
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expirado")
     except:
         raise HTTPException(status_code=401, detail="Token inválido")
+    
+    jti = identificador_token(token, payload)
+    if cache_tokens.revogado(jti):
+        raise HTTPException(status_code=401, detail="Token revogado")
+    
+    # Tokens emitidos antes da última revogação de sessões do CPF deixam de valer,
+    # assim como os encerrados por logout (gravados no usuário, em qualquer worker)
+    usuario = await armazenamento.obter_usuario(cpf)
+    if (usuario is None or payload.get("ver", 0) != (usuario.get('versao_token') or 0)
+            or jti in (usuario.get('tokens_revogados') or {})):
+        raise HTTPException(status_code=401, detail="Token revogado")
+    
+    cache_tokens.guardar(token, cpf, payload["exp"], jti)
+    return cpf
+
+def limites_saque(conta: dict):
+    limites = {"dia": conta['limite_saques']}
+    if LIMITE_SAQUES_HORA:
+        limites["hora"] = LIMITE_SAQUES_HORA
+    return limites
 
-def contar_saques_dia(cpf: str, contas: dict):
-    if cpf not in contas:
-        return 0
-    conta = contas[cpf]
-    hoje = datetime.now().strftime("%d-%m-%Y")
-    return sum(1 for t in conta.get('historico_transacoes', [])
-               if t['tipo'] == 'Saque' and t['data'].startswith(hoje))
+def calcular_contadores_saque(historico, agora: datetime):
+    # Usado uma única vez por conta antiga, que ainda não tem contadores persistidos
+    contadores = {}
+    for janela, formato in FORMATOS_JANELA.items():
+        chave = agora.strftime(formato)
+        inicio = datetime.strptime(chave, formato)
+        fim = inicio + (timedelta(days=1) if janela == "dia" else timedelta(hours=1))
+        contadores[janela] = [chave, historico.contar(
+            "Saque", int(inicio.timestamp()), int(fim.timestamp()))]
+    return contadores
+
+def contar_saques(conta: dict, janela: str, agora: datetime):
+    """Saques da conta no dia (ou na hora cheia) do calendário de `agora`"""
+    chave, contagem = (conta.get('contadores_saque') or {}).get(janela, (None, 0))
+    return contagem if chave == agora.strftime(FORMATOS_JANELA[janela]) else 0
+
+def registrar_saque(conta: dict, agora: datetime):
+    contadores = {
+        janela: [agora.strftime(formato), contar_saques(conta, janela, agora) + 1]
+        for janela, formato in FORMATOS_JANELA.items()
+    }
+    conta['contadores_saque'] = contadores
+
+def conferir_saldo_maximo(conta: dict, centavos: int):
+    if conta['saldo_centavos'] + centavos > MAX_CENTAVOS:
+        raise HTTPException(status_code=400, detail="Operação excede o saldo máximo da conta")
+
+def aplicar_deposito(conta: dict, centavos: int, agora: datetime) -> Transacao:
+    conferir_saldo_maximo(conta, centavos)
+    conta['saldo_centavos'] += centavos
+    return Transacao("Deposito", centavos, int(agora.timestamp()))
+
+def aplicar_saque(conta: dict, centavos: int, agora: datetime) -> Transacao:
+    """Valida o saque contra saldo, limite por saque e limites por janela e o aplica"""
+    if conta['saldo_centavos'] < centavos:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Saldo insuficiente. Disponível: R$ {para_reais(conta['saldo_centavos']):.2f}"
+        )
+    
+    if centavos > conta['limite_centavos']:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Valor excede limite de R$ {para_reais(conta['limite_centavos']):.2f}"
+        )
+    
+    for janela, limite in limites_saque(conta).items():
+        if contar_saques(conta, janela, agora) >= limite:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Limite de {limite} saques por {janela} excedido"
+            )
+    
+    conta['saldo_centavos'] -= centavos
+    registrar_saque(conta, agora)
+    return Transacao("Saque", centavos, int(agora.timestamp()))
+
+async def preparar_contadores_saque(cpf: str, conta: dict, agora: datetime):
+    if conta.get('contadores_saque') is None:
+        conta['contadores_saque'] = calcular_contadores_saque(
+            await armazenamento.listar_transacoes(cpf), agora)
+
+def repetir_em_conflito(endpoint):
+    """Reexecuta o endpoint se outro worker alterou a conta entre a leitura e a gravação
+
+    O lock por CPF só vale dentro de um processo; entre workers quem detecta o
+    conflito é o armazenamento (ConflitoConcorrencia), e a operação é refeita
+    sobre a conta relida.
+    """
+    @functools.wraps(endpoint)
+    async def com_repeticao(*args, **kwargs):
+        for tentativa in range(TENTATIVAS_CONFLITO):
+            try:
+                return await endpoint(*args, **kwargs)
+            except ConflitoConcorrencia:
+                # Espera aleatória e crescente para os workers não colidirem em sincronia
+                await asyncio.sleep(random.uniform(0, 0.001 * 2 ** min(tentativa, 6)))
+        raise HTTPException(
+            status_code=409,
+            detail="Conta alterada concorrentemente, tente novamente",
+            headers={"Retry-After": str(RETRY_AFTER_SEGUNDOS)}
+        )
+    return com_repeticao
+
+def repeticao_idempotente(cpf: str, chave: str, impressao: str, conta: Optional[dict] = None):
+    """Resposta original de uma requisição repetida com a mesma Idempotency-Key, ou None
+
+    Sem `conta` consulta o cache do processo; com ela, as chaves gravadas na conta.
+    """
+    try:
+        if conta is None:
+            resposta = cache_idempotencia.obter(cpf, chave, impressao)
+        else:
+            resposta = resposta_gravada(conta, chave, impressao)
+    except ChaveReutilizada:
+        raise HTTPException(status_code=422, detail="Idempotency-Key já usada em outra requisição")
+    if resposta is None:
+        return None
+    return RespostaJSON(resposta, headers={"Idempotent-Replayed": "true"})
+
+def anotar_idempotencia(conta: dict, chave: Optional[str], impressao: str, resposta: dict):
+    """Grava a resposta na conta, para ser persistida com a transação; retorna a expiração"""
+    if not chave:
+        return None
+    expira = time.time() + TTL_IDEMPOTENCIA
+    gravar_resposta(conta, chave, impressao, resposta, expira, MAX_CHAVES_IDEMPOTENCIA)
+    return expira
+
+def codificar_cursor(valor) -> Optional[str]:
+    if valor is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(valor).encode()).decode()
+
+def decodificar_cursor(cursor: Optional[str]):
+    if cursor is None:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def transacoes_json(pagina):
+    """Transações no formato de TransacaoResponse, já em tipos JSON"""
+    return [
+        {"tipo": tipo, "valor": para_reais(valor_centavos), "data": formatar_data(ts)}
+        for tipo, valor_centavos, ts in pagina
+    ]
+
+async def exportar_transacoes(cpf: str, formato: str, desde: Optional[int], ate: Optional[int],
+                              saldo_inicial: int, request: Optional[Request] = None):
+    """Gera o extrato em pedaços de PAGINA_EXPORTACAO transações, com o saldo após cada uma
+
+    Só uma página fica em memória por vez, qualquer que seja o tamanho do histórico. Se o
+    cliente desconecta, a leitura do armazenamento para na página seguinte.
+    """
+    if formato == "csv":
+        yield (",".join(COLUNAS_EXPORTACAO) + "\r\n").encode()
+    saldo = saldo_inicial
+    cursor = None
+    while True:
+        if request is not None and await request.is_disconnected():
+            return
+        pagina, cursor = await armazenamento.paginar_transacoes(
+            cpf, desde=desde, ate=ate, cursor=cursor, limite=PAGINA_EXPORTACAO)
+        linhas = []
+        for tipo, valor_centavos, ts in pagina:
+            saldo += SINAIS[CODIGOS_TIPO[tipo]] * valor_centavos
+            linhas.append((formatar_data(ts), tipo, valor_centavos, saldo))
+        if formato == "csv":
+            # Valores com duas casas, como em uma planilha contábil
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(
+                (data, tipo, f"{para_reais(valor):.2f}", f"{para_reais(saldo_apos):.2f}")
+                for data, tipo, valor, saldo_apos in linhas)
+            yield buffer.getvalue().encode()
+        else:
+            yield b"".join(
+                serializar({"data": data, "tipo": tipo, "valor": para_reais(valor),
+                            "saldo": para_reais(saldo_apos)}) + b"\n"
+                for data, tipo, valor, saldo_apos in linhas)
+        if cursor is None:
+            return
+
+def interpretar_data(texto: Optional[str], fim_do_dia: bool = False) -> Optional[int]:
+    """Aceita 'dd-mm-aaaa' ou 'dd-mm-aaaa hh:mm:ss' e retorna o timestamp epoch"""
+    if texto is None:
+        return None
+    try:
+        return int(datetime.strptime(texto, "%d-%m-%Y %H:%M:%S").timestamp())
+    except ValueError:
+        pass
+    try:
+        dia = datetime.strptime(texto, "%d-%m-%Y")
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="Data inválida. Use dd-mm-aaaa ou dd-mm-aaaa hh:mm:ss"
+        )
+    if fim_do_dia:
+        dia = dia.replace(hour=23, minute=59, second=59)
+    return int(dia.timestamp())
 
 # --- API ---
 
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    await armazenamento.iniciar()
+    monitor = asyncio.create_task(controle_carga.monitorar()) if controle_carga.limite_atraso > 0 else None
+    yield
+    if monitor is not None:
+        monitor.cancel()
+    await armazenamento.encerrar()
+    pool_senhas.encerrar()
+
 app = FastAPI(
+    lifespan=ciclo_de_vida,
+    default_response_class=RespostaJSON,
     title="API Bancária DIO",
     description="""
 ## API Bancária RESTful Assíncrona
@@ -128,6 +515,7 @@ Uma API moderna para gerenciamento de operações bancárias com autenticação
 - Autenticação JWT - Login seguro com tokens
 - Depósitos - Transferir dinheiro para a conta
 - Saques - Retirar dinheiro com limites e validações
+- Transferências - Mover dinheiro para outra conta em uma operação atômica
 - Extrato - Ver histórico completo de transações
 - Consulta de Saldo - Verificar saldo da conta
 - Perfil - Visualizar dados do usuário
@@ -146,6 +534,14 @@ Uma API moderna para gerenciamento de operações bancárias com autenticação
 - **usuarios.json** - Dados dos usuários
 - **contas.json** - Contas e transações
 
+Backend selecionável na inicialização pela variável `ARMAZENAMENTO`:
+`json` (padrão) ou `sqlite` (`URL_BANCO`, modo WAL).
+
+No backend JSON os dados ficam residentes em memória. Cada cadastro ou transação gera uma linha
+no journal append-only (**journal.jsonl**); os arquivos JSON são regravados em
+checkpoints periódicos (`INTERVALO_FLUSH` segundos ou `LIMITE_JOURNAL` registros)
+e no encerramento. Na inicialização o journal é reaplicado sobre os snapshots.
+
 Desenvolvido como parte do **Desafio DIO**
 """,
     version="1.0.0",
@@ -180,6 +576,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+perfilador = Perfilador(
+    PERFIL_DIRETORIO, PERFIL_AMOSTRAGEM, PERFIL_MAX_ARQUIVOS, CHAVE_ADMIN,
+    ignorar=("/api/v1/admin/", "/api/v1/metrics")
+)
+app.add_middleware(MiddlewarePerfil, perfilador=perfilador)
+app.add_middleware(MiddlewareDescarte, controle=controle_carga, metricas=metricas, protegidos=CAMINHOS_PROTEGIDOS)
+# Adicionado por último para ser o mais externo e medir a requisição inteira
+app.add_middleware(MiddlewareMetricas, metricas=metricas)
 
 # --- Endpoints Públicos ---
 
@@ -190,40 +594,44 @@ async def root():
 @app.post("/api/v1/usuarios/registrar", tags=["Autenticação"])
 async def registrar(usuario: UsuarioRegistro):
     try:
-        usuarios = carregar_usuarios()
-        
-        if usuario.cpf in usuarios:
+        if await armazenamento.obter_usuario(usuario.cpf) is not None:
             raise HTTPException(status_code=400, detail="CPF já existe")
         
-        usuarios[usuario.cpf] = {
+        try:
+            senha_hash = await pool_senhas.gerar_hash(usuario.senha)
+        except FilaCheia:
+            raise servidor_ocupado()
+        
+        novo_usuario = {
             "nome": usuario.nome,
             "cpf": usuario.cpf,
             "data_nascimento": usuario.data_nascimento,
             "endereco": usuario.endereco,
-            "senha": usuario.senha,
+            "senha": senha_hash,
             "data_criacao": datetime.now().strftime("%d-%m-%Y %H:%M:%S")
         }
-        salvar_usuarios(usuarios)
         
-        contas = carregar_contas()
-        numero_conta = f"{len(contas) + 1:06d}"
-        contas[usuario.cpf] = {
-            "numero": numero_conta,
+        # O número da conta é atribuído pelo armazenamento, junto com a gravação
+        nova_conta = {
             "agencia": AGENCIA,
-            "saldo": 0.0,
+            "saldo_centavos": 0,
             "cpf_cliente": usuario.cpf,
-            "limite": LIMITE_VALOR_SAQUE,
+            "limite_centavos": para_centavos(LIMITE_VALOR_SAQUE),
             "limite_saques": LIMITE_SAQUES,
-            "historico_transacoes": [],
+            "contadores_saque": {},
             "tipo_conta": "ContaCorrente"
         }
-        salvar_contas(contas)
+        try:
+            await armazenamento.registrar_cliente(novo_usuario, nova_conta)
+            cache_clientes.guardar(usuario.cpf, novo_usuario, nova_conta)
+        except CPFDuplicado:
+            raise HTTPException(status_code=400, detail="CPF já existe")
         
         return {
             "mensagem": "Usuário registrado com sucesso",
             "cpf": usuario.cpf,
             "nome": usuario.nome,
-            "numero_conta": numero_conta
+            "numero_conta": nova_conta['numero']
         }
     except HTTPException:
         raise
@@ -232,18 +640,30 @@ async def registrar(usuario: UsuarioRegistro):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/v1/auth/login", response_model=TokenResponse, tags=["Autenticação"])
-async def login(credenciais: UsuarioLogin):
-    usuarios = carregar_usuarios()
+async def login(credenciais: UsuarioLogin, request: Request):
+    limitar_taxa("login", credenciais.cpf, request)
+    usuario = await armazenamento.obter_usuario(credenciais.cpf)
     
-    if credenciais.cpf not in usuarios:
+    if usuario is None:
         raise HTTPException(status_code=401, detail="CPF ou senha incorretos")
     
-    usuario = usuarios[credenciais.cpf]
+    try:
+        senha_correta = await pool_senhas.verificar(credenciais.senha, usuario['senha'])
+    except FilaCheia:
+        raise servidor_ocupado()
     
-    if usuario['senha'] != credenciais.senha:
+    if not senha_correta:
         raise HTTPException(status_code=401, detail="CPF ou senha incorretos")
     
-    token = criar_token(credenciais.cpf)
+    if not eh_hash(usuario['senha']):
+        # Registro antigo com senha em texto puro: troca pelo hash neste login
+        try:
+            await armazenamento.atualizar_usuario(
+                credenciais.cpf, {"senha": await pool_senhas.gerar_hash(credenciais.senha)})
+        except FilaCheia:
+            pass  # Tenta de novo no próximo login
+    
+    token = criar_token(credenciais.cpf, usuario.get('versao_token') or 0)
     
     return {
         "access_token": token,
@@ -251,160 +671,413 @@ async def login(credenciais: UsuarioLogin):
         "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
     }
 
+@app.post("/api/v1/auth/logout", tags=["Autenticação"])
+@repetir_em_conflito
+async def logout(credentials = Depends(HTTPBearer())):
+    cpf = await verificar_token(credentials)
+    payload = jwt.decode(credentials.credentials, options={"verify_signature": False})
+    jti = identificador_token(credentials.credentials, payload)
+    async with locks.bloquear(cpf):
+        usuario = await armazenamento.obter_usuario(cpf)
+        # Só os tokens ainda não expirados precisam continuar revogados
+        agora = time.time()
+        revogados = {j: exp for j, exp in (usuario.get('tokens_revogados') or {}).items() if exp > agora}
+        revogados[jti] = payload["exp"]
+        if len(revogados) > MAX_TOKENS_REVOGADOS:
+            # Lista cheia: encerra todas as sessões do CPF em vez de esquecer uma revogação
+            await armazenamento.atualizar_usuario(cpf, {
+                "tokens_revogados": {}, "versao_token": (usuario.get('versao_token') or 0) + 1
+            }, versao=usuario.get('versao'))
+            cache_tokens.revogar_cpf(cpf)
+        else:
+            # Gravação condicional: o lock do CPF não vale entre workers, e um logout
+            # simultâneo em outro worker perderia a revogação gravada por este
+            await armazenamento.atualizar_usuario(
+                cpf, {"tokens_revogados": revogados}, versao=usuario.get('versao'))
+    cache_tokens.revogar(credentials.credentials, jti, payload["exp"])
+    return {"mensagem": "Logout realizado com sucesso"}
+
+@app.post("/api/v1/auth/revogar-sessoes", tags=["Autenticação"])
+@repetir_em_conflito
+async def revogar_sessoes(credentials = Depends(HTTPBearer())):
+    cpf = await verificar_token(credentials)
+    async with locks.bloquear(cpf):
+        usuario = await armazenamento.obter_usuario(cpf)
+        # A nova versão invalida todos os tokens anteriores: os logouts gravados não servem mais
+        await armazenamento.atualizar_usuario(
+            cpf, {"versao_token": (usuario.get('versao_token') or 0) + 1, "tokens_revogados": {}},
+            versao=usuario.get('versao'))
+    cache_tokens.revogar_cpf(cpf)
+    return {"mensagem": "Todos os tokens deste CPF foram revogados"}
+
 @app.get("/api/v1/health", tags=["Sistema"])
 async def health():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "processo": os.getpid(),
+        "cache_tokens": cache_tokens.estatisticas(),
+        "cache_clientes": cache_clientes.estatisticas(),
+        "cache_idempotencia": cache_idempotencia.estatisticas(),
+        "carga": controle_carga.estatisticas(),
+        "armazenamento": armazenamento.estatisticas()
+    }
+
+@app.get("/api/v1/metrics", tags=["Sistema"], response_class=PlainTextResponse)
+async def obter_metricas():
+    """Contadores e histogramas de latência no formato texto do Prometheus"""
+    return PlainTextResponse(metricas.exportar(), media_type=TIPO_CONTEUDO)
+
+@app.get("/api/v1/admin/perfis", tags=["Sistema"])
+async def listar_perfis(
+    rota: Optional[str] = Query(None, description="Apenas perfis desta rota (ex.: /api/v1/extrato)"),
+    limite: int = Query(20, ge=1, le=1000, description="Quantidade de perfis mais lentos"),
+    funcoes: int = Query(30, ge=0, le=500, description="Funções no agregado dos perfis listados"),
+    x_chave_admin: Optional[str] = Header(None)
+):
+    """Perfis capturados mais lentos e as funções que mais consumiram tempo neles"""
+    if not chave_confere(x_chave_admin, CHAVE_ADMIN):
+        raise HTTPException(status_code=403, detail="Chave de administração inválida")
+    perfis = await executar_em_thread(None, perfilador.listar, rota, limite)
+    agregado = await executar_em_thread(None, perfilador.agregar, perfis, funcoes) if funcoes else []
+    return {
+        "perfilamento": perfilador.estatisticas(),
+        "perfis": perfis,
+        "funcoes": agregado
+    }
 
 # --- Endpoints Protegidos ---
 
-@app.get("/api/v1/conta/saldo", tags=["Conta"])
-async def obter_saldo(credentials = Depends(HTTPBearer())):
-    cpf = verificar_token(credentials)
-    contas = carregar_contas()
-    usuarios = carregar_usuarios()
+@app.get("/api/v1/conta/saldo", response_model=SaldoResponse,
+         response_model_exclude_none=True, tags=["Conta"])
+async def obter_saldo(
+    em: Optional[str] = Query(None, description="Saldo ao fim desta data (dd-mm-aaaa [hh:mm:ss])"),
+    credentials = Depends(HTTPBearer())
+):
+    cpf = await verificar_token(credentials)
+    cliente = await obter_cliente(cpf)
     
-    if cpf not in contas:
+    if cliente is None:
         raise HTTPException(status_code=404, detail="Conta não encontrada")
     
-    conta = contas[cpf]
-    usuario = usuarios.get(cpf, {})
-    
-    return {
-        "agencia": conta['agencia'],
-        "numero_conta": conta['numero'],
-        "titular": usuario.get('nome', 'N/A'),
-        "saldo": conta['saldo'],
-        "limite": conta.get('limite', LIMITE_VALOR_SAQUE)
+    resposta = {
+        "agencia": cliente['agencia'],
+        "numero_conta": cliente['numero'],
+        "titular": cliente['nome'] or 'N/A',
+        "saldo": para_reais(cliente['saldo_centavos']),
+        "limite": para_reais(cliente['limite_centavos'])
     }
+    if em is not None:
+        ts = interpretar_data(em, fim_do_dia=True)
+        resposta["saldo"] = para_reais(await armazenamento.saldo_em(cpf, ts))
+        resposta["em"] = formatar_data(ts)
+    return resposta
 
 @app.post("/api/v1/transacoes/depositar", tags=["Transações"])
-async def depositar(transacao: TransacaoRequest, credentials = Depends(HTTPBearer())):
-    cpf = verificar_token(credentials)
-    contas = carregar_contas()
+@repetir_em_conflito
+async def depositar(
+    transacao: TransacaoRequest,
+    request: Request,
+    credentials = Depends(HTTPBearer()),
+    idempotency_key: Optional[str] = Header(None, max_length=255)
+):
+    cpf = await verificar_token(credentials)
+    limitar_taxa("transacoes", cpf, request)
+    impressao = f"depositar:{para_centavos(transacao.valor)}"
+    if idempotency_key and (repetida := repeticao_idempotente(cpf, idempotency_key, impressao)):
+        return repetida
     
-    if cpf not in contas:
-        raise HTTPException(status_code=404, detail="Conta não encontrada")
+    async with locks.bloquear(cpf):
+        conta = await armazenamento.obter_conta(cpf)
+        
+        if conta is None:
+            raise HTTPException(status_code=404, detail="Conta não encontrada")
+        
+        if idempotency_key and (repetida := repeticao_idempotente(cpf, idempotency_key, impressao, conta)):
+            return repetida
+        
+        if transacao.valor <= 0:
+            raise HTTPException(status_code=400, detail="Valor deve ser maior que zero")
+        
+        saldo_anterior = conta['saldo_centavos']
+        registro = aplicar_deposito(conta, para_centavos(transacao.valor), datetime.now())
+        resposta = {
+            "mensagem": "Depósito realizado com sucesso",
+            "valor": para_reais(registro.valor_centavos),
+            "saldo_anterior": para_reais(saldo_anterior),
+            "saldo_atual": para_reais(conta['saldo_centavos']),
+            "data": registro.data
+        }
+        expira = anotar_idempotencia(conta, idempotency_key, impressao, resposta)
+        await armazenamento.registrar_transacao(
+            cpf, conta, registro, idempotency_key if expira is not None else None)
+        cache_clientes.atualizar_conta(cpf, conta)
+        if expira is not None:
+            cache_idempotencia.guardar(cpf, idempotency_key, impressao, resposta, expira)
+        
+        return resposta
+
+@app.post("/api/v1/transacoes/sacar", tags=["Transações"])
+@repetir_em_conflito
+async def sacar(
+    transacao: TransacaoRequest,
+    request: Request,
+    credentials = Depends(HTTPBearer()),
+    idempotency_key: Optional[str] = Header(None, max_length=255)
+):
+    cpf = await verificar_token(credentials)
+    limitar_taxa("transacoes", cpf, request)
+    impressao = f"sacar:{para_centavos(transacao.valor)}"
+    if idempotency_key and (repetida := repeticao_idempotente(cpf, idempotency_key, impressao)):
+        return repetida
     
-    if transacao.valor <= 0:
-        raise HTTPException(status_code=400, detail="Valor deve ser maior que zero")
+    async with locks.bloquear(cpf):
+        conta = await armazenamento.obter_conta(cpf)
+        
+        if conta is None:
+            raise HTTPException(status_code=404, detail="Conta não encontrada")
+        
+        if idempotency_key and (repetida := repeticao_idempotente(cpf, idempotency_key, impressao, conta)):
+            return repetida
+        
+        if transacao.valor <= 0:
+            raise HTTPException(status_code=400, detail="Valor deve ser maior que zero")
+        
+        agora = datetime.now()
+        await preparar_contadores_saque(cpf, conta, agora)
+        
+        saques_hoje = contar_saques(conta, "dia", agora)
+        saldo_anterior = conta['saldo_centavos']
+        registro = aplicar_saque(conta, para_centavos(transacao.valor), agora)
+        resposta = {
+            "mensagem": "Saque realizado com sucesso",
+            "valor": para_reais(registro.valor_centavos),
+            "saldo_anterior": para_reais(saldo_anterior),
+            "saldo_atual": para_reais(conta['saldo_centavos']),
+            "saques_restantes": conta['limite_saques'] - saques_hoje - 1,
+            "data": registro.data
+        }
+        expira = anotar_idempotencia(conta, idempotency_key, impressao, resposta)
+        await armazenamento.registrar_transacao(
+            cpf, conta, registro, idempotency_key if expira is not None else None)
+        cache_clientes.atualizar_conta(cpf, conta)
+        if expira is not None:
+            cache_idempotencia.guardar(cpf, idempotency_key, impressao, resposta, expira)
+        
+        return resposta
+
+@app.post("/api/v1/transacoes/transferir", tags=["Transações"])
+@repetir_em_conflito
+async def transferir(
+    transferencia: TransferenciaRequest,
+    request: Request,
+    credentials = Depends(HTTPBearer()),
+    idempotency_key: Optional[str] = Header(None, max_length=255)
+):
+    cpf = await verificar_token(credentials)
+    limitar_taxa("transacoes", cpf, request)
     
-    conta = contas[cpf]
-    saldo_anterior = conta['saldo']
-    conta['saldo'] += transacao.valor
+    if (transferencia.numero_conta_destino is None) == (transferencia.cpf_destino is None):
+        raise HTTPException(status_code=400, detail="Informe numero_conta_destino ou cpf_destino")
+    cpf_destino = transferencia.cpf_destino
+    if cpf_destino is None:
+        cpf_destino = await armazenamento.cpf_por_numero(transferencia.numero_conta_destino)
+        if cpf_destino is None:
+            raise HTTPException(status_code=404, detail="Conta de destino não encontrada")
+    if cpf_destino == cpf:
+        raise HTTPException(status_code=400, detail="Conta de destino igual à de origem")
     
-    conta['historico_transacoes'].append({
-        "tipo": "Deposito",
-        "valor": transacao.valor,
-        "data": datetime.now().strftime("%d-%m-%Y %H:%M:%S")
-    })
+    centavos = para_centavos(transferencia.valor)
+    impressao = f"transferir:{cpf_destino}:{centavos}"
+    if idempotency_key and (repetida := repeticao_idempotente(cpf, idempotency_key, impressao)):
+        return repetida
     
-    salvar_contas(contas)
+    # Os dois locks na mesma ordem em qualquer sentido da transferência: sem deadlock
+    async with locks.bloquear_varios(cpf, cpf_destino):
+        conta = await armazenamento.obter_conta(cpf)
+        if conta is None:
+            raise HTTPException(status_code=404, detail="Conta não encontrada")
+        conta_destino = await armazenamento.obter_conta(cpf_destino)
+        if conta_destino is None:
+            raise HTTPException(status_code=404, detail="Conta de destino não encontrada")
+        
+        if idempotency_key and (repetida := repeticao_idempotente(cpf, idempotency_key, impressao, conta)):
+            return repetida
+        
+        if conta['saldo_centavos'] < centavos:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Saldo insuficiente. Disponível: R$ {para_reais(conta['saldo_centavos']):.2f}"
+            )
+        
+        conferir_saldo_maximo(conta_destino, centavos)
+        ts = int(datetime.now().timestamp())
+        saldo_anterior = conta['saldo_centavos']
+        conta['saldo_centavos'] -= centavos
+        conta_destino['saldo_centavos'] += centavos
+        debito = Transacao("TransferenciaEnviada", centavos, ts)
+        credito = Transacao("TransferenciaRecebida", centavos, ts)
+        resposta = {
+            "mensagem": "Transferência realizada com sucesso",
+            "valor": para_reais(centavos),
+            "numero_conta_destino": conta_destino['numero'],
+            "saldo_anterior": para_reais(saldo_anterior),
+            "saldo_atual": para_reais(conta['saldo_centavos']),
+            "data": debito.data
+        }
+        expira = anotar_idempotencia(conta, idempotency_key, impressao, resposta)
+        await armazenamento.registrar_transferencia(
+            [(cpf, conta, debito), (cpf_destino, conta_destino, credito)],
+            idempotency_key if expira is not None else None)
+        cache_clientes.atualizar_conta(cpf, conta)
+        cache_clientes.atualizar_conta(cpf_destino, conta_destino)
+        if expira is not None:
+            cache_idempotencia.guardar(cpf, idempotency_key, impressao, resposta, expira)
+        
+        return resposta
+
+@app.post("/api/v1/transacoes/lote", tags=["Transações"])
+@repetir_em_conflito
+async def processar_lote(lote: LoteRequest, request: Request, credentials = Depends(HTTPBearer())):
+    cpf = await verificar_token(credentials)
+    limitar_taxa("transacoes", cpf, request)
     
-    return {
-        "mensagem": "Depósito realizado com sucesso",
-        "valor": transacao.valor,
-        "saldo_anterior": saldo_anterior,
-        "saldo_atual": conta['saldo'],
-        "data": datetime.now().strftime("%d-%m-%Y %H:%M:%S")
-    }
+    async with locks.bloquear(cpf):
+        conta = await armazenamento.obter_conta(cpf)
+        
+        if conta is None:
+            raise HTTPException(status_code=404, detail="Conta não encontrada")
+        
+        agora = datetime.now()
+        await preparar_contadores_saque(cpf, conta, agora)
+        
+        # As operações são aplicadas em ordem sobre um rascunho da conta
+        rascunho = dict(conta)
+        registros = []
+        resultados = []
+        for indice, operacao in enumerate(lote.operacoes):
+            try:
+                if operacao.tipo == "deposito":
+                    registros.append(aplicar_deposito(rascunho, para_centavos(operacao.valor), agora))
+                else:
+                    registros.append(aplicar_saque(rascunho, para_centavos(operacao.valor), agora))
+                resultados.append({
+                    "indice": indice, "sucesso": True, "saldo": para_reais(rascunho['saldo_centavos'])})
+            except HTTPException as e:
+                resultados.append({"indice": indice, "sucesso": False, "erro": e.detail})
+        
+        rejeitadas = len(lote.operacoes) - len(registros)
+        if lote.atomico and rejeitadas:
+            raise HTTPException(status_code=400, detail={
+                "mensagem": f"Lote rejeitado: {rejeitadas} operação(ões) inválida(s)",
+                "resultados": resultados
+            })
+        
+        saldo_anterior = conta['saldo_centavos']
+        if registros:
+            conta.update({campo: rascunho[campo] for campo in CAMPOS_ESTADO_CONTA if campo in rascunho})
+            await armazenamento.registrar_transacoes(cpf, conta, registros)
+            cache_clientes.atualizar_conta(cpf, conta)
+        
+        return {
+            "mensagem": "Lote processado com sucesso",
+            "aplicadas": len(registros),
+            "rejeitadas": rejeitadas,
+            "saldo_anterior": para_reais(saldo_anterior),
+            "saldo_atual": para_reais(conta['saldo_centavos']),
+            "resultados": resultados,
+            "data": agora.strftime("%d-%m-%Y %H:%M:%S")
+        }
 
-@app.post("/api/v1/transacoes/sacar", tags=["Transações"])
-async def sacar(transacao: TransacaoRequest, credentials = Depends(HTTPBearer())):
-    cpf = verificar_token(credentials)
-    contas = carregar_contas()
+@app.get("/api/v1/extrato", response_model=ExtratoResponse, tags=["Transações"])
+async def obter_extrato(
+    limit: int = Query(100, ge=1, le=1000, description="Transações por página"),
+    cursor: Optional[str] = Query(None, description="Valor de proximo_cursor da página anterior"),
+    desde: Optional[str] = Query(None, description="Data inicial (dd-mm-aaaa [hh:mm:ss])"),
+    ate: Optional[str] = Query(None, description="Data final (dd-mm-aaaa [hh:mm:ss])"),
+    credentials = Depends(HTTPBearer())
+):
+    cpf = await verificar_token(credentials)
+    cliente = await obter_cliente(cpf)
     
-    if cpf not in contas:
+    if cliente is None:
         raise HTTPException(status_code=404, detail="Conta não encontrada")
     
-    if transacao.valor <= 0:
-        raise HTTPException(status_code=400, detail="Valor deve ser maior que zero")
-    
-    conta = contas[cpf]
-    
-    if conta['saldo'] < transacao.valor:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Saldo insuficiente. Disponível: R$ {conta['saldo']:.2f}"
-        )
-    
-    if transacao.valor > conta['limite']:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Valor excede limite de R$ {conta['limite']:.2f}"
-        )
-    
-    saques_hoje = contar_saques_dia(cpf, contas)
-    if saques_hoje >= conta['limite_saques']:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Limite de {conta['limite_saques']} saques por dia excedido"
+    ts_desde = interpretar_data(desde)
+    ts_ate = interpretar_data(ate, fim_do_dia=True)
+    try:
+        pagina, proximo = await armazenamento.paginar_transacoes(
+            cpf,
+            desde=ts_desde,
+            ate=ts_ate,
+            cursor=decodificar_cursor(cursor),
+            limite=limit
         )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
     
-    saldo_anterior = conta['saldo']
-    conta['saldo'] -= transacao.valor
+    # Saldos de abertura e fechamento do período, sem percorrer o histórico
+    saldo_inicial = await armazenamento.saldo_em(cpf, ts_desde - 1) if ts_desde is not None else 0
+    saldo_final = (await armazenamento.saldo_em(cpf, ts_ate) if ts_ate is not None
+                   else cliente['saldo_centavos'])
     
-    conta['historico_transacoes'].append({
-        "tipo": "Saque",
-        "valor": transacao.valor,
-        "data": datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+    # Registros internos já validados: o dict sai direto das transações gravadas,
+    # sem TransacaoResponse nem a validação do response_model (que fica para a documentação)
+    return RespostaJSON({
+        "numero_conta": cliente['numero'],
+        "agencia": cliente['agencia'],
+        "titular": cliente['nome'] or 'N/A',
+        "saldo": para_reais(cliente['saldo_centavos']),
+        "saldo_inicial": para_reais(saldo_inicial),
+        "saldo_final": para_reais(saldo_final),
+        "transacoes": transacoes_json(pagina),
+        "proximo_cursor": codificar_cursor(proximo)
     })
-    
-    salvar_contas(contas)
-    
-    return {
-        "mensagem": "Saque realizado com sucesso",
-        "valor": transacao.valor,
-        "saldo_anterior": saldo_anterior,
-        "saldo_atual": conta['saldo'],
-        "saques_restantes": conta['limite_saques'] - saques_hoje - 1,
-        "data": datetime.now().strftime("%d-%m-%Y %H:%M:%S")
-    }
 
-@app.get("/api/v1/extrato", response_model=ExtratoResponse, tags=["Transações"])
-async def obter_extrato(credentials = Depends(HTTPBearer())):
-    cpf = verificar_token(credentials)
-    contas = carregar_contas()
-    usuarios = carregar_usuarios()
+@app.get("/api/v1/extrato/exportar", tags=["Transações"], response_class=StreamingResponse)
+async def exportar_extrato(
+    request: Request,
+    formato: Literal["csv", "ndjson"] = Query("csv", description="csv ou ndjson (um objeto JSON por linha)"),
+    desde: Optional[str] = Query(None, description="Data inicial (dd-mm-aaaa [hh:mm:ss])"),
+    ate: Optional[str] = Query(None, description="Data final (dd-mm-aaaa [hh:mm:ss])"),
+    credentials = Depends(HTTPBearer())
+):
+    """Extrato completo do período em streaming, com o saldo após cada transação"""
+    cpf = await verificar_token(credentials)
+    cliente = await obter_cliente(cpf)
     
-    if cpf not in contas:
+    if cliente is None:
         raise HTTPException(status_code=404, detail="Conta não encontrada")
     
-    conta = contas[cpf]
-    usuario = usuarios.get(cpf, {})
-    
-    transacoes = [
-        TransacaoResponse(**t)
-        for t in conta.get('historico_transacoes', [])
-    ]
+    ts_desde = interpretar_data(desde)
+    # Sem `ate`, o fim é o segundo do pedido: transações posteriores a ele ficam de fora
+    ts_ate = interpretar_data(ate, fim_do_dia=True)
+    if ts_ate is None:
+        ts_ate = int(datetime.now().timestamp())
+    saldo_inicial = await armazenamento.saldo_em(cpf, ts_desde - 1) if ts_desde is not None else 0
     
-    return ExtratoResponse(
-        numero_conta=conta['numero'],
-        agencia=conta['agencia'],
-        titular=usuario.get('nome', 'N/A'),
-        saldo=conta['saldo'],
-        transacoes=transacoes
+    tipo_conteudo, extensao = FORMATOS_EXPORTACAO[formato]
+    return StreamingResponse(
+        exportar_transacoes(cpf, formato, ts_desde, ts_ate, saldo_inicial, request),
+        media_type=tipo_conteudo,
+        headers={"Content-Disposition": f'attachment; filename="extrato_{cliente["numero"]}.{extensao}"'}
     )
 
-@app.get("/api/v1/usuarios/perfil", tags=["Usuários"])
+@app.get("/api/v1/usuarios/perfil", response_model=PerfilResponse, tags=["Usuários"])
 async def obter_perfil(credentials = Depends(HTTPBearer())):
-    cpf = verificar_token(credentials)
-    usuarios = carregar_usuarios()
-    contas = carregar_contas()
+    cpf = await verificar_token(credentials)
+    cliente = await obter_cliente(cpf)
     
-    if cpf not in usuarios:
+    if cliente is None:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
-    usuario = usuarios[cpf]
-    conta = contas.get(cpf, {})
-    
     return {
-        "nome": usuario.get('nome'),
-        "cpf": usuario.get('cpf'),
-        "endereco": usuario.get('endereco'),
-        "data_nascimento": usuario.get('data_nascimento'),
-        "data_criacao": usuario.get('data_criacao'),
-        "numero_conta": conta.get('numero'),
-        "agencia": conta.get('agencia')
+        "nome": cliente['nome'],
+        "cpf": cliente['cpf'],
+        "endereco": cliente['endereco'],
+        "data_nascimento": cliente['data_nascimento'],
+        "data_criacao": cliente['data_criacao'],
+        "numero_conta": cliente['numero'],
+        "agencia": cliente['agencia']
     }
 
 if __name__ == "__main__":
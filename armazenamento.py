@@ -0,0 +1,807 @@
+"""
+Backends de armazenamento da API
+
+`Armazenamento` define a interface usada pelos endpoints. `ArmazenamentoJSON`
+mantém os dados residentes em memória com journal append-only; o backend
+SQLite fica em `armazenamento_sqlite.py`.
+
+No backend JSON os arquivos (snapshot) são lidos uma única vez na inicialização e o
+journal é reaplicado por cima deles. Cada registro de cliente ou transação
+gera uma única linha compacta no journal; de tempos em tempos um checkpoint
+regrava os snapshots e trunca o journal.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+from arquivo_frio import ArquivoFrio
+from concorrencia import executar_em_thread
+from grupo_commit import GrupoCommit
+from transacoes import CODIGOS_TIPO, SINAIS, HistoricoTransacoes, Transacao, para_centavos
+
+
+def ler_json(caminho):
+    if not os.path.exists(caminho):
+        return {}
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            dados = json.load(f)
+            return dados if isinstance(dados, dict) else {}
+    except:
+        return {}
+
+
+def gravar_json(caminho, dados):
+    # Grava em arquivo temporário e renomeia para nunca deixar o arquivo pela metade
+    temporario = f"{caminho}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(dados, f, indent=4, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporario, caminho)
+    sincronizar_diretorio(caminho)
+
+
+def sincronizar_diretorio(caminho):
+    """fsync do diretório para tornar o rename durável (não suportado no Windows)"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(caminho)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+# Campos da conta alterados por uma transação e persistidos junto com ela. As
+# respostas de Idempotency-Key (campo `idempotencia`) ficam de fora: cada gravação
+# leva só a chave que ela mesma registrou (`chave_idempotencia`)
+CAMPOS_ESTADO_CONTA = ("saldo_centavos", "contadores_saque")
+
+
+class CPFDuplicado(Exception):
+    pass
+
+
+def numero_conta(sequencial):
+    return f"{sequencial:06d}"
+
+
+def maior_numero_conta(contas):
+    """Maior número já atribuído: a sequência continua dele"""
+    return max((int(conta['numero']) for conta in contas.values()), default=0)
+
+
+class ConflitoConcorrencia(Exception):
+    """A conta foi alterada por outro processo entre a leitura e a gravação"""
+
+
+class ArmazenamentoEmUso(Exception):
+    """Os arquivos do backend JSON já estão abertos por outro processo"""
+
+
+class JournalIndisponivel(Exception):
+    """Uma gravação do journal falhou e não pôde ser desfeita no disco; é preciso reiniciar"""
+
+
+def preparar_conta(conta):
+    """Converte a conta lida do JSON para a forma em memória
+
+    Contas gravadas antes dos centavos inteiros têm `saldo` e `limite` em reais.
+    """
+    if 'saldo' in conta:
+        conta['saldo_centavos'] = para_centavos(conta.pop('saldo'))
+    if 'limite' in conta:
+        conta['limite_centavos'] = para_centavos(conta.pop('limite'))
+    historico = conta.get('historico_transacoes', [])
+    if not isinstance(historico, HistoricoTransacoes):
+        # Snapshots com arquivo frio trazem só a parte quente e o que ficou no segmento
+        conta['historico_transacoes'] = HistoricoTransacoes.de_lista(
+            historico, conta.pop('arquivadas', 0), conta.pop('saldo_arquivado', 0))
+    return conta
+
+
+def conta_para_snapshot(conta):
+    historico = conta['historico_transacoes']
+    gravada = {**conta, 'historico_transacoes': historico.para_lista()}
+    if conta.get('idempotencia'):
+        # Chaves expiradas só sairiam da conta na próxima operação com chave
+        agora = time.time()
+        gravada['idempotencia'] = {c: e for c, e in conta['idempotencia'].items() if e[0] > agora}
+    if historico.arquivadas:
+        gravada['arquivadas'] = historico.arquivadas
+        gravada['saldo_arquivado'] = historico.saldo_arquivado
+    return gravada
+
+
+def _aplicar_estado(conta, registro):
+    for campo in CAMPOS_ESTADO_CONTA:
+        if campo in registro:
+            conta[campo] = registro[campo]
+    if 'saldo' in registro:
+        # Registro de journal anterior aos centavos inteiros
+        conta['saldo_centavos'] = para_centavos(registro['saldo'])
+    if 'idempotencia_nova' in registro:
+        conta['idempotencia'] = {**(conta.get('idempotencia') or {}), **registro['idempotencia_nova']}
+    elif 'idempotencia' in registro:
+        # Journal anterior: a linha trazia todas as chaves da conta
+        conta['idempotencia'] = registro['idempotencia']
+
+
+def _estado_journal(conta, chave_idempotencia=None):
+    """Campos de estado da conta para uma linha do journal, com só a chave de idempotência nova"""
+    estado = {campo: conta[campo] for campo in CAMPOS_ESTADO_CONTA if campo in conta}
+    if chave_idempotencia:
+        estado['idempotencia_nova'] = {chave_idempotencia: conta['idempotencia'][chave_idempotencia]}
+    return estado
+
+
+class Armazenamento:
+    """Interface comum dos backends de armazenamento"""
+
+    async def iniciar(self):
+        pass
+
+    async def encerrar(self):
+        pass
+
+    async def obter_usuario(self, cpf):
+        """Retorna o usuário ou None"""
+        raise NotImplementedError
+
+    async def obter_conta(self, cpf):
+        """Retorna a conta (sem exigir o histórico) ou None"""
+        raise NotImplementedError
+
+    async def contar_contas(self):
+        raise NotImplementedError
+
+    async def cpf_por_numero(self, numero):
+        """CPF do titular da conta com este número, ou None"""
+        raise NotImplementedError
+
+    async def listar_transacoes(self, cpf):
+        """Histórico da conta (HistoricoTransacoes) em ordem cronológica
+
+        No backend JSON com arquivo frio, só a parte quente (as transações recentes).
+        """
+        raise NotImplementedError
+
+    async def paginar_transacoes(self, cpf, desde=None, ate=None, cursor=None, limite=100):
+        """Uma página do histórico entre os timestamps `desde` e `ate` (inclusivos)
+
+        Retorna (lista de Transacao, proximo_cursor). O cursor é um valor JSON próprio de
+        cada backend; um cursor inválido levanta ValueError.
+        """
+        raise NotImplementedError
+
+    async def saldo_em(self, cpf, ts):
+        """Saldo em centavos após todas as transações com timestamp <= ts"""
+        raise NotImplementedError
+
+    async def registrar_cliente(self, usuario, conta):
+        """Insere usuário e conta novos; levanta CPFDuplicado se o CPF já existe
+
+        O número da conta é atribuído aqui (`conta['numero']`), pelo próximo
+        valor de uma sequência persistida, na mesma operação que grava a conta.
+        """
+        raise NotImplementedError
+
+    async def atualizar_usuario(self, cpf, campos, versao=None):
+        """Altera campos de um usuário existente
+
+        Com `versao` (a de `usuario['versao']` lida antes), só grava se ninguém
+        alterou o usuário desde a leitura; senão levanta ConflitoConcorrencia.
+        """
+        raise NotImplementedError
+
+    async def registrar_transacao(self, cpf, conta, transacao, chave_idempotencia=None):
+        """Persiste o estado da conta (CAMPOS_ESTADO_CONTA) e anexa uma Transacao ao histórico
+
+        Com `chave_idempotencia`, grava também a resposta que a operação registrou em
+        conta['idempotencia'] para essa chave. Backends compartilhados entre processos levantam ConflitoConcorrencia se a
+        conta mudou desde que foi lida; quem chamou deve ler e aplicar de novo.
+        """
+        raise NotImplementedError
+
+    async def registrar_transacoes(self, cpf, conta, transacoes):
+        """Como registrar_transacao, para várias transações gravadas de uma só vez"""
+        raise NotImplementedError
+
+    async def registrar_transferencia(self, partes, chave_idempotencia=None):
+        """Como registrar_transacao para várias contas, em uma única gravação atômica
+
+        `partes` é uma lista de (cpf, conta, transacao): ou todas são gravadas ou nenhuma.
+        A `chave_idempotencia` é a da conta da primeira parte (a de origem).
+        """
+        raise NotImplementedError
+
+    async def carregar_usuarios(self):
+        """Todos os usuários, indexados por CPF"""
+        raise NotImplementedError
+
+    async def carregar_contas(self):
+        """Todas as contas com histórico (HistoricoTransacoes), indexadas por CPF"""
+        raise NotImplementedError
+
+    def estatisticas(self):
+        """Métricas internas do backend"""
+        return {}
+
+    def observar_commits(self, histograma_lote, histograma_latencia):
+        """Passa a registrar o tamanho e a latência dos lotes de gravação, se o backend os agrupa"""
+
+    async def salvar_usuarios(self, usuarios):
+        """Substitui todos os usuários"""
+        raise NotImplementedError
+
+    async def salvar_contas(self, contas):
+        """Substitui todas as contas e seus históricos"""
+        raise NotImplementedError
+
+
+class ArmazenamentoJSON(Armazenamento):
+    """Mantém usuários e contas em memória, com journal e checkpoints periódicos
+
+    O I/O de disco não roda no event loop: o journal é escrito por uma thread
+    dedicada (preservando a ordem dos registros) e os snapshots por um pool de
+    threads limitado a `threads_io`. As linhas do journal passam pelo group
+    commit: a requisição só é confirmada depois do fsync do lote que a contém.
+
+    Como o estado vive na memória de um processo, só um processo por vez pode
+    abrir os arquivos: `iniciar` toma um lock exclusivo (flock) em
+    `<journal>.lock` e falha com ArmazenamentoEmUso se outro já o detém.
+
+    Se a escrita ou o fsync de um lote do journal falha, o lote é cortado do
+    arquivo e cada operação dele é desfeita na memória antes de o erro chegar a
+    quem a pediu: a operação recusada não reaparece no próximo checkpoint nem
+    após reiniciar. Se nem o corte for possível, o disco pode conter operações
+    que falharam: o backend passa a recusar gravações e checkpoints
+    (JournalIndisponivel) até ser reiniciado e reaplicar o journal do disco.
+
+    Com `idade_arquivamento` (segundos) o loop de checkpoints também arquiva, a cada
+    `intervalo_arquivamento`, as transações mais antigas que isso em segmentos por
+    conta (arquivo_frio.py); memória e `contas.json` guardam só a parte quente.
+    """
+
+    def __init__(self, arquivo_usuarios, arquivo_contas, arquivo_journal,
+                 intervalo_flush=30.0, limite_journal=10000, threads_io=4,
+                 janela_commit=0.002, max_lote_commit=256, diretorio_arquivo=None,
+                 idade_arquivamento=0, intervalo_arquivamento=3600.0, minimo_arquivamento=64):
+        self.arquivo_usuarios = arquivo_usuarios
+        self.arquivo_contas = arquivo_contas
+        self.arquivo_journal = arquivo_journal
+        self.arquivo_journal_antigo = f"{arquivo_journal}.antigo"
+        self.intervalo_flush = intervalo_flush
+        self.limite_journal = limite_journal
+        self.arquivo_frio = ArquivoFrio(diretorio_arquivo or os.path.join(
+            os.path.dirname(arquivo_contas), "arquivo_frio"))
+        self.idade_arquivamento = idade_arquivamento
+        self.intervalo_arquivamento = intervalo_arquivamento
+        # Menos transações antigas que isso numa conta não compensam um fsync
+        self.minimo_arquivamento = minimo_arquivamento
+        self.transacoes_arquivadas = 0
+        self._proximo_arquivamento = 0.0
+        self.usuarios = None
+        self.contas = None
+        self.ultimo_numero = 0
+        self.cpfs_por_numero = {}
+        self.registros_journal = 0
+        self._journal = None
+        self.falha_journal = None        # Erro que deixou o journal do disco inconsistente
+        self._sujos = set()
+        self._tarefa_flush = None
+        self._trava = None
+        self._encerrando = False
+        self._checkpoint_pedido = asyncio.Event()
+        self._executor_io = ThreadPoolExecutor(max_workers=threads_io, thread_name_prefix="io")
+        self._executor_journal = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+        self._grupo_commit = GrupoCommit(
+            self._escrever_journal, self._executor_journal, janela_commit, max_lote_commit)
+
+    @property
+    def carregado(self):
+        return self.usuarios is not None and self.contas is not None
+
+    def carregar(self):
+        """Lê o snapshot para a memória e reaplica o journal (apenas uma vez)"""
+        if self.carregado:
+            return
+        usuarios = ler_json(self.arquivo_usuarios)
+        contas = ler_json(self.arquivo_contas)
+        for conta in contas.values():
+            preparar_conta(conta)
+        self.usuarios, self.contas = usuarios, contas
+        # O journal antigo só existe se um checkpoint foi interrompido
+        self.registros_journal = (self._reaplicar_journal(self.arquivo_journal_antigo)
+                                  + self._reaplicar_journal(self.arquivo_journal))
+        if self.registros_journal:
+            self._sujos.update(("usuarios", "contas"))
+        # Contas nunca são removidas: o maior número gravado é o estado da sequência
+        self.ultimo_numero = maior_numero_conta(self.contas)
+        self._indexar_numeros()
+
+    def _indexar_numeros(self):
+        self.cpfs_por_numero = {conta['numero']: cpf for cpf, conta in self.contas.items()}
+
+    def _reaplicar_journal(self, caminho):
+        if not os.path.exists(caminho):
+            return 0
+        total = 0
+        with open(caminho, 'r', encoding='utf-8') as f:
+            for linha in f:
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    # Última linha incompleta (queda durante a escrita)
+                    break
+                self._aplicar(registro)
+                total += 1
+        return total
+
+    def _aplicar(self, registro):
+        # Idempotente: registros já presentes no snapshot são ignorados
+        if registro["op"] == "cliente":
+            cpf = registro["usuario"]["cpf"]
+            self.usuarios.setdefault(cpf, registro["usuario"])
+            if cpf not in self.contas:
+                self.contas[cpf] = preparar_conta(registro["conta"])
+        elif registro["op"] == "usuario":
+            if registro["cpf"] in self.usuarios:
+                self.usuarios[registro["cpf"]].update(registro["campos"])
+        elif registro["op"] == "transacao":
+            self._aplicar_transacao(registro)
+        elif registro["op"] == "transferencia":
+            # Cada parte é conferida pelo próprio `n`, como um registro "transacao"
+            for parte in registro["partes"]:
+                self._aplicar_transacao(parte)
+        elif registro["op"] == "lote":
+            # O registro cobre as posições n - len(transacoes) + 1 até n do histórico
+            conta = self.contas.get(registro["cpf"])
+            if conta is None or conta['historico_transacoes'].total >= registro["n"]:
+                return
+            conta['historico_transacoes'].estender(
+                Transacao.de_registro(t) for t in registro["transacoes"])
+            _aplicar_estado(conta, registro)
+
+    def _aplicar_transacao(self, registro):
+        conta = self.contas.get(registro["cpf"])
+        if conta is None or conta['historico_transacoes'].total >= registro["n"]:
+            return
+        conta['historico_transacoes'].anexar(Transacao.de_registro(registro))
+        _aplicar_estado(conta, registro)
+
+    # Executados na thread do journal
+
+    def _escrever_journal(self, linhas):
+        if self._journal is None:
+            self._journal = open(self.arquivo_journal, 'a', encoding='utf-8')
+        tamanho = os.fstat(self._journal.fileno()).st_size
+        try:
+            self._journal.write("".join(linhas))
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+        except Exception:
+            self._cortar_journal(tamanho)
+            raise
+
+    def _cortar_journal(self, tamanho):
+        """Tira do journal o lote que falhou, voltando o arquivo ao `tamanho` anterior"""
+        journal, self._journal = self._journal, None
+        try:
+            journal.close()
+        except OSError:
+            pass
+        try:
+            os.truncate(self.arquivo_journal, tamanho)
+            fd = os.open(self.arquivo_journal, os.O_WRONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            self.falha_journal = e
+
+    def _fechar_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _rotacionar_journal(self):
+        self._fechar_journal()
+        if not os.path.exists(self.arquivo_journal):
+            return
+        if os.path.exists(self.arquivo_journal_antigo):
+            # Checkpoint anterior falhou: preserva os dois trechos, em ordem
+            with open(self.arquivo_journal_antigo, 'a', encoding='utf-8') as destino, \
+                    open(self.arquivo_journal, 'r', encoding='utf-8') as origem:
+                shutil.copyfileobj(origem, destino)
+            os.remove(self.arquivo_journal)
+        else:
+            os.replace(self.arquivo_journal, self.arquivo_journal_antigo)
+        sincronizar_diretorio(self.arquivo_journal)
+
+    # Executado no pool de I/O
+
+    def _gravar_snapshot(self, usuarios, contas):
+        if usuarios is not None:
+            gravar_json(self.arquivo_usuarios, usuarios)
+        if contas is not None:
+            # A data formatada só é gerada aqui, fora do event loop
+            gravar_json(self.arquivo_contas, {cpf: conta_para_snapshot(c) for cpf, c in contas.items()})
+        if os.path.exists(self.arquivo_journal_antigo):
+            os.remove(self.arquivo_journal_antigo)
+
+    def _conferir_journal(self):
+        if self.falha_journal is not None:
+            raise JournalIndisponivel(
+                f"journal inconsistente após falha de gravação ({self.falha_journal}); reinicie o processo")
+
+    async def _anexar_journal(self, registro, desfazer=None):
+        """Grava o registro com o group commit; se falhar, chama `desfazer` antes de propagar o erro
+
+        `desfazer` volta a memória ao estado anterior à operação. Os snapshots são
+        marcados para regravação: um checkpoint pode ter copiado a operação antes
+        de a gravação dela falhar.
+        """
+        linha = json.dumps(registro, ensure_ascii=False, separators=(',', ':')) + "\n"
+        self.registros_journal += 1
+        if self.registros_journal >= self.limite_journal:
+            self._checkpoint_pedido.set()
+        try:
+            self._conferir_journal()
+            await self._grupo_commit.enviar(linha)
+        except Exception:
+            if desfazer is not None:
+                desfazer()
+            self._sujos.update(("usuarios", "contas"))
+            self._checkpoint_pedido.set()
+            raise
+
+    def _desfazer_transacoes(self, conta, transacoes, chave_idempotencia=None, anexadas=True):
+        """Volta a conta ao estado anterior às transações, cuja gravação falhou
+
+        O chamador segura o lock da conta até a gravação terminar, então elas são
+        as últimas do histórico. Com `anexadas` falso o histórico as recusou e só o
+        estado que a API já tinha aplicado na conta é desfeito. Os contadores de
+        saque são recontados do histórico no próximo saque.
+        """
+        if anexadas:
+            conta['historico_transacoes'].descartar_fim(len(transacoes))
+        conta['saldo_centavos'] -= sum(SINAIS[CODIGOS_TIPO[t.tipo]] * t.valor_centavos for t in transacoes)
+        if any(t.tipo == "Saque" for t in transacoes):
+            conta['contadores_saque'] = None
+        if chave_idempotencia:
+            (conta.get('idempotencia') or {}).pop(chave_idempotencia, None)
+
+    async def obter_usuario(self, cpf):
+        self.carregar()
+        return self.usuarios.get(cpf)
+
+    async def obter_conta(self, cpf):
+        self.carregar()
+        return self.contas.get(cpf)
+
+    async def contar_contas(self):
+        self.carregar()
+        return len(self.contas)
+
+    async def cpf_por_numero(self, numero):
+        self.carregar()
+        return self.cpfs_por_numero.get(numero)
+
+    async def listar_transacoes(self, cpf):
+        self.carregar()
+        return self.contas[cpf]['historico_transacoes']
+
+    async def paginar_transacoes(self, cpf, desde=None, ate=None, cursor=None, limite=100):
+        self.carregar()
+        if cursor is not None and (type(cursor) is not int or cursor < 0):
+            raise ValueError("cursor")
+        historico = self.contas[cpf]['historico_transacoes']
+        while True:
+            # Posições absolutas: as arquivadas (0 a arquivadas - 1) vêm antes da parte quente.
+            # A coluna de timestamps já está ordenada: serve de índice para a busca binária
+            arquivadas = historico.arquivadas
+            indice = historico.ts
+            inicio = arquivadas + (bisect_left(indice, desde) if desde is not None else 0)
+            fim = arquivadas + (bisect_right(indice, ate) if ate is not None else len(indice))
+            if arquivadas and (inicio == arquivadas or fim == arquivadas):
+                # O período pode começar (ou terminar) antes da parte quente: busca no segmento
+                inicio_frio, fim_frio = await executar_em_thread(
+                    self._executor_io, self.arquivo_frio.limites, cpf, arquivadas, desde, ate)
+                if inicio_frio < arquivadas:
+                    inicio = inicio_frio
+                if fim == arquivadas:
+                    fim = fim_frio
+            if cursor is not None:
+                inicio = max(inicio, cursor)
+            proximo = inicio + limite
+            fim_pagina = min(fim, proximo)
+            pagina = []
+            if inicio < arquivadas:
+                pagina = await executar_em_thread(
+                    self._executor_io, self.arquivo_frio.ler, cpf, inicio, min(fim_pagina, arquivadas))
+            if historico.arquivadas != arquivadas:
+                # Um arquivamento terminou durante a leitura e deslocou a parte quente: refaz
+                continue
+            pagina += historico[max(inicio, arquivadas) - arquivadas:max(fim_pagina, arquivadas) - arquivadas]
+            return pagina, (proximo if proximo < fim else None)
+
+    async def saldo_em(self, cpf, ts):
+        self.carregar()
+        historico = self.contas[cpf]['historico_transacoes']
+        if historico.arquivadas and (not historico.ts or ts < historico.ts[0]):
+            return await executar_em_thread(
+                self._executor_io, self.arquivo_frio.saldo_em, cpf, historico.arquivadas, ts)
+        return historico.saldo_em(ts)
+
+    async def registrar_cliente(self, usuario, conta):
+        self.carregar()
+        if usuario['cpf'] in self.usuarios:
+            raise CPFDuplicado(usuario['cpf'])
+        # Sem await entre a verificação do CPF e a atribuição do número: atômico no event loop
+        self.ultimo_numero += 1
+        conta['numero'] = numero_conta(self.ultimo_numero)
+        conta.setdefault('historico_transacoes', HistoricoTransacoes())
+        self.usuarios[usuario['cpf']] = usuario
+        self.contas[usuario['cpf']] = conta
+        self.cpfs_por_numero[conta['numero']] = usuario['cpf']
+        self._sujos.update(("usuarios", "contas"))
+
+        def desfazer():
+            # O número fica sem uso: outro cadastro pode já ter recebido o seguinte
+            del self.usuarios[usuario['cpf']]
+            del self.contas[usuario['cpf']]
+            del self.cpfs_por_numero[conta['numero']]
+
+        await self._anexar_journal({
+            "op": "cliente",
+            "usuario": usuario,
+            "conta": {**conta, 'historico_transacoes': conta['historico_transacoes'].para_lista()}
+        }, desfazer)
+
+    async def atualizar_usuario(self, cpf, campos, versao=None):
+        # Um único processo abre os arquivos (trava do journal): o lock por CPF já
+        # serializa as leituras e gravações do usuário, então `versao` não é conferida
+        self.carregar()
+        usuario = self.usuarios[cpf]
+        anteriores = {campo: usuario[campo] for campo in campos if campo in usuario}
+        usuario.update(campos)
+        self._sujos.add("usuarios")
+
+        def desfazer():
+            for campo in campos:
+                if campo in anteriores:
+                    usuario[campo] = anteriores[campo]
+                else:
+                    usuario.pop(campo, None)
+
+        await self._anexar_journal({"op": "usuario", "cpf": cpf, "campos": campos}, desfazer)
+
+    def _parte_transacao(self, cpf, conta, transacao, chave_idempotencia=None):
+        """Anexa a transação ao histórico em memória e monta o registro do journal"""
+        conta['historico_transacoes'].anexar(transacao)
+        return {
+            "cpf": cpf,
+            "n": conta['historico_transacoes'].total,
+            **_estado_journal(conta, chave_idempotencia),
+            **transacao._asdict()
+        }
+
+    async def registrar_transacao(self, cpf, conta, transacao, chave_idempotencia=None):
+        try:
+            registro = self._parte_transacao(cpf, conta, transacao, chave_idempotencia)
+        except Exception:
+            self._desfazer_transacoes(conta, [transacao], chave_idempotencia, anexadas=False)
+            raise
+        self._sujos.add("contas")
+        await self._anexar_journal(
+            {"op": "transacao", **registro},
+            lambda: self._desfazer_transacoes(conta, [transacao], chave_idempotencia))
+
+    async def registrar_transferencia(self, partes, chave_idempotencia=None):
+        registros = []
+        try:
+            for i, (cpf, conta, transacao) in enumerate(partes):
+                registros.append(
+                    self._parte_transacao(cpf, conta, transacao, chave_idempotencia if i == 0 else None))
+        except Exception:
+            for i, (_, conta, transacao) in enumerate(partes):
+                self._desfazer_transacoes(
+                    conta, [transacao], chave_idempotencia if i == 0 else None, anexadas=i < len(registros))
+            raise
+        self._sujos.add("contas")
+        # Uma única linha: após uma queda as duas contas são reaplicadas ou nenhuma
+        await self._anexar_journal({"op": "transferencia", "partes": registros}, lambda: [
+            self._desfazer_transacoes(conta, [transacao], chave_idempotencia if i == 0 else None)
+            for i, (_, conta, transacao) in enumerate(partes)
+        ])
+
+    async def registrar_transacoes(self, cpf, conta, transacoes):
+        try:
+            conta['historico_transacoes'].estender(transacoes)
+        except Exception:
+            self._desfazer_transacoes(conta, transacoes, anexadas=False)
+            raise
+        self._sujos.add("contas")
+        # Uma única linha: após uma queda o lote inteiro é reaplicado ou descartado.
+        # Cada transação vai como [tipo, valor, ts]
+        await self._anexar_journal({
+            "op": "lote",
+            "cpf": cpf,
+            "n": conta['historico_transacoes'].total,
+            **_estado_journal(conta),
+            "transacoes": transacoes
+        }, lambda: self._desfazer_transacoes(conta, transacoes))
+
+    async def carregar_usuarios(self):
+        self.carregar()
+        return self.usuarios
+
+    async def carregar_contas(self):
+        self.carregar()
+        if not any(c['historico_transacoes'].arquivadas for c in self.contas.values()):
+            return self.contas
+        # Reconciliação e migração precisam do histórico inteiro, inclusive o arquivado
+        return {cpf: await self._conta_completa(cpf, c) for cpf, c in list(self.contas.items())}
+
+    async def _conta_completa(self, cpf, conta):
+        historico = conta['historico_transacoes']
+        if not historico.arquivadas:
+            return conta
+        completo = HistoricoTransacoes()
+        lidas = 0
+        # Repete se um arquivamento tirou mais transações da parte quente durante a leitura
+        while lidas < historico.arquivadas:
+            fim = historico.arquivadas
+            completo.estender(await executar_em_thread(self._executor_io, self.arquivo_frio.ler, cpf, lidas, fim))
+            lidas = fim
+        completo.estender(historico)
+        return {**conta, 'historico_transacoes': completo}
+
+    async def salvar_usuarios(self, usuarios):
+        self.carregar()
+        self.usuarios = usuarios
+        self.marcar_sujo("usuarios")
+
+    async def salvar_contas(self, contas):
+        self.carregar()
+        self.contas = {cpf: preparar_conta(dict(c)) for cpf, c in contas.items()}
+        self.ultimo_numero = max(self.ultimo_numero, maior_numero_conta(self.contas))
+        self._indexar_numeros()
+        self.marcar_sujo("contas")
+
+    def marcar_sujo(self, nome):
+        """Marca 'usuarios' ou 'contas' para o próximo checkpoint"""
+        self._sujos.add(nome)
+
+    def observar_commits(self, histograma_lote, histograma_latencia):
+        self._grupo_commit.histograma_lote = histograma_lote
+        self._grupo_commit.histograma_latencia = histograma_latencia
+
+    def estatisticas(self):
+        return {"grupo_commit": self._grupo_commit.estatisticas(),
+                "transacoes_arquivadas": self.transacoes_arquivadas,
+                "falha_journal": str(self.falha_journal) if self.falha_journal is not None else None}
+
+    async def arquivar(self, agora=None):
+        """Move para o arquivo frio as transações com mais de `idade_arquivamento` segundos
+
+        O segmento é gravado e sincronizado antes de as transações saírem da memória;
+        o snapshot seguinte registra quantas foram arquivadas. Retorna quantas saíram.
+        """
+        self.carregar()
+        limite = (agora if agora is not None else time.time()) - self.idade_arquivamento
+        movidas = 0
+        for cpf, conta in list(self.contas.items()):
+            historico = conta['historico_transacoes']
+            n = bisect_left(historico.ts, limite)
+            if n < self.minimo_arquivamento:
+                continue
+            arquivadas = historico.arquivadas
+            await executar_em_thread(
+                self._executor_io, self.arquivo_frio.gravar,
+                cpf, arquivadas, historico[:n], historico.saldo_arquivado)
+            # Durante a gravação só há anexos no fim do histórico; salvar_contas troca as contas
+            if (self.contas.get(cpf) is not conta or conta['historico_transacoes'] is not historico
+                    or historico.arquivadas != arquivadas):
+                continue
+            historico.descartar_inicio(n)
+            movidas += n
+        if movidas:
+            self._sujos.add("contas")
+            self.transacoes_arquivadas += movidas
+        return movidas
+
+    async def checkpoint(self):
+        """Grava os snapshots alterados e descarta o journal já incorporado a eles"""
+        if not self._sujos and not self.registros_journal:
+            return
+        if self.falha_journal is not None:
+            # A memória não confere com o journal do disco: reiniciar o reaplica
+            return
+        sujos, self._sujos = self._sujos, set()
+        # Cópia consistente tirada no event loop (cópia das colunas, sem formatar datas)
+        usuarios = ({cpf: dict(u) for cpf, u in self.usuarios.items()}
+                    if "usuarios" in sujos else None)
+        contas = ({cpf: {**c, 'historico_transacoes': c['historico_transacoes'].copiar()}
+                   for cpf, c in self.contas.items()}
+                  if "contas" in sujos else None)
+        self.registros_journal = 0
+        # Registros posteriores à cópia vão para um journal novo
+        await executar_em_thread(self._executor_journal, self._rotacionar_journal)
+        try:
+            await executar_em_thread(self._executor_io, self._gravar_snapshot, usuarios, contas)
+        except Exception:
+            self._sujos |= sujos
+            raise
+
+    async def _loop_flush(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._checkpoint_pedido.wait(), self.intervalo_flush)
+            except asyncio.TimeoutError:
+                pass
+            if self._encerrando:
+                return
+            self._checkpoint_pedido.clear()
+            try:
+                if self.idade_arquivamento and time.monotonic() >= self._proximo_arquivamento:
+                    self._proximo_arquivamento = time.monotonic() + self.intervalo_arquivamento
+                    await self.arquivar()
+                await self.checkpoint()
+            except Exception as e:
+                print(f"ERRO ao gravar dados: {e}")
+
+    def _travar(self):
+        if fcntl is None or self._trava is not None:
+            return
+        self._trava = open(f"{self.arquivo_journal}.lock", "a")
+        try:
+            fcntl.flock(self._trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._trava.close()
+            self._trava = None
+            raise ArmazenamentoEmUso(
+                f"{self.arquivo_journal} já está em uso por outro processo; "
+                "com vários workers use ARMAZENAMENTO=sqlite")
+
+    def _destravar(self):
+        if self._trava is not None:
+            # Fechar o arquivo libera o flock
+            self._trava.close()
+            self._trava = None
+
+    async def iniciar(self):
+        self._travar()
+        await executar_em_thread(self._executor_io, self.carregar)
+        if self._tarefa_flush is None:
+            self._encerrando = False
+            self._tarefa_flush = asyncio.create_task(self._loop_flush())
+
+    async def encerrar(self):
+        if self._tarefa_flush is not None:
+            # Sem cancelar: cancelar não interrompe a thread que grava o snapshot, e o
+            # checkpoint final correria junto com ele. Um checkpoint em andamento termina antes
+            self._encerrando = True
+            self._checkpoint_pedido.set()
+            await self._tarefa_flush
+            self._tarefa_flush = None
+        await self._grupo_commit.encerrar()
+        await self.checkpoint()
+        await executar_em_thread(self._executor_journal, self._fechar_journal)
+        self._destravar()
@@ -0,0 +1,407 @@
+"""
+Backend de armazenamento SQLite assíncrono (SQLAlchemy + aiosqlite)
+
+Usa modo WAL, pool de conexões e tabelas indexadas `usuarios`, `contas` e
+`transacoes`. Cada depósito ou saque atualiza uma linha de `contas` e insere
+uma linha em `transacoes`, na mesma transação do banco. A linha da conta só é
+gravada se a sua `versao` ainda é a lida (controle otimista), o que torna o
+backend seguro com vários workers no mesmo arquivo. Valores monetários
+são colunas inteiras em centavos; cada transação guarda também o saldo após
+ela (`saldo_apos`), o que responde o saldo em uma data com uma busca no
+índice (cpf, ts, id). Os números de conta vêm da tabela `sequencias`,
+incrementada dentro da transação que insere a conta.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from sqlalchemy import (
+    JSON, Column, bindparam, ForeignKey, Index, Integer, MetaData, String, Table,
+    delete, event, func, insert, inspect, select, text, tuple_, update
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from armazenamento import (
+    CAMPOS_ESTADO_CONTA, Armazenamento, ConflitoConcorrencia, CPFDuplicado, numero_conta
+)
+from transacoes import (
+    CODIGOS_TIPO, SINAIS, HistoricoTransacoes, Transacao, formatar_data, timestamp_da_data
+)
+
+metadata = MetaData()
+
+tabela_usuarios = Table(
+    "usuarios", metadata,
+    Column("cpf", String(11), primary_key=True),
+    Column("nome", String, nullable=False),
+    Column("data_nascimento", String),
+    Column("endereco", String),
+    Column("senha", String, nullable=False),
+    Column("data_criacao", String),
+    Column("versao_token", Integer, default=0),
+    # jti -> exp dos tokens encerrados por logout (ver cache_tokens.py)
+    Column("tokens_revogados", JSON),
+    # Incrementada a cada alteração: logouts simultâneos em workers diferentes não se sobrescrevem
+    Column("versao", Integer, nullable=False, default=0, server_default="0"),
+)
+
+tabela_contas = Table(
+    "contas", metadata,
+    Column("cpf", String(11), primary_key=True),
+    Column("numero", String(6), nullable=False, unique=True, index=True),
+    Column("agencia", String(4), nullable=False),
+    Column("saldo_centavos", Integer, nullable=False, default=0),
+    Column("cpf_cliente", String(11), nullable=False),
+    Column("limite_centavos", Integer, nullable=False),
+    Column("limite_saques", Integer, nullable=False),
+    Column("tipo_conta", String, nullable=False),
+    Column("contadores_saque", JSON),
+    # Respostas das operações com Idempotency-Key (ver idempotencia.py)
+    Column("idempotencia", JSON),
+    # Incrementada a cada transação: detecta gravações concorrentes de outro processo
+    Column("versao", Integer, nullable=False, default=0, server_default="0"),
+)
+
+tabela_transacoes = Table(
+    "transacoes", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("cpf", String(11), ForeignKey("contas.cpf"), nullable=False),
+    Column("tipo", String, nullable=False),
+    Column("valor_centavos", Integer, nullable=False),
+    Column("data", String, nullable=False),
+    Column("ts", Integer),
+    Column("saldo_apos", Integer),
+    Index("ix_transacoes_cpf_id", "cpf", "id"),
+    Index("ix_transacoes_cpf_ts", "cpf", "ts", "id"),
+)
+
+# Próximo valor = valor + 1; a linha "conta" guarda o último número de conta atribuído
+tabela_sequencias = Table(
+    "sequencias", metadata,
+    Column("nome", String, primary_key=True),
+    Column("valor", Integer, nullable=False),
+)
+
+COLUNAS_CONTA = [c.name for c in tabela_contas.columns]
+COLUNAS_USUARIO = [c.name for c in tabela_usuarios.columns]
+
+# Colunas em reais (REAL) de versões anteriores e as colunas em centavos que as substituem
+COLUNAS_EM_REAIS = (
+    ("contas", "saldo", "saldo_centavos"),
+    ("contas", "limite", "limite_centavos"),
+    ("transacoes", "valor", "valor_centavos"),
+)
+
+
+def _linha_usuario(cpf, usuario):
+    return {k: usuario.get(k) for k in COLUNAS_USUARIO} | {"cpf": cpf, "versao": usuario.get('versao') or 0}
+
+
+def _linha_conta(cpf, conta):
+    return {k: conta.get(k) for k in COLUNAS_CONTA} | {"cpf": cpf, "versao": conta.get('versao') or 0}
+
+
+def _linha_transacao(cpf, transacao, saldo_apos):
+    # A coluna `data` mantém o formato texto das versões anteriores
+    return {"cpf": cpf, "tipo": transacao.tipo, "valor_centavos": transacao.valor_centavos,
+            "data": formatar_data(transacao.ts), "ts": transacao.ts, "saldo_apos": saldo_apos}
+
+
+def _efeito(transacao):
+    return SINAIS[CODIGOS_TIPO[transacao.tipo]] * transacao.valor_centavos
+
+
+def _linhas_transacoes(cpf, transacoes, saldo_inicial):
+    """Linhas das transações com o saldo após cada uma, a partir de `saldo_inicial`"""
+    linhas = []
+    saldo = saldo_inicial
+    for transacao in transacoes:
+        saldo += _efeito(transacao)
+        linhas.append(_linha_transacao(cpf, transacao, saldo))
+    return linhas
+
+
+def _configurar_conexao(conexao_dbapi, _registro):
+    cursor = conexao_dbapi.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def _criar_esquema(conexao):
+    metadata.create_all(conexao)
+    # Bancos criados por versões anteriores: acrescenta as colunas que faltam
+    inspetor = inspect(conexao)
+    for tabela in metadata.sorted_tables:
+        existentes = {c['name'] for c in inspetor.get_columns(tabela.name)}
+        for coluna in tabela.columns:
+            if coluna.name not in existentes:
+                tipo = coluna.type.compile(dialect=conexao.dialect)
+                if coluna.server_default is not None:
+                    tipo += f" NOT NULL DEFAULT {coluna.server_default.arg}"
+                conexao.execute(text(f'ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {tipo}'))
+        for indice in tabela.indexes:
+            indice.create(conexao, checkfirst=True)
+    _converter_para_centavos(conexao)
+    _preencher_timestamps(conexao)
+    _preencher_saldos(conexao)
+    _sincronizar_sequencia(conexao)
+
+
+def _converter_para_centavos(conexao):
+    inspetor = inspect(conexao)
+    for tabela, antiga, nova in COLUNAS_EM_REAIS:
+        if antiga in {c['name'] for c in inspetor.get_columns(tabela)}:
+            conexao.execute(text(
+                f'UPDATE {tabela} SET {nova} = CAST(ROUND({antiga} * 100) AS INTEGER) WHERE {nova} IS NULL'))
+            conexao.execute(text(f'ALTER TABLE {tabela} DROP COLUMN {antiga}'))
+
+
+def _preencher_timestamps(conexao):
+    pendentes = conexao.execute(
+        select(tabela_transacoes.c.id, tabela_transacoes.c.data).where(tabela_transacoes.c.ts.is_(None))
+    ).all()
+    if pendentes:
+        conexao.execute(
+            update(tabela_transacoes).where(tabela_transacoes.c.id == bindparam("_id")),
+            [{"_id": id_, "ts": timestamp_da_data(data)} for id_, data in pendentes]
+        )
+
+
+def _sincronizar_sequencia(conexao):
+    # Bancos anteriores à sequência (ou contas importadas): continua do maior número
+    # existente, sem nunca voltar atrás
+    conexao.execute(text("""
+        INSERT INTO sequencias (nome, valor)
+        SELECT 'conta', COALESCE(MAX(CAST(numero AS INTEGER)), 0) FROM contas WHERE true
+        ON CONFLICT (nome) DO UPDATE SET valor = MAX(valor, excluded.valor)
+    """))
+
+
+def _preencher_saldos(conexao):
+    # Transações gravadas antes da coluna saldo_apos: soma acumulada por conta
+    t = tabela_transacoes.c
+    if conexao.execute(select(t.id).where(t.saldo_apos.is_(None)).limit(1)).first() is None:
+        return
+    sinal = " ".join(f"WHEN '{tipo}' THEN {SINAIS[codigo]}" for tipo, codigo in CODIGOS_TIPO.items())
+    conexao.execute(text(f"""
+        UPDATE transacoes SET saldo_apos = acumulado.saldo
+        FROM (SELECT id, SUM((CASE tipo {sinal} END) * valor_centavos)
+                         OVER (PARTITION BY cpf ORDER BY id) AS saldo
+              FROM transacoes) AS acumulado
+        WHERE acumulado.id = transacoes.id AND transacoes.saldo_apos IS NULL
+    """))
+
+
+class ArmazenamentoSQLite(Armazenamento):
+    """Persiste usuários, contas e transações em um banco SQLite"""
+
+    def __init__(self, url, tamanho_pool=5):
+        self.url = url
+        self.engine = create_async_engine(url, pool_size=tamanho_pool, max_overflow=tamanho_pool)
+        event.listen(self.engine.sync_engine, "connect", _configurar_conexao)
+        self._escrita = asyncio.Lock()
+        self.conflitos = 0
+
+    @asynccontextmanager
+    async def _escrever(self):
+        # O SQLite aceita um escritor por vez: a fila fica no event loop, em ordem,
+        # em vez de várias conexões disputando o lock no busy handler até o timeout
+        async with self._escrita, self.engine.begin() as conexao:
+            yield conexao
+
+    def estatisticas(self):
+        return {"conflitos": self.conflitos}
+
+    async def iniciar(self):
+        async with self.engine.begin() as conexao:
+            await conexao.run_sync(_criar_esquema)
+
+    async def encerrar(self):
+        await self.engine.dispose()
+
+    async def obter_usuario(self, cpf):
+        async with self.engine.connect() as conexao:
+            linha = (await conexao.execute(
+                select(tabela_usuarios).where(tabela_usuarios.c.cpf == cpf)
+            )).mappings().first()
+        return dict(linha) if linha else None
+
+    async def obter_conta(self, cpf):
+        async with self.engine.connect() as conexao:
+            linha = (await conexao.execute(
+                select(tabela_contas).where(tabela_contas.c.cpf == cpf)
+            )).mappings().first()
+        return dict(linha) if linha else None
+
+    async def contar_contas(self):
+        async with self.engine.connect() as conexao:
+            return (await conexao.execute(select(func.count()).select_from(tabela_contas))).scalar_one()
+
+    async def cpf_por_numero(self, numero):
+        # `numero` tem índice único: uma busca no índice, sem ler a conta
+        async with self.engine.connect() as conexao:
+            return (await conexao.execute(
+                select(tabela_contas.c.cpf).where(tabela_contas.c.numero == numero)
+            )).scalar()
+
+    async def listar_transacoes(self, cpf):
+        consulta = (
+            select(tabela_transacoes.c.tipo, tabela_transacoes.c.valor_centavos, tabela_transacoes.c.ts)
+            .where(tabela_transacoes.c.cpf == cpf)
+            .order_by(tabela_transacoes.c.id)
+        )
+        historico = HistoricoTransacoes()
+        async with self.engine.connect() as conexao:
+            historico.estender(Transacao(*linha) for linha in await conexao.execute(consulta))
+        return historico
+
+    async def paginar_transacoes(self, cpf, desde=None, ate=None, cursor=None, limite=100):
+        t = tabela_transacoes.c
+        consulta = select(t.id, t.tipo, t.valor_centavos, t.ts).where(t.cpf == cpf)
+        if desde is not None:
+            consulta = consulta.where(t.ts >= desde)
+        if ate is not None:
+            consulta = consulta.where(t.ts <= ate)
+        if cursor is not None:
+            # Paginação por chave (ts, id): continua exatamente após a última linha entregue
+            if not (isinstance(cursor, list) and len(cursor) == 2
+                    and all(type(v) is int for v in cursor)):
+                raise ValueError("cursor")
+            consulta = consulta.where(tuple_(t.ts, t.id) > tuple_(*cursor))
+        consulta = consulta.order_by(t.ts, t.id).limit(limite + 1)
+        async with self.engine.connect() as conexao:
+            if cursor is not None:
+                # Só vale um cursor entregue por este backend: a última linha de uma página do CPF
+                ts_cursor = (await conexao.execute(
+                    select(t.ts).where(t.id == cursor[1], t.cpf == cpf))).scalar()
+                if ts_cursor != cursor[0]:
+                    raise ValueError("cursor")
+            linhas = (await conexao.execute(consulta)).all()
+        proximo = [linhas[limite - 1].ts, linhas[limite - 1].id] if len(linhas) > limite else None
+        return [Transacao(l.tipo, l.valor_centavos, l.ts) for l in linhas[:limite]], proximo
+
+    async def saldo_em(self, cpf, ts):
+        t = tabela_transacoes.c
+        consulta = (
+            select(t.saldo_apos).where(t.cpf == cpf, t.ts <= ts)
+            .order_by(t.ts.desc(), t.id.desc()).limit(1)
+        )
+        async with self.engine.connect() as conexao:
+            saldo = (await conexao.execute(consulta)).scalar()
+        return saldo or 0
+
+    async def registrar_cliente(self, usuario, conta):
+        try:
+            async with self._escrever() as conexao:
+                # O lock de escrita do SQLite vale entre processos: números nunca se repetem
+                sequencial = (await conexao.execute(
+                    update(tabela_sequencias).where(tabela_sequencias.c.nome == "conta")
+                    .values(valor=tabela_sequencias.c.valor + 1)
+                    .returning(tabela_sequencias.c.valor)
+                )).scalar_one()
+                conta['numero'] = numero_conta(sequencial)
+                await conexao.execute(insert(tabela_usuarios).values(
+                    _linha_usuario(usuario['cpf'], usuario)))
+                await conexao.execute(insert(tabela_contas).values(
+                    _linha_conta(usuario['cpf'], conta)))
+        except IntegrityError:
+            raise CPFDuplicado(usuario['cpf'])
+
+    async def atualizar_usuario(self, cpf, campos, versao=None):
+        condicoes = [tabela_usuarios.c.cpf == cpf]
+        if versao is not None:
+            condicoes.append(tabela_usuarios.c.versao == versao)
+        async with self._escrever() as conexao:
+            resultado = await conexao.execute(
+                update(tabela_usuarios).where(*condicoes)
+                .values(campos | {"versao": tabela_usuarios.c.versao + 1}))
+            if versao is not None and resultado.rowcount != 1:
+                self.conflitos += 1
+                raise ConflitoConcorrencia(cpf)
+
+    async def _atualizar_estado(self, conexao, cpf, conta, chave_idempotencia=None):
+        """Grava o estado da conta se ninguém a alterou desde a leitura
+
+        A coluna `idempotencia` só é regravada pela operação que registrou uma chave.
+        """
+        versao = conta.get('versao') or 0
+        valores = {campo: conta.get(campo) for campo in CAMPOS_ESTADO_CONTA} | {"versao": versao + 1}
+        if chave_idempotencia:
+            valores["idempotencia"] = conta.get('idempotencia')
+        resultado = await conexao.execute(
+            update(tabela_contas)
+            .where(tabela_contas.c.cpf == cpf, tabela_contas.c.versao == versao)
+            .values(valores)
+        )
+        if resultado.rowcount != 1:
+            self.conflitos += 1
+            raise ConflitoConcorrencia(cpf)
+        conta['versao'] = versao + 1
+
+    async def registrar_transacao(self, cpf, conta, transacao, chave_idempotencia=None):
+        async with self._escrever() as conexao:
+            await self._atualizar_estado(conexao, cpf, conta, chave_idempotencia)
+            await conexao.execute(insert(tabela_transacoes).values(
+                _linha_transacao(cpf, transacao, conta['saldo_centavos'])))
+
+    async def registrar_transacoes(self, cpf, conta, transacoes):
+        async with self._escrever() as conexao:
+            await self._atualizar_estado(conexao, cpf, conta)
+            saldo_inicial = conta['saldo_centavos'] - sum(_efeito(t) for t in transacoes)
+            await conexao.execute(insert(tabela_transacoes),
+                                  _linhas_transacoes(cpf, transacoes, saldo_inicial))
+
+    async def registrar_transferencia(self, partes, chave_idempotencia=None):
+        # Uma transação SQL: se qualquer conta mudou desde a leitura, nenhuma é gravada
+        async with self._escrever() as conexao:
+            for i, (cpf, conta, transacao) in enumerate(partes):
+                await self._atualizar_estado(conexao, cpf, conta, chave_idempotencia if i == 0 else None)
+                await conexao.execute(insert(tabela_transacoes).values(
+                    _linha_transacao(cpf, transacao, conta['saldo_centavos'])))
+
+    async def carregar_usuarios(self):
+        async with self.engine.connect() as conexao:
+            linhas = (await conexao.execute(select(tabela_usuarios))).mappings()
+            return {linha['cpf']: dict(linha) for linha in linhas}
+
+    async def carregar_contas(self):
+        async with self.engine.connect() as conexao:
+            contas = {
+                linha['cpf']: {**linha, "historico_transacoes": HistoricoTransacoes()}
+                for linha in (await conexao.execute(select(tabela_contas))).mappings()
+            }
+            t = tabela_transacoes.c
+            linhas = await conexao.execute(select(t.cpf, t.tipo, t.valor_centavos, t.ts).order_by(t.id))
+            for cpf, tipo, valor, ts in linhas:
+                contas[cpf]['historico_transacoes'].anexar(Transacao(tipo, valor, ts))
+        return contas
+
+    async def salvar_usuarios(self, usuarios):
+        async with self._escrever() as conexao:
+            await conexao.execute(delete(tabela_usuarios))
+            if usuarios:
+                await conexao.execute(insert(tabela_usuarios), [
+                    _linha_usuario(cpf, u) for cpf, u in usuarios.items()
+                ])
+
+    async def salvar_contas(self, contas):
+        async with self._escrever() as conexao:
+            await conexao.execute(delete(tabela_transacoes))
+            await conexao.execute(delete(tabela_contas))
+            if not contas:
+                return
+            await conexao.execute(insert(tabela_contas), [
+                _linha_conta(cpf, c)
+                for cpf, c in contas.items()
+            ])
+            transacoes = [
+                linha
+                for cpf, c in contas.items()
+                for linha in _linhas_transacoes(cpf, c.get('historico_transacoes', ()), 0)
+            ]
+            if transacoes:
+                await conexao.execute(insert(tabela_transacoes), transacoes)
+            await conexao.run_sync(_sincronizar_sequencia)
@@ -0,0 +1,133 @@
+"""
+Arquivo frio do histórico: segmentos binários de largura fixa por conta
+
+O backend JSON mantém em memória (e no `contas.json`) só a janela quente do
+histórico; as transações mais antigas vão para `<diretorio>/<cpf>.seg`, um
+arquivo só de acréscimos com um registro de 25 bytes por transação:
+timestamp, valor em centavos, saldo após a transação (int64) e código do tipo
+(uint8). Como os registros têm largura fixa e estão em ordem cronológica, a
+posição i começa em CABECALHO + i * TAMANHO_REGISTRO: a leitura de um trecho
+e a busca binária por data acontecem direto no `mmap`, sem carregar o arquivo.
+
+Quem grava o segmento é quem sabe quantas transações já foram confirmadas
+(`quantidade`, gravada no snapshot da conta). Registros além dela são sobras
+de um arquivamento interrompido antes do snapshot: a próxima gravação trunca o
+segmento nesse ponto e as leituras nunca passam dele.
+"""
+
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+
+from transacoes import CODIGOS_TIPO, SINAIS, TIPOS, Transacao
+
+MAGICO = b"HSEG0001"
+CABECALHO = len(MAGICO)
+REGISTRO = struct.Struct("<qqqB")   # ts, valor_centavos, saldo_apos, código do tipo
+TAMANHO_REGISTRO = REGISTRO.size
+TIMESTAMP = struct.Struct("<q")
+SALDO = struct.Struct("<q")
+DESLOCAMENTO_SALDO = 16
+
+
+def _sincronizar_diretorio(diretorio):
+    """fsync do diretório: a entrada de um segmento novo sobrevive a uma queda"""
+    try:
+        fd = os.open(diretorio, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class ArquivoFrio:
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+
+    def caminho(self, cpf):
+        return os.path.join(self.diretorio, f"{cpf}.seg")
+
+    # Executado no pool de I/O
+
+    def gravar(self, cpf, inicio, transacoes, saldo_inicial):
+        """Grava as transações a partir da posição `inicio`, com o saldo antes delas
+
+        Tudo a partir de `inicio` é substituído; o arquivo é sincronizado antes de
+        retornar, para que a conta só deixe a memória depois de estar no disco.
+        """
+        os.makedirs(self.diretorio, exist_ok=True)
+        caminho = self.caminho(cpf)
+        registros = bytearray()
+        saldo = saldo_inicial
+        for tipo, valor, ts in transacoes:
+            codigo = CODIGOS_TIPO[tipo]
+            saldo += SINAIS[codigo] * valor
+            registros += REGISTRO.pack(ts, valor, saldo, codigo)
+        novo = not os.path.exists(caminho)
+        with open(caminho, "w+b" if novo else "r+b") as f:
+            if inicio == 0:
+                f.truncate(0)
+                f.write(MAGICO)
+            else:
+                f.truncate(CABECALHO + inicio * TAMANHO_REGISTRO)
+                f.seek(0, os.SEEK_END)
+            f.write(registros)
+            f.flush()
+            os.fsync(f.fileno())
+        if novo:
+            _sincronizar_diretorio(self.diretorio)
+
+    # Leituras: só até `quantidade`, o total confirmado pelo snapshot da conta
+
+    @contextmanager
+    def _mapear(self, cpf):
+        with open(self.caminho(cpf), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            yield m
+
+    def _buscar(self, m, quantidade, ts, direita):
+        """bisect_left (ou bisect_right) de `ts` na coluna de timestamps do segmento"""
+        baixo, alto = 0, quantidade
+        while baixo < alto:
+            meio = (baixo + alto) // 2
+            valor = TIMESTAMP.unpack_from(m, CABECALHO + meio * TAMANHO_REGISTRO)[0]
+            if valor < ts or (direita and valor == ts):
+                baixo = meio + 1
+            else:
+                alto = meio
+        return baixo
+
+    def limites(self, cpf, quantidade, desde=None, ate=None):
+        """Posições [inicio, fim) das transações com timestamp entre `desde` e `ate` (inclusivos)"""
+        if quantidade == 0:
+            return 0, 0
+        with self._mapear(cpf) as m:
+            inicio = self._buscar(m, quantidade, desde, False) if desde is not None else 0
+            fim = self._buscar(m, quantidade, ate, True) if ate is not None else quantidade
+        return inicio, fim
+
+    def ler(self, cpf, inicio, fim):
+        """Transações nas posições [inicio, fim)"""
+        if fim <= inicio:
+            return []
+        with self._mapear(cpf) as m:
+            return [
+                Transacao(TIPOS[codigo], valor, ts)
+                for ts, valor, _, codigo in REGISTRO.iter_unpack(
+                    m[CABECALHO + inicio * TAMANHO_REGISTRO:CABECALHO + fim * TAMANHO_REGISTRO])
+            ]
+
+    def saldo_em(self, cpf, quantidade, ts):
+        """Saldo em centavos após as transações arquivadas com timestamp <= ts"""
+        if quantidade == 0:
+            return 0
+        with self._mapear(cpf) as m:
+            posicao = self._buscar(m, quantidade, ts, True)
+            if posicao == 0:
+                return 0
+            return SALDO.unpack_from(
+                m, CABECALHO + (posicao - 1) * TAMANHO_REGISTRO + DESLOCAMENTO_SALDO)[0]
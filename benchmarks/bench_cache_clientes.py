@@ -0,0 +1,63 @@
+"""
+Benchmark: visão do cliente (titular + conta) com e sem o cache de clientes
+
+Mede `obter_cliente`, usada por saldo, extrato e perfil, sobre o backend SQLite:
+sem cache cada chamada faz duas consultas (conta e usuário); com cache, nenhuma.
+
+Uso: python benchmarks/bench_cache_clientes.py [requisicoes]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import api
+from armazenamento_sqlite import ArmazenamentoSQLite
+from cache_clientes import CacheClientes
+
+N_CLIENTES = 100
+
+
+async def medir(requisicoes):
+    inicio = time.perf_counter()
+    for i in range(requisicoes):
+        await api.obter_cliente(f"{i % N_CLIENTES + 1:011d}")
+    return (time.perf_counter() - inicio) / requisicoes
+
+
+async def main():
+    requisicoes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        api.armazenamento = ArmazenamentoSQLite(
+            f"sqlite+aiosqlite:///{os.path.join(diretorio, 'banco.db')}")
+        await api.armazenamento.iniciar()
+        for i in range(N_CLIENTES):
+            cpf = f"{i + 1:011d}"
+            await api.armazenamento.registrar_cliente(
+                {"cpf": cpf, "nome": f"Cliente {i + 1}", "senha": "x"},
+                {"agencia": "0001", "saldo_centavos": 0, "cpf_cliente": cpf, "limite_centavos": 50000,
+                 "limite_saques": 3, "tipo_conta": "ContaCorrente"}
+            )
+
+        api.cache_clientes = CacheClientes(capacidade=0)
+        sem_cache = await medir(requisicoes)
+
+        api.cache_clientes = CacheClientes()
+        com_cache = await medir(requisicoes)
+        estatisticas = api.cache_clientes.estatisticas()
+
+        await api.armazenamento.encerrar()
+
+    print(f"{requisicoes} consultas da visão de {N_CLIENTES} clientes (SQLite)")
+    print(f"  Sem cache: {sem_cache * 1e6:10.2f} µs/consulta")
+    print(f"  Com cache: {com_cache * 1e6:10.2f} µs/consulta "
+          f"(taxa de acerto {estatisticas['taxa_acerto']:.2%})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""
+Benchmark: memória da exportação do extrato em streaming
+
+Exporta o histórico completo de uma conta (backend JSON) com
+`api.exportar_transacoes`, consumindo o gerador como a StreamingResponse faz, e
+compara o pico de memória alocada (tracemalloc) com montar o extrato inteiro em
+um único documento JSON. Na exportação o pico depende só do tamanho da página
+(`api.PAGINA_EXPORTACAO`), não do tamanho do histórico.
+
+Uso: python benchmarks/bench_exportacao.py [transacoes ...]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import api
+from armazenamento import ArmazenamentoJSON
+from respostas import serializar
+from transacoes import HistoricoTransacoes, Transacao
+
+CPF = "00000000001"
+
+
+def conta_com_historico(n):
+    historico = HistoricoTransacoes()
+    inicio = 1_600_000_000
+    historico.estender(
+        Transacao("Saque" if i % 4 == 0 else "Deposito", 1000 + i % 500, inicio + i * 7)
+        for i in range(n)
+    )
+    return {"agencia": "0001", "numero": "000001", "saldo_centavos": historico.saldo_acumulado,
+            "cpf_cliente": CPF, "limite_centavos": 50000, "limite_saques": 3,
+            "tipo_conta": "ContaCorrente", "historico_transacoes": historico}
+
+
+async def exportar(formato):
+    total = 0
+    async for pedaco in api.exportar_transacoes(CPF, formato, None, None, 0):
+        total += len(pedaco)
+    return total
+
+
+async def documento_unico():
+    pagina, _ = await api.armazenamento.paginar_transacoes(CPF, limite=10**9)
+    return len(serializar({"transacoes": api.transacoes_json(pagina)}))
+
+
+async def medir(corrotina):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    tamanho = await corrotina
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return pico, duracao, tamanho
+
+
+async def main():
+    tamanhos = [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    with tempfile.TemporaryDirectory() as diretorio:
+        for n in tamanhos:
+            api.armazenamento = ArmazenamentoJSON(
+                os.path.join(diretorio, "usuarios.json"),
+                os.path.join(diretorio, "contas.json"),
+                os.path.join(diretorio, "journal.jsonl")
+            )
+            await api.armazenamento.iniciar()
+            await api.armazenamento.salvar_contas({CPF: conta_com_historico(n)})
+            print(f"{n} transações")
+            for nome, corrotina in (("CSV em streaming", exportar("csv")),
+                                    ("NDJSON em streaming", exportar("ndjson")),
+                                    ("JSON único", documento_unico())):
+                pico, duracao, tamanho = await medir(corrotina)
+                print(f"  {nome:20s} pico {pico / 2**20:8.2f} MiB | {duracao:6.2f} s | "
+                      f"{tamanho / 2**20:8.2f} MiB gerados")
+            # Sem checkpoint: os snapshots deste benchmark não interessam
+            api.armazenamento._sujos.clear()
+            api.armazenamento.registros_journal = 0
+            await api.armazenamento.encerrar()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""
+Benchmark: serialização de um extrato de 10k transações
+
+Compara o caminho antigo (lista de TransacaoResponse dentro de ExtratoResponse,
+validados e serializados pelo response_model) com o atual: dict montado direto
+das transações gravadas e serializado pela RespostaJSON (orjson, se instalado).
+Mede só a montagem e a serialização do corpo, sem HTTP nem armazenamento.
+
+Uso: python benchmarks/bench_extrato.py [transacoes] [repeticoes]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pydantic import TypeAdapter
+
+import respostas
+from api import ExtratoResponse, TransacaoResponse, transacoes_json
+from respostas import RespostaJSON
+from transacoes import HistoricoTransacoes, Transacao, formatar_data, para_reais
+
+
+def montar_historico(n):
+    historico = HistoricoTransacoes()
+    inicio = 1_700_000_000
+    historico.estender(
+        Transacao("Deposito" if i % 3 else "Saque", 1000 + i % 500, inicio + i * 7)
+        for i in range(n)
+    )
+    return historico
+
+
+def cabecalho(historico):
+    saldo = para_reais(historico.saldo_acumulado)
+    return {"numero_conta": "000001", "agencia": "0001", "titular": "Cliente",
+            "saldo": saldo, "saldo_inicial": 0.0, "saldo_final": saldo, "proximo_cursor": None}
+
+
+def caminho_modelos(historico, adaptador):
+    """Como o endpoint fazia: modelos intermediários + response_model do FastAPI"""
+    transacoes = [
+        TransacaoResponse.model_construct(
+            tipo=t.tipo, valor=para_reais(t.valor_centavos), data=formatar_data(t.ts))
+        for t in historico
+    ]
+    extrato = ExtratoResponse(transacoes=transacoes, **cabecalho(historico))
+    return adaptador.dump_json(adaptador.validate_python(extrato))
+
+
+def caminho_direto(historico):
+    return RespostaJSON({**cabecalho(historico), "transacoes": transacoes_json(historico)}).body
+
+
+def medir(funcao, repeticoes):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        corpo = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, len(corpo)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeticoes = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    historico = montar_historico(n)
+    adaptador = TypeAdapter(ExtratoResponse)
+
+    print(f"Extrato com {n} transações (melhor de {repeticoes})")
+    tempo, tamanho = medir(lambda: caminho_modelos(historico, adaptador), repeticoes)
+    print(f"  Modelos + response_model: {tempo * 1e3:8.2f} ms ({tamanho} bytes)")
+    tempo_direto, tamanho = medir(lambda: caminho_direto(historico), repeticoes)
+    codificador = "orjson" if respostas.orjson is not None else "json"
+    print(f"  Dict direto ({codificador:6s}):    {tempo_direto * 1e3:8.2f} ms ({tamanho} bytes)")
+    if respostas.orjson is not None:
+        orjson, respostas.orjson = respostas.orjson, None
+        try:
+            tempo_json, tamanho = medir(lambda: caminho_direto(historico), repeticoes)
+        finally:
+            respostas.orjson = orjson
+        print(f"  Dict direto (json):      {tempo_json * 1e3:8.2f} ms ({tamanho} bytes)")
+    print(f"  Ganho: {tempo / tempo_direto:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
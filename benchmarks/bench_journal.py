@@ -0,0 +1,95 @@
+"""
+Benchmark: regravação completa de contas.json x journal append-only
+
+Simula um banco com N contas e M transações por conta e mede quantas
+gravações por segundo cada estratégia sustenta.
+
+Uso: python benchmarks/bench_journal.py [contas] [transacoes_por_conta] [gravacoes]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from armazenamento import ArmazenamentoJSON, preparar_conta
+from transacoes import Transacao
+
+
+def gerar_banco(n_contas, n_transacoes):
+    contas = {}
+    for i in range(n_contas):
+        cpf = f"{i:011d}"
+        contas[cpf] = {
+            "numero": f"{i + 1:06d}",
+            "agencia": "0001",
+            "saldo": float(n_transacoes),
+            "cpf_cliente": cpf,
+            "limite": 500,
+            "limite_saques": 3,
+            "historico_transacoes": [
+                {"tipo": "Deposito", "valor": 1.0, "data": "10-01-2026 22:35:08"}
+                for _ in range(n_transacoes)
+            ],
+            "tipo_conta": "ContaCorrente"
+        }
+    return contas
+
+
+def medir_regravacao(diretorio, contas, gravacoes):
+    caminho = os.path.join(diretorio, "contas.json")
+    conta = next(iter(contas.values()))
+    inicio = time.perf_counter()
+    for _ in range(gravacoes):
+        conta['saldo'] += 1.0
+        conta['historico_transacoes'].append(
+            {"tipo": "Deposito", "valor": 1.0, "data": "10-01-2026 22:35:08"})
+        # Comportamento anterior de salvar_contas()
+        with open(caminho, 'w', encoding='utf-8') as f:
+            json.dump(contas, f, indent=4, ensure_ascii=False)
+    return gravacoes / (time.perf_counter() - inicio)
+
+
+async def medir_journal(diretorio, contas, gravacoes):
+    armazenamento = ArmazenamentoJSON(
+        os.path.join(diretorio, "usuarios.json"),
+        os.path.join(diretorio, "contas.json"),
+        os.path.join(diretorio, "journal.jsonl"),
+        limite_journal=gravacoes + 1
+    )
+    for conta in contas.values():
+        preparar_conta(conta)
+    armazenamento.usuarios, armazenamento.contas = {}, contas
+    cpf, conta = next(iter(contas.items()))
+    inicio = time.perf_counter()
+    for _ in range(gravacoes):
+        conta['saldo_centavos'] += 100
+        await armazenamento.registrar_transacao(
+            cpf, conta, Transacao("Deposito", 100, int(time.time())))
+    await armazenamento.encerrar()
+    return gravacoes / (time.perf_counter() - inicio)
+
+
+def main():
+    n_contas = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    n_transacoes = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    gravacoes = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    print(f"Banco: {n_contas} contas x {n_transacoes} transações")
+    with tempfile.TemporaryDirectory() as diretorio:
+        regravacao = medir_regravacao(diretorio, gerar_banco(n_contas, n_transacoes), gravacoes)
+    with tempfile.TemporaryDirectory() as diretorio:
+        journal = asyncio.run(
+            medir_journal(diretorio, gerar_banco(n_contas, n_transacoes), gravacoes * 100))
+
+    print(f"  Regravação completa: {regravacao:12.1f} gravações/s")
+    print(f"  Journal append-only: {journal:12.1f} gravações/s")
+    print(f"  Ganho:               {journal / regravacao:12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: memória do histórico de transações
+
+Compara a representação anterior (lista de dicts com a data formatada) com o
+`HistoricoTransacoes` em colunas, medindo com tracemalloc a memória alocada
+por 10^6 transações, e o tempo de contar os saques de um dia em cada uma.
+
+Uso: python benchmarks/bench_memoria_historico.py [transacoes]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from transacoes import FORMATO_DATA, HistoricoTransacoes, Transacao
+
+
+def medir_memoria(construir):
+    tracemalloc.start()
+    objeto = construir()
+    memoria, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objeto, memoria
+
+
+def main():
+    n_transacoes = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    base = int(datetime(2026, 1, 1).timestamp())
+
+    # Valores e datas distintos, como em um histórico real
+    def como_dicts():
+        return [
+            {"tipo": "Saque" if i % 3 == 0 else "Deposito", "valor": float(i % 500) + 0.5,
+             "data": datetime.fromtimestamp(base + i * 7).strftime(FORMATO_DATA)}
+            for i in range(n_transacoes)
+        ]
+
+    def em_colunas():
+        historico = HistoricoTransacoes()
+        historico.estender(
+            Transacao("Saque" if i % 3 == 0 else "Deposito", (i % 500) * 100 + 50, base + i * 7)
+            for i in range(n_transacoes)
+        )
+        return historico
+
+    dicts, memoria_dicts = medir_memoria(como_dicts)
+    historico, memoria_colunas = medir_memoria(em_colunas)
+
+    dia = datetime.fromtimestamp(base + n_transacoes * 7 // 2)
+    chave = dia.strftime("%d-%m-%Y")
+    inicio_dia = int(datetime.strptime(chave, "%d-%m-%Y").timestamp())
+
+    inicio = time.perf_counter()
+    antigo = sum(1 for t in dicts if t['tipo'] == 'Saque' and t['data'].startswith(chave))
+    tempo_dicts = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    novo = historico.contar("Saque", inicio_dia, inicio_dia + 86400)
+    tempo_colunas = time.perf_counter() - inicio
+    assert antigo == novo
+
+    por_milhao = 1_000_000 / n_transacoes / 2 ** 20
+    print(f"Histórico com {n_transacoes} transações")
+    print(f"  Lista de dicts:   {memoria_dicts * por_milhao:10.1f} MiB por 10^6 "
+          f"({memoria_dicts / n_transacoes:6.1f} bytes/transação)")
+    print(f"  Colunas:          {memoria_colunas * por_milhao:10.1f} MiB por 10^6 "
+          f"({memoria_colunas / n_transacoes:6.1f} bytes/transação)")
+    print(f"  Redução:          {memoria_dicts / memoria_colunas:10.1f}x")
+    print(f"  Saques do dia (varredura de dicts): {tempo_dicts * 1e3:10.2f} ms")
+    print(f"  Saques do dia (busca binária):      {tempo_colunas * 1e3:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
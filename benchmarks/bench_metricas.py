@@ -0,0 +1,67 @@
+"""
+Benchmark: custo do middleware de métricas por requisição
+
+Chama uma aplicação ASGI mínima diretamente (sem rede nem servidor), com e sem
+`MiddlewareMetricas`, e mede também uma observação isolada de histograma. A
+diferença é o que as métricas acrescentam a cada requisição da API.
+
+Uso: python benchmarks/bench_metricas.py [requisicoes]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from metricas import Histograma, Metricas, MiddlewareMetricas
+
+
+class Rota:
+    path = "/api/v1/conta/saldo"
+
+
+async def aplicacao(scope, receive, send):
+    # Faz o que o roteamento faz: anota a rota no escopo e responde
+    scope["route"] = Rota
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def receber():
+    return {"type": "http.request", "body": b""}
+
+
+async def enviar(mensagem):
+    pass
+
+
+async def medir(app, requisicoes):
+    inicio = time.perf_counter()
+    for _ in range(requisicoes):
+        await app({"type": "http", "method": "GET", "path": "/api/v1/conta/saldo"}, receber, enviar)
+    return (time.perf_counter() - inicio) / requisicoes
+
+
+async def main():
+    requisicoes = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    sem_metricas = await medir(aplicacao, requisicoes)
+    com_metricas = await medir(MiddlewareMetricas(aplicacao, Metricas()), requisicoes)
+
+    histograma = Histograma()
+    inicio = time.perf_counter()
+    for i in range(requisicoes):
+        histograma.observar(i * 1e-7)
+    observacao = (time.perf_counter() - inicio) / requisicoes
+
+    print(f"{requisicoes} requisições ASGI")
+    print(f"  Sem métricas: {sem_metricas * 1e6:8.2f} µs/requisição")
+    print(f"  Com métricas: {com_metricas * 1e6:8.2f} µs/requisição "
+          f"(+{(com_metricas - sem_metricas) * 1e6:.2f} µs)")
+    print(f"  Observação de histograma: {observacao * 1e9:.0f} ns")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+"""
+Benchmark: reconciliação vetorizada de saldos
+
+Gera N contas com M transações cada (10^7 no total, por padrão), corrompe o
+saldo de algumas e mede o tempo de `reconciliar` com NumPy e com o caminho
+alternativo em `array('q')`.
+
+Uso: python benchmarks/bench_reconciliacao.py [contas] [transacoes_por_conta]
+"""
+
+import os
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import reconciliar
+from transacoes import CODIGOS_TIPO, HistoricoTransacoes
+
+
+def gerar_contas(n_contas, n_transacoes):
+    # Padrão de 4 transações: três depósitos e um saque
+    padrao_tipos = bytes([CODIGOS_TIPO["Deposito"]] * 3 + [CODIGOS_TIPO["Saque"]])
+    padrao_valores = [1050, 299, 10000, 7525]
+    repeticoes = n_transacoes // 4
+    saldo = repeticoes * (1050 + 299 + 10000 - 7525)
+    contas = {}
+    for i in range(n_contas):
+        historico = HistoricoTransacoes()
+        historico.ts = array('q', range(1_767_225_600, 1_767_225_600 + repeticoes * 4))
+        historico.tipos = bytearray(padrao_tipos * repeticoes)
+        historico.valores = array('q', padrao_valores * repeticoes)
+        contas[f"{i:011d}"] = {"saldo_centavos": saldo, "historico_transacoes": historico}
+    return contas
+
+
+def medir(contas):
+    inicio = time.perf_counter()
+    divergencias = reconciliar.reconciliar(contas)
+    return time.perf_counter() - inicio, divergencias
+
+
+def main():
+    n_contas = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    n_transacoes = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    contas = gerar_contas(n_contas, n_transacoes)
+    corrompidas = list(contas)[::max(1, n_contas // 5)]
+    for cpf in corrompidas:
+        contas[cpf]['saldo_centavos'] += 1
+    total = sum(len(c['historico_transacoes']) for c in contas.values())
+
+    print(f"{n_contas} contas, {total} transações, {len(corrompidas)} saldos corrompidos")
+    if reconciliar.np is not None:
+        duracao, divergencias = medir(contas)
+        assert [d[0] for d in divergencias] == corrompidas
+        print(f"  NumPy:       {duracao:8.2f} s ({total / duracao / 1e6:6.1f} M transações/s)")
+    numpy, reconciliar.np = reconciliar.np, None
+    try:
+        duracao, divergencias = medir(contas)
+    finally:
+        reconciliar.np = numpy
+    assert [d[0] for d in divergencias] == corrompidas
+    print(f"  array('q'):  {duracao:8.2f} s ({total / duracao / 1e6:6.1f} M transações/s)")
+
+
+if __name__ == "__main__":
+    main()
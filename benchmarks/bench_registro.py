@@ -0,0 +1,82 @@
+"""
+Benchmark: cadastro em massa de clientes
+
+Registra N clientes (10^5 por padrão) em lotes simultâneos direto no
+armazenamento, com o hash de senha já calculado (o bcrypt não é o foco aqui).
+Mede a vazão do primeiro e do último décimo dos cadastros: com o número de conta
+vindo de uma sequência e sem regravar a base a cada cadastro, o custo não cresce
+com o tamanho do banco. Ao final confere que nenhum número se repetiu.
+
+Uso: python benchmarks/bench_registro.py [clientes] [simultaneos]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from armazenamento import ArmazenamentoJSON
+
+HASH_SENHA = "$2b$04$" + "x" * 53
+
+
+def novo_cliente(indice):
+    cpf = f"{indice:011d}"
+    usuario = {"cpf": cpf, "nome": f"Cliente {indice}", "data_nascimento": "01-01-1990",
+               "endereco": "Rua Teste, 1", "senha": HASH_SENHA, "data_criacao": "01-01-2026 00:00:00"}
+    conta = {"agencia": "0001", "saldo_centavos": 0, "cpf_cliente": cpf, "limite_centavos": 50000,
+             "limite_saques": 3, "contadores_saque": {}, "tipo_conta": "ContaCorrente"}
+    return usuario, conta
+
+
+async def medir(armazenamento, clientes, simultaneos):
+    await armazenamento.iniciar()
+    decimo = max(1, clientes // 10)
+    tempos = []
+    numeros = []
+    try:
+        inicio = time.perf_counter()
+        for lote in range(0, clientes, simultaneos):
+            novos = [novo_cliente(i + 1) for i in range(lote, min(lote + simultaneos, clientes))]
+            await asyncio.gather(*[armazenamento.registrar_cliente(u, c) for u, c in novos])
+            numeros.extend(c['numero'] for _, c in novos)
+            tempos.append((len(numeros), time.perf_counter() - inicio))
+    finally:
+        await armazenamento.encerrar()
+    total = tempos[-1][1]
+    # Marcas (cadastros concluídos, segundos) ao fim dos lotes que fecham cada décimo
+    n0, t0 = next((n, t) for n, t in tempos if n >= decimo)
+    n1, t1 = next((n, t) for n, t in reversed(tempos) if n <= clientes - decimo)
+
+    assert len(set(numeros)) == clientes, "número de conta repetido"
+    return total, n0 / t0, (clientes - n1) / (total - t1)
+
+
+async def main():
+    clientes = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    simultaneos = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    print(f"{clientes} cadastros, {simultaneos} simultâneos")
+    with tempfile.TemporaryDirectory() as diretorio:
+        backends = {"JSON": ArmazenamentoJSON(
+            os.path.join(diretorio, "usuarios.json"),
+            os.path.join(diretorio, "contas.json"),
+            os.path.join(diretorio, "journal.jsonl")
+        )}
+        try:
+            from armazenamento_sqlite import ArmazenamentoSQLite
+            backends["SQLite"] = ArmazenamentoSQLite(
+                f"sqlite+aiosqlite:///{os.path.join(diretorio, 'banco.db')}")
+        except ImportError:
+            print("  SQLite: SQLAlchemy/aiosqlite não instalados")
+        for nome, armazenamento in backends.items():
+            total, primeiro, ultimo = await medir(armazenamento, clientes, simultaneos)
+            print(f"  {nome:7s} {total:7.2f} s | primeiro décimo {primeiro:8.0f}/s | "
+                  f"último décimo {ultimo:8.0f}/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,57 @@
+"""
+Micro-benchmark: varredura do histórico x contador diário de saques
+
+Compara a contagem antiga (percorre todo o `historico_transacoes`) com os
+contadores mantidos na conta, para uma conta com 10^5 transações.
+
+Uso: python benchmarks/bench_saques.py [transacoes] [repeticoes]
+"""
+
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from api import calcular_contadores_saque, contar_saques
+from transacoes import HistoricoTransacoes
+
+
+def contar_saques_dia_antigo(transacoes):
+    # Implementação anterior: O(tamanho do histórico) a cada saque
+    hoje = datetime.now().strftime("%d-%m-%Y")
+    return sum(1 for t in transacoes
+               if t['tipo'] == 'Saque' and t['data'].startswith(hoje))
+
+
+def medir(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+def main():
+    n_transacoes = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    repeticoes = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    agora = datetime.now()
+    transacoes = [
+        {"tipo": "Saque" if i % 2 else "Deposito", "valor": 1.0, "data": "10-01-2026 22:35:08"}
+        for i in range(n_transacoes)
+    ]
+    conta = {"contadores_saque": calcular_contadores_saque(
+        HistoricoTransacoes.de_lista(transacoes), agora)}
+
+    antigo = medir(lambda: contar_saques_dia_antigo(transacoes), repeticoes)
+    contador = medir(lambda: contar_saques(conta, "dia", agora), repeticoes * 1000)
+
+    print(f"Conta com {n_transacoes} transações")
+    print(f"  Varredura do histórico: {antigo * 1e6:12.2f} µs/saque")
+    print(f"  Contador persistido:    {contador * 1e6:12.2f} µs/saque")
+    print(f"  Ganho:                  {antigo / contador:12.0f}x")
+
+
+if __name__ == "__main__":
+    main()
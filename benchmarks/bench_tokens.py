@@ -0,0 +1,66 @@
+"""
+Benchmark: custo de autenticação por requisição com e sem o cache de tokens
+
+Mede `verificar_token` para o mesmo token reutilizado em N requisições,
+como fazem os clientes durante os ACCESS_TOKEN_EXPIRE_MINUTES de validade.
+
+Uso: python benchmarks/bench_tokens.py [requisicoes]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+import api
+from armazenamento import ArmazenamentoJSON
+from cache_tokens import CacheTokens
+
+
+async def medir(credenciais, requisicoes):
+    inicio = time.perf_counter()
+    for _ in range(requisicoes):
+        await api.verificar_token(credenciais)
+    return (time.perf_counter() - inicio) / requisicoes
+
+
+async def main():
+    requisicoes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        api.armazenamento = ArmazenamentoJSON(
+            os.path.join(diretorio, "usuarios.json"),
+            os.path.join(diretorio, "contas.json"),
+            os.path.join(diretorio, "journal.jsonl")
+        )
+        await api.armazenamento.iniciar()
+        await api.armazenamento.registrar_cliente(
+            {"cpf": "12345678901", "nome": "Benchmark", "senha": "senha123"},
+            {"numero": "000001", "saldo_centavos": 0}
+        )
+        credenciais = HTTPAuthorizationCredentials(
+            scheme="Bearer", credentials=api.criar_token("12345678901"))
+
+        api.cache_tokens = CacheTokens(capacidade=0)
+        sem_cache = await medir(credenciais, requisicoes)
+
+        api.cache_tokens = CacheTokens()
+        com_cache = await medir(credenciais, requisicoes)
+        estatisticas = api.cache_tokens.estatisticas()
+
+        await api.armazenamento.encerrar()
+
+    print(f"{requisicoes} requisições com o mesmo token")
+    print(f"  Sem cache: {sem_cache * 1e6:10.2f} µs/requisição")
+    print(f"  Com cache: {com_cache * 1e6:10.2f} µs/requisição "
+          f"(acertos={estatisticas['acertos']}, falhas={estatisticas['falhas']})")
+    print(f"  Ganho:     {sem_cache / com_cache:10.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,332 @@
+"""
+Teste de carga da API: usuários virtuais concorrentes com mistura configurável de operações
+
+Cada usuário virtual registra um CPF próprio, faz login e então repete
+operações sorteadas conforme os pesos de --mistura até o fim de --duracao.
+Por padrão a API roda em processo (transporte ASGI) com dados temporários e o
+backend de ARMAZENAMENTO; com --url as requisições vão para um servidor já em
+execução e com --uvicorn um servidor local é iniciado só para o teste.
+
+Relata vazão e latências p50/p95/p99 por endpoint, grava o resultado em JSON
+(--saida) e o compara com uma execução anterior (--comparar), apontando as
+regressões acima de --tolerancia (código de saída 1).
+
+Uso: python benchmarks/carga_api.py --usuarios 50 --duracao 30 \\
+         --mistura deposito=5,saque=2,extrato=2,saldo=1 --saida resultado.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+
+import httpx
+
+SENHA = "senha123"
+
+# Operações disponíveis na mistura: nome -> requisição de um usuário virtual
+OPERACOES = {
+    "deposito": lambda c, u: c.post("/api/v1/transacoes/depositar", json={"valor": 10.0}, headers=u.cabecalhos),
+    "saque": lambda c, u: c.post("/api/v1/transacoes/sacar", json={"valor": 1.0}, headers=u.cabecalhos),
+    "extrato": lambda c, u: c.get("/api/v1/extrato", params={"limit": 50}, headers=u.cabecalhos),
+    "saldo": lambda c, u: c.get("/api/v1/conta/saldo", headers=u.cabecalhos),
+    "perfil": lambda c, u: c.get("/api/v1/usuarios/perfil", headers=u.cabecalhos),
+    "login": lambda c, u: c.post("/api/v1/auth/login", json={"cpf": u.cpf, "senha": SENHA}),
+}
+
+# Métricas comparadas entre execuções: latências maiores ou vazão menor são regressões
+METRICAS_LATENCIA = ("p50_ms", "p95_ms", "p99_ms")
+
+
+class Medicoes:
+    """Latências e códigos de status de um endpoint"""
+
+    def __init__(self):
+        self.latencias = []
+        self.status = {}
+        self.erros = 0
+        self.primeiro_inicio = None
+        self.ultimo_fim = None
+
+    def registrar(self, inicio, fim, status):
+        self.latencias.append(fim - inicio)
+        if status is None or status >= 500:
+            self.erros += 1
+        chave = str(status) if status is not None else "excecao"
+        self.status[chave] = self.status.get(chave, 0) + 1
+        if self.primeiro_inicio is None or inicio < self.primeiro_inicio:
+            self.primeiro_inicio = inicio
+        if self.ultimo_fim is None or fim > self.ultimo_fim:
+            self.ultimo_fim = fim
+
+    def resumo(self):
+        ordenadas = sorted(self.latencias)
+        janela = (self.ultimo_fim - self.primeiro_inicio) if ordenadas else 0.0
+        return {
+            "requisicoes": len(ordenadas),
+            "erros": self.erros,
+            "status": self.status,
+            "req_s": round(len(ordenadas) / janela, 2) if janela > 0 else 0.0,
+            **{f"p{p}_ms": round(percentil(ordenadas, p) * 1000, 3) for p in (50, 95, 99)},
+            "media_ms": round(sum(ordenadas) / len(ordenadas) * 1000, 3) if ordenadas else 0.0,
+            "max_ms": round(ordenadas[-1] * 1000, 3) if ordenadas else 0.0,
+        }
+
+
+def percentil(ordenadas, p):
+    if not ordenadas:
+        return 0.0
+    return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p / 100))]
+
+
+class UsuarioVirtual:
+    def __init__(self, cpf):
+        self.cpf = cpf
+        self.cabecalhos = {}
+
+
+async def medir(medicoes, nome, requisicao):
+    inicio = time.perf_counter()
+    try:
+        resposta = await requisicao()
+        status = resposta.status_code
+    except httpx.HTTPError:
+        resposta, status = None, None
+    medicoes.setdefault(nome, Medicoes()).registrar(inicio, time.perf_counter(), status)
+    return resposta
+
+
+async def com_retentativa(medicoes, nome, requisicao, tentativas=20):
+    # 503 com Retry-After é o servidor pedindo calma (fila do bcrypt cheia)
+    for _ in range(tentativas):
+        resposta = await medir(medicoes, nome, requisicao)
+        if resposta is None or resposta.status_code != 503:
+            return resposta
+        await asyncio.sleep(float(resposta.headers.get("Retry-After", "1")))
+    return resposta
+
+
+async def preparar_usuario(cliente, usuario, medicoes):
+    await com_retentativa(medicoes, "registrar", lambda: cliente.post("/api/v1/usuarios/registrar", json={
+        "nome": f"Carga {usuario.cpf}",
+        "cpf": usuario.cpf,
+        "data_nascimento": "01-01-1990",
+        "endereco": "Rua Carga, 1",
+        "senha": SENHA
+    }))
+    resposta = await com_retentativa(medicoes, "login", lambda: cliente.post(
+        "/api/v1/auth/login", json={"cpf": usuario.cpf, "senha": SENHA}))
+    if resposta is None or resposta.status_code != 200:
+        return False
+    usuario.cabecalhos = {"Authorization": f"Bearer {resposta.json()['access_token']}"}
+    return True
+
+
+async def executar_usuario(cliente, usuario, mistura, fim, pausa, medicoes, sorteio):
+    nomes, pesos = zip(*mistura.items())
+    while time.perf_counter() < fim:
+        nome = sorteio.choices(nomes, pesos)[0]
+        await medir(medicoes, nome, lambda: OPERACOES[nome](cliente, usuario))
+        if pausa:
+            await asyncio.sleep(pausa)
+
+
+def interpretar_mistura(texto):
+    mistura = {}
+    for parte in texto.split(","):
+        nome, _, peso = parte.partition("=")
+        nome = nome.strip()
+        if nome not in OPERACOES:
+            raise SystemExit(f"Operação desconhecida na mistura: {nome} (use {', '.join(OPERACOES)})")
+        mistura[nome] = float(peso or 1)
+    if not any(mistura.values()):
+        raise SystemExit("A mistura precisa de ao menos um peso positivo")
+    return {nome: peso for nome, peso in mistura.items() if peso > 0}
+
+
+@asynccontextmanager
+async def cliente_em_processo(custo_bcrypt):
+    """API em processo, com os dados em um diretório temporário"""
+    diretorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory() as diretorio:
+        os.chdir(diretorio)
+        try:
+            import api
+            from senhas import PoolSenhas
+            api.armazenamento = api.criar_armazenamento(api.TIPO_ARMAZENAMENTO)
+            if custo_bcrypt is not None:
+                api.pool_senhas = PoolSenhas(api.PROCESSOS_SENHA, api.FILA_SENHA, custo_bcrypt)
+            async with api.ciclo_de_vida(api.app):
+                # Exceções da API viram respostas 500 e entram nas medições como erro
+                transporte = httpx.ASGITransport(app=api.app, raise_app_exceptions=False)
+                async with httpx.AsyncClient(transport=transporte, base_url="http://carga") as cliente:
+                    yield cliente
+        finally:
+            os.chdir(diretorio_original)
+
+
+@asynccontextmanager
+async def cliente_uvicorn(porta, custo_bcrypt):
+    """Sobe um uvicorn local em um diretório temporário e aguarda o /health"""
+    with tempfile.TemporaryDirectory() as diretorio:
+        ambiente = {**os.environ, "PYTHONPATH": os.path.abspath(RAIZ)}
+        if custo_bcrypt is not None:
+            ambiente["CUSTO_BCRYPT"] = str(custo_bcrypt)
+        servidor = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api:app", "--port", str(porta), "--log-level", "warning"],
+            cwd=diretorio, env=ambiente)
+        try:
+            async with cliente_http(f"http://127.0.0.1:{porta}") as cliente:
+                for _ in range(100):
+                    try:
+                        if (await cliente.get("/api/v1/health")).status_code == 200:
+                            break
+                    except httpx.HTTPError:
+                        pass
+                    await asyncio.sleep(0.1)
+                else:
+                    raise SystemExit("O uvicorn não respondeu em 10 s")
+                yield cliente
+        finally:
+            servidor.terminate()
+            servidor.wait(timeout=30)
+
+
+def cliente_http(url):
+    return httpx.AsyncClient(base_url=url, timeout=60.0,
+                             limits=httpx.Limits(max_connections=None, max_keepalive_connections=None))
+
+
+async def executar(argumentos):
+    mistura = interpretar_mistura(argumentos.mistura)
+    sorteio = random.Random(argumentos.semente)
+    # Prefixo por execução: CPFs novos mesmo contra um servidor com dados
+    prefixo = f"{int(time.time()) % 100_000:05d}"
+    usuarios = [UsuarioVirtual(f"{prefixo}{i:06d}") for i in range(argumentos.usuarios)]
+    medicoes = {}
+
+    if argumentos.url:
+        contexto = cliente_http(argumentos.url)
+        modo = argumentos.url
+    elif argumentos.uvicorn:
+        contexto = cliente_uvicorn(argumentos.porta, argumentos.custo_bcrypt)
+        modo = f"uvicorn:{argumentos.porta}"
+    else:
+        contexto = cliente_em_processo(argumentos.custo_bcrypt)
+        modo = "asgi"
+
+    async with contexto as cliente:
+        inicio = time.perf_counter()
+        prontos = await asyncio.gather(*[preparar_usuario(cliente, u, medicoes) for u in usuarios])
+        preparo = time.perf_counter() - inicio
+        ativos = [u for u, pronto in zip(usuarios, prontos) if pronto]
+
+        inicio = time.perf_counter()
+        fim = inicio + argumentos.duracao
+        await asyncio.gather(*[
+            executar_usuario(cliente, u, mistura, fim, argumentos.pausa / 1000, medicoes,
+                             random.Random(sorteio.random()))
+            for u in ativos
+        ])
+        duracao = time.perf_counter() - inicio
+
+    operacoes = sum(len(medicoes[nome].latencias) for nome in mistura if nome in medicoes)
+    return {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "configuracao": {
+            "modo": modo,
+            "armazenamento": os.getenv("ARMAZENAMENTO", "json"),
+            "usuarios": argumentos.usuarios,
+            "duracao_s": argumentos.duracao,
+            "mistura": mistura,
+            "pausa_ms": argumentos.pausa,
+            "custo_bcrypt": argumentos.custo_bcrypt,
+            "python": platform.python_version(),
+        },
+        "preparo_s": round(preparo, 3),
+        "usuarios_ativos": len(ativos),
+        "total": {"operacoes": operacoes, "req_s": round(operacoes / duracao, 2) if duracao else 0.0},
+        "endpoints": {nome: m.resumo() for nome, m in sorted(medicoes.items())},
+    }
+
+
+def comparar(atual, anterior, tolerancia):
+    """Regressões do resultado atual em relação ao anterior, endpoint a endpoint"""
+    regressoes = []
+    for nome, estatisticas in atual["endpoints"].items():
+        base = anterior.get("endpoints", {}).get(nome)
+        if not base:
+            continue
+        for metrica in METRICAS_LATENCIA:
+            if base[metrica] > 0 and estatisticas[metrica] > base[metrica] * (1 + tolerancia):
+                regressoes.append(
+                    f"{nome}: {metrica} {base[metrica]:.2f} -> {estatisticas[metrica]:.2f}")
+        if base["req_s"] > 0 and estatisticas["req_s"] < base["req_s"] * (1 - tolerancia):
+            regressoes.append(f"{nome}: req_s {base['req_s']:.1f} -> {estatisticas['req_s']:.1f}")
+    return regressoes
+
+
+def imprimir(resultado):
+    configuracao = resultado["configuracao"]
+    print(f"{configuracao['usuarios']} usuários ({resultado['usuarios_ativos']} ativos), "
+          f"{configuracao['duracao_s']:.0f}s, modo {configuracao['modo']}, "
+          f"armazenamento {configuracao['armazenamento']}, mistura {configuracao['mistura']}")
+    print(f"  preparo (registro + login): {resultado['preparo_s']:.2f}s   "
+          f"total: {resultado['total']['req_s']:.1f} operações/s")
+    for nome, e in resultado["endpoints"].items():
+        print(f"  {nome:<10} {e['requisicoes']:7d} req {e['req_s']:9.1f} req/s   "
+              f"p50={e['p50_ms']:8.2f} ms  p95={e['p95_ms']:8.2f} ms  p99={e['p99_ms']:8.2f} ms   "
+              f"erros={e['erros']} status={e['status']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga da API Bancária")
+    parser.add_argument("--usuarios", type=int, default=20, help="usuários virtuais simultâneos")
+    parser.add_argument("--duracao", type=float, default=10.0, help="segundos de carga após o preparo")
+    parser.add_argument("--mistura", default="deposito=5,saque=2,extrato=2,saldo=1",
+                        help=f"pesos por operação ({', '.join(OPERACOES)})")
+    parser.add_argument("--pausa", type=float, default=0.0, help="pausa entre operações de um usuário (ms)")
+    parser.add_argument("--url", help="servidor já em execução (ex.: http://localhost:8000)")
+    parser.add_argument("--uvicorn", action="store_true", help="inicia um uvicorn local para o teste")
+    parser.add_argument("--porta", type=int, default=8765, help="porta do uvicorn local")
+    parser.add_argument("--custo-bcrypt", type=int, default=None,
+                        help="custo do bcrypt na API em processo/uvicorn (padrão: o da API)")
+    parser.add_argument("--semente", type=int, default=None, help="semente do sorteio das operações")
+    parser.add_argument("--saida", help="arquivo JSON para gravar o resultado")
+    parser.add_argument("--comparar", help="resultado JSON anterior para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="piora relativa aceita antes de apontar regressão (0.2 = 20%%)")
+    argumentos = parser.parse_args()
+
+    resultado = asyncio.run(executar(argumentos))
+    imprimir(resultado)
+
+    if argumentos.saida:
+        with open(argumentos.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=4, ensure_ascii=False)
+        print(f"Resultado gravado em {argumentos.saida}")
+
+    if argumentos.comparar:
+        with open(argumentos.comparar, 'r', encoding='utf-8') as f:
+            regressoes = comparar(resultado, json.load(f), argumentos.tolerancia)
+        if regressoes:
+            print(f"REGRESSÕES (tolerância {argumentos.tolerancia:.0%}):")
+            for regressao in regressoes:
+                print(f"  {regressao}")
+            sys.exit(1)
+        print(f"Sem regressões em relação a {argumentos.comparar}")
+
+
+if __name__ == "__main__":
+    main()
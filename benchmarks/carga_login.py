@@ -0,0 +1,99 @@
+"""
+Teste de carga: latência do login (bcrypt no pool de processos) com leituras de saldo em paralelo
+
+Roda a API em processo (transporte ASGI) com dados temporários. Enquanto
+clientes fazem login sem parar, outros consultam o saldo; o objetivo é mostrar
+que o hash de senhas não trava o event loop para as demais requisições.
+
+Uso: python benchmarks/carga_login.py [segundos] [clientes_login] [clientes_saldo]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import httpx
+
+import api
+from armazenamento import ArmazenamentoJSON
+
+CPF = "12345678901"
+SENHA = "senha123"
+
+
+def percentil(amostras, p):
+    if not amostras:
+        return 0.0
+    ordenadas = sorted(amostras)
+    return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p / 100))]
+
+
+async def repetir(cliente, fim, requisicao, latencias, status):
+    while time.perf_counter() < fim:
+        inicio = time.perf_counter()
+        resposta = await requisicao(cliente)
+        latencias.append(time.perf_counter() - inicio)
+        status[resposta.status_code] = status.get(resposta.status_code, 0) + 1
+
+
+def relatorio(nome, latencias, status, duracao):
+    print(f"  {nome:<6} {len(latencias) / duracao:9.1f} req/s   "
+          f"p50={percentil(latencias, 50) * 1000:8.2f} ms   "
+          f"p95={percentil(latencias, 95) * 1000:8.2f} ms   "
+          f"p99={percentil(latencias, 99) * 1000:8.2f} ms   status={status}")
+
+
+async def main():
+    duracao = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    clientes_login = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    clientes_saldo = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        api.armazenamento = ArmazenamentoJSON(
+            os.path.join(diretorio, "usuarios.json"),
+            os.path.join(diretorio, "contas.json"),
+            os.path.join(diretorio, "journal.jsonl")
+        )
+        await api.armazenamento.iniciar()
+        transporte = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://carga") as cliente:
+            await cliente.post("/api/v1/usuarios/registrar", json={
+                "nome": "Cliente Carga", "cpf": CPF, "data_nascimento": "01-01-1990",
+                "endereco": "Rua Carga, 1", "senha": SENHA
+            })
+            token = (await cliente.post(
+                "/api/v1/auth/login", json={"cpf": CPF, "senha": SENHA})).json()['access_token']
+            cabecalhos = {"Authorization": f"Bearer {token}"}
+
+            logins, status_login = [], {}
+            saldos, status_saldo = [], {}
+            fim = time.perf_counter() + duracao
+            await asyncio.gather(
+                *[repetir(cliente, fim,
+                          lambda c: c.post("/api/v1/auth/login", json={"cpf": CPF, "senha": SENHA}),
+                          logins, status_login)
+                  for _ in range(clientes_login)],
+                *[repetir(cliente, fim,
+                          lambda c: c.get("/api/v1/conta/saldo", headers=cabecalhos),
+                          saldos, status_saldo)
+                  for _ in range(clientes_saldo)]
+            )
+        await api.armazenamento.encerrar()
+        api.pool_senhas.encerrar()
+
+    print(f"{duracao:.0f}s, {clientes_login} clientes de login, {clientes_saldo} de saldo, "
+          f"{api.PROCESSOS_SENHA} processos bcrypt (custo {api.CUSTO_BCRYPT}, fila {api.FILA_SENHA})")
+    relatorio("login", logins, status_login, duracao)
+    relatorio("saldo", saldos, status_saldo, duracao)
+    if saldos:
+        print(f"  maior latência de saldo: {max(saldos) * 1000:.2f} ms "
+              f"(média {statistics.mean(saldos) * 1000:.2f} ms)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+"""
+Cache LRU da visão do cliente: titular unido aos dados e ao saldo da conta
+
+Saldo, extrato e perfil precisam do nome do usuário junto com a conta; no
+acerto nenhum dos dois é lido do armazenamento. Os endpoints que alteram a
+conta atualizam a entrada no lugar, sob o lock do CPF, e o cadastro já a
+deixa em cache. O cache é de um processo: com vários workers uma gravação
+feita em outro worker não chega aqui, por isso `run_api.py --producao` o
+desliga nesse caso.
+"""
+
+from collections import OrderedDict
+
+CAMPOS_USUARIO = ("cpf", "nome", "endereco", "data_nascimento", "data_criacao")
+CAMPOS_CONTA = ("agencia", "numero", "saldo_centavos", "limite_centavos")
+
+
+class CacheClientes:
+    def __init__(self, capacidade=10000):
+        self.capacidade = capacidade
+        self.acertos = 0
+        self.falhas = 0
+        self._entradas = OrderedDict()   # cpf -> visão
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def obter(self, cpf):
+        visao = self._entradas.get(cpf)
+        if visao is None:
+            self.falhas += 1
+            return None
+        self._entradas.move_to_end(cpf)
+        self.acertos += 1
+        return visao
+
+    def guardar(self, cpf, usuario, conta):
+        """Monta a visão a partir do usuário e da conta e a guarda (se houver capacidade)"""
+        visao = {campo: usuario.get(campo) for campo in CAMPOS_USUARIO}
+        visao.update((campo, conta.get(campo)) for campo in CAMPOS_CONTA)
+        if self.capacidade > 0:
+            self._entradas[cpf] = visao
+            self._entradas.move_to_end(cpf)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+        return visao
+
+    def atualizar_conta(self, cpf, conta):
+        """Copia o estado atual da conta para a visão em cache, se houver"""
+        visao = self._entradas.get(cpf)
+        if visao is not None:
+            visao.update((campo, conta.get(campo)) for campo in CAMPOS_CONTA)
+
+    def descartar(self, cpf):
+        self._entradas.pop(cpf, None)
+
+    def estatisticas(self):
+        total = self.acertos + self.falhas
+        return {
+            "entradas": len(self._entradas),
+            "capacidade": self.capacidade,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": round(self.acertos / total, 4) if total else 0.0
+        }
@@ -0,0 +1,110 @@
+"""
+Cache LRU de tokens JWT já verificados
+
+Evita repetir a verificação HMAC e a validação de claims a cada requisição.
+Cada entrada vale até o `exp` do próprio token; revogações (logout ou troca da
+versão de token do CPF) removem as entradas na hora. O logout revoga pelo `jti`:
+outra sessão do mesmo CPF, mesmo emitida no mesmo segundo, segue válida. Com
+`ttl` as entradas expiram antes disso: com vários workers, cada um tem o seu
+cache, e o `ttl` limita por quanto tempo uma revogação feita em outro worker
+passa despercebida.
+
+Os jti revogados guardados aqui são só o caminho rápido do processo: a revogação
+vale pelo registro gravado no usuário (`tokens_revogados`), conferido a cada
+verificação fora do cache, após reiniciar e em qualquer worker. Por isso a lista
+local pode ser limitada (`max_revogados`, descartando primeiro os que expiram
+antes) sem reabrir sessões.
+"""
+
+import heapq
+import time
+from collections import OrderedDict
+
+
+class CacheTokens:
+    def __init__(self, capacidade=10000, ttl=0, max_revogados=100000):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self.max_revogados = max_revogados
+        self.acertos = 0
+        self.falhas = 0
+        self._entradas = OrderedDict()   # token -> (cpf, exp)
+        self._por_cpf = {}               # cpf -> {tokens em cache}
+        self._revogados = {}             # jti -> exp
+        self._expiracoes = []            # heap (exp, jti) dos revogados
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def obter(self, token, agora=None):
+        """Retorna o CPF se o token está em cache e ainda não expirou"""
+        entrada = self._entradas.get(token)
+        if entrada is None:
+            self.falhas += 1
+            return None
+        cpf, exp = entrada
+        if exp <= (agora if agora is not None else time.time()):
+            self._remover(token)
+            self.falhas += 1
+            return None
+        self._entradas.move_to_end(token)
+        self.acertos += 1
+        return cpf
+
+    def guardar(self, token, cpf, exp, jti=None):
+        if self.capacidade <= 0 or (jti or token) in self._revogados:
+            return
+        if self.ttl:
+            exp = min(exp, time.time() + self.ttl)
+        self._entradas[token] = (cpf, exp)
+        self._entradas.move_to_end(token)
+        self._por_cpf.setdefault(cpf, set()).add(token)
+        while len(self._entradas) > self.capacidade:
+            self._remover(next(iter(self._entradas)))
+
+    def _remover(self, token):
+        cpf, _ = self._entradas.pop(token)
+        tokens = self._por_cpf.get(cpf)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._por_cpf[cpf]
+
+    def revogado(self, jti, agora=None):
+        exp = self._revogados.get(jti)
+        return exp is not None and exp > (agora if agora is not None else time.time())
+
+    def revogar(self, token, jti, exp):
+        """Revoga um único token (logout) até o seu `exp`"""
+        # Tokens revogados só precisam ser lembrados até expirarem
+        self._podar(time.time())
+        if jti not in self._revogados:
+            heapq.heappush(self._expiracoes, (exp, jti))
+            self._revogados[jti] = exp
+        while len(self._revogados) > self.max_revogados:
+            _, antigo = heapq.heappop(self._expiracoes)
+            del self._revogados[antigo]
+        if token in self._entradas:
+            self._remover(token)
+
+    def _podar(self, agora):
+        """Esquece os revogados já expirados, do topo do heap: O(log n) por entrada"""
+        while self._expiracoes and self._expiracoes[0][0] <= agora:
+            _, jti = heapq.heappop(self._expiracoes)
+            del self._revogados[jti]
+
+    def revogar_cpf(self, cpf):
+        """Descarta do cache todos os tokens do CPF (após troca da versão de token)"""
+        for token in list(self._por_cpf.get(cpf, ())):
+            self._remover(token)
+
+    def estatisticas(self):
+        total = self.acertos + self.falhas
+        return {
+            "entradas": len(self._entradas),
+            "capacidade": self.capacidade,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": round(self.acertos / total, 4) if total else 0.0,
+            "revogados": len(self._revogados)
+        }
@@ -0,0 +1,51 @@
+"""
+Controle de concorrência: locks por conta e execução de I/O bloqueante em threads
+"""
+
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+
+
+class GerenciadorLocks:
+    """Um asyncio.Lock por CPF, criado sob demanda e descartado quando ninguém o usa
+
+    Operações na mesma conta são serializadas; contas diferentes seguem em paralelo.
+    """
+
+    def __init__(self):
+        self._locks = {}
+
+    def __len__(self):
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def bloquear(self, cpf):
+        entrada = self._locks.get(cpf)
+        if entrada is None:
+            entrada = self._locks[cpf] = [asyncio.Lock(), 0]
+        entrada[1] += 1
+        try:
+            async with entrada[0]:
+                yield
+        finally:
+            entrada[1] -= 1
+            if entrada[1] == 0:
+                del self._locks[cpf]
+
+    @asynccontextmanager
+    async def bloquear_varios(self, *cpfs):
+        """Bloqueia várias contas, sempre em ordem crescente de CPF
+
+        Duas transferências em sentidos opostos entre as mesmas contas pedem os locks
+        na mesma ordem, então nunca esperam uma pela outra em ciclo (deadlock); as
+        demais contas do banco não são bloqueadas.
+        """
+        async with AsyncExitStack() as pilha:
+            for cpf in sorted(set(cpfs)):
+                await pilha.enter_async_context(self.bloquear(cpf))
+            yield
+
+
+def executar_em_thread(executor, funcao, *args):
+    """Executa `funcao` no pool indicado sem bloquear o event loop"""
+    return asyncio.get_running_loop().run_in_executor(executor, funcao, *args)
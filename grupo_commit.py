@@ -0,0 +1,116 @@
+"""
+Group commit: várias requisições concorrentes, uma única escrita + fsync
+
+Cada requisição entrega seus registros e aguarda. O committer junta tudo o que
+chegar em uma janela curta (`janela` segundos ou `max_registros` registros),
+grava de uma vez com fsync em uma thread e então confirma todas as requisições
+do lote juntas. Assim a durabilidade custa um fsync por lote, não por requisição.
+
+Se a gravação falha, todas as requisições do lote recebem a exceção; desfazer o
+que cada uma já tinha aplicado na memória fica com quem enviou o registro.
+"""
+
+import asyncio
+import time
+
+from concorrencia import executar_em_thread
+
+
+class GrupoCommit:
+    def __init__(self, gravar, executor, janela=0.002, max_registros=256):
+        self._gravar = gravar            # gravar(lista de registros), executada no executor
+        self._executor = executor
+        self.janela = janela
+        self.max_registros = max_registros
+        self._pendentes = []             # (registro, future, instante de chegada)
+        self._ha_pendentes = asyncio.Event()
+        self._cheio = asyncio.Event()
+        self._tarefa = None
+        self._encerrando = False
+        # Métricas
+        self.lotes = 0
+        self.registros = 0
+        self.maior_lote = 0
+        self.ultimo_lote = 0
+        self.latencia_total = 0.0        # chegada do registro -> confirmação, somada por registro
+        self.latencia_maxima = 0.0
+        self.tempo_gravacao_total = 0.0  # escrita + fsync, somado por lote
+        self.falhas = 0
+        # Histogramas opcionais (metricas.Histograma) do tamanho dos lotes e da
+        # latência de confirmação por registro, exportados em /api/v1/metrics
+        self.histograma_lote = None
+        self.histograma_latencia = None
+
+    async def enviar(self, registro):
+        """Enfileira o registro e retorna quando ele estiver gravado em disco"""
+        if self._tarefa is None:
+            self._tarefa = asyncio.create_task(self._loop())
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendentes.append((registro, futuro, time.perf_counter()))
+        self._ha_pendentes.set()
+        if len(self._pendentes) >= self.max_registros:
+            self._cheio.set()
+        await futuro
+
+    async def _loop(self):
+        while not self._encerrando or self._pendentes:
+            await self._ha_pendentes.wait()
+            if not self._encerrando and len(self._pendentes) < self.max_registros:
+                try:
+                    await asyncio.wait_for(self._cheio.wait(), self.janela)
+                except asyncio.TimeoutError:
+                    pass
+            await self._efetivar()
+
+    async def _efetivar(self):
+        lote, self._pendentes = self._pendentes, []
+        self._ha_pendentes.clear()
+        self._cheio.clear()
+        if not lote:
+            return
+        inicio = time.perf_counter()
+        try:
+            await executar_em_thread(self._executor, self._gravar, [r for r, _, _ in lote])
+        except Exception as e:
+            self.falhas += 1
+            for _, futuro, _ in lote:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+        agora = time.perf_counter()
+        for _, futuro, chegada in lote:
+            if not futuro.done():
+                futuro.set_result(None)
+            self.latencia_total += agora - chegada
+            self.latencia_maxima = max(self.latencia_maxima, agora - chegada)
+            if self.histograma_latencia is not None:
+                self.histograma_latencia.observar(agora - chegada)
+        if self.histograma_lote is not None:
+            self.histograma_lote.observar(len(lote))
+        self.lotes += 1
+        self.registros += len(lote)
+        self.ultimo_lote = len(lote)
+        self.maior_lote = max(self.maior_lote, len(lote))
+        self.tempo_gravacao_total += agora - inicio
+
+    async def encerrar(self):
+        """Grava o que estiver pendente e para o committer"""
+        if self._tarefa is not None:
+            self._encerrando = True
+            self._ha_pendentes.set()
+            await self._tarefa
+            self._tarefa = None
+            self._encerrando = False
+
+    def estatisticas(self):
+        return {
+            "lotes": self.lotes,
+            "falhas": self.falhas,
+            "registros": self.registros,
+            "registros_por_lote": round(self.registros / self.lotes, 2) if self.lotes else 0.0,
+            "ultimo_lote": self.ultimo_lote,
+            "maior_lote": self.maior_lote,
+            "latencia_media_ms": round(self.latencia_total / self.registros * 1000, 3) if self.registros else 0.0,
+            "latencia_maxima_ms": round(self.latencia_maxima * 1000, 3),
+            "gravacao_media_ms": round(self.tempo_gravacao_total / self.lotes * 1000, 3) if self.lotes else 0.0
+        }
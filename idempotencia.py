@@ -0,0 +1,96 @@
+"""
+Chaves de idempotência (`Idempotency-Key`) para depósitos e saques
+
+A resposta de uma operação com chave fica em dois lugares:
+
+- na própria conta, no campo `idempotencia` ({chave: [expira, impressao, resposta]}):
+  a operação passa a chave ao armazenamento, que grava só essa entrada junto com
+  a transação (uma linha do journal não repete as respostas das chaves
+  anteriores). A repetição é reconhecida mesmo após reiniciar o processo ou
+  quando cai em outro worker;
+- em um cache LRU do processo, consultado antes do lock e do armazenamento:
+  a repetição comum (o cliente que expirou o tempo e reenviou) responde em O(1).
+
+Cada conta guarda no máximo `maximo` chaves, e nenhuma além do `ttl`. A
+`impressao` identifica a requisição original (rota e valor): a mesma chave com
+outra requisição é recusada em vez de devolver uma resposta que não é dela.
+"""
+
+import time
+from collections import OrderedDict
+
+
+class ChaveReutilizada(Exception):
+    """A chave já foi usada por uma requisição diferente"""
+
+
+def _conferir(entrada, impressao, agora):
+    """Resposta da entrada [expira, impressao, resposta], ou None se expirou"""
+    expira, impressao_original, resposta = entrada
+    if expira <= agora:
+        return None
+    if impressao_original != impressao:
+        raise ChaveReutilizada(impressao_original)
+    return resposta
+
+
+def resposta_gravada(conta, chave, impressao, agora=None):
+    """Resposta gravada na conta para a chave, ou None"""
+    entrada = (conta.get('idempotencia') or {}).get(chave)
+    if entrada is None:
+        return None
+    return _conferir(entrada, impressao, agora if agora is not None else time.time())
+
+
+def gravar_resposta(conta, chave, impressao, resposta, expira, maximo):
+    """Anota a resposta na conta, descartando as chaves expiradas e as mais antigas além de `maximo`"""
+    agora = time.time()
+    entradas = {c: e for c, e in (conta.get('idempotencia') or {}).items() if e[0] > agora}
+    entradas[chave] = [expira, impressao, resposta]
+    for antiga in list(entradas)[:max(0, len(entradas) - maximo)]:
+        del entradas[antiga]
+    conta['idempotencia'] = entradas
+
+
+class CacheIdempotencia:
+    def __init__(self, capacidade=10000):
+        self.capacidade = capacidade
+        self.acertos = 0
+        self.falhas = 0
+        self._entradas = OrderedDict()   # (cpf, chave) -> [expira, impressao, resposta]
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def obter(self, cpf, chave, impressao, agora=None):
+        entrada = self._entradas.get((cpf, chave))
+        resposta = None
+        if entrada is not None:
+            resposta = _conferir(entrada, impressao, agora if agora is not None else time.time())
+            if resposta is None:
+                del self._entradas[(cpf, chave)]
+            else:
+                self._entradas.move_to_end((cpf, chave))
+        if resposta is None:
+            self.falhas += 1
+        else:
+            self.acertos += 1
+        return resposta
+
+    def guardar(self, cpf, chave, impressao, resposta, expira):
+        if self.capacidade <= 0:
+            return
+        self._entradas[(cpf, chave)] = [expira, impressao, resposta]
+        self._entradas.move_to_end((cpf, chave))
+        while len(self._entradas) > self.capacidade:
+            self._entradas.popitem(last=False)
+
+    def estatisticas(self):
+        total = self.acertos + self.falhas
+        return {
+            "entradas": len(self._entradas),
+            "capacidade": self.capacidade,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": round(self.acertos / total, 4) if total else 0.0
+        }
@@ -0,0 +1,220 @@
+"""
+Métricas da API no formato texto do Prometheus
+
+Contadores de requisições por rota/método/status, de decisões do controle de
+admissão (admitida, limitada ou descartada) por grupo de endpoints e
+histogramas de latência por rota e por fase interna (verificação de token, leitura e gravação no
+armazenamento). Os histogramas têm faixas fixas: registrar uma observação é uma
+busca binária e três somas, sem alocação.
+
+A agregação é por processo (worker) e sem locks: todas as observações acontecem
+na thread do event loop — o middleware e os métodos instrumentados do
+armazenamento rodam como corrotinas — e as threads de I/O nunca tocam nas
+métricas. Com vários workers, cada um expõe os próprios números.
+"""
+
+import functools
+from bisect import bisect_left
+from time import perf_counter
+
+# Limites superiores (em segundos) das faixas dos histogramas; +Inf é implícito
+FAIXAS_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Limites superiores das faixas do histograma de registros por lote do group commit
+FAIXAS_LOTE = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+ROTA_DESCONHECIDA = "desconhecida"
+TIPO_CONTEUDO = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histograma:
+    __slots__ = ("faixas", "contagens", "soma", "total")
+
+    def __init__(self, faixas=FAIXAS_LATENCIA):
+        self.faixas = faixas
+        self.contagens = [0] * (len(faixas) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        # bisect_left: um valor igual ao limite conta na faixa (le = "menor ou igual")
+        self.contagens[bisect_left(self.faixas, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def acumulado(self):
+        """Pares (limite, contagem acumulada), terminando em +Inf"""
+        acumulada = 0
+        for limite, contagem in zip(self.faixas + (float("inf"),), self.contagens):
+            acumulada += contagem
+            yield limite, acumulada
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos(**rotulos):
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in rotulos.items()) + "}"
+
+
+def _formatar_limite(limite):
+    return "+Inf" if limite == float("inf") else repr(limite)
+
+
+class Metricas:
+    def __init__(self, faixas=FAIXAS_LATENCIA):
+        self.faixas = faixas
+        self.requisicoes = {}   # (método, rota, status) -> contagem
+        self.latencias = {}     # (método, rota) -> Histograma
+        self.fases = {}         # fase -> Histograma
+        self.admissoes = {}     # (grupo, resultado) -> contagem
+        # Group commit do journal (backend JSON): registros por lote e latência de confirmação
+        self.commit_lote = Histograma(FAIXAS_LOTE)
+        self.commit_latencia = Histograma(self.faixas)
+
+    def observar_requisicao(self, metodo, rota, status, duracao):
+        chave = (metodo, rota, status)
+        self.requisicoes[chave] = self.requisicoes.get(chave, 0) + 1
+        histograma = self.latencias.get((metodo, rota))
+        if histograma is None:
+            histograma = self.latencias[(metodo, rota)] = Histograma(self.faixas)
+        histograma.observar(duracao)
+
+    def contar_admissao(self, grupo, resultado):
+        chave = (grupo, resultado)
+        self.admissoes[chave] = self.admissoes.get(chave, 0) + 1
+
+    def fase(self, nome):
+        """Histograma da fase interna `nome`, criado na primeira consulta"""
+        histograma = self.fases.get(nome)
+        if histograma is None:
+            histograma = self.fases[nome] = Histograma(self.faixas)
+        return histograma
+
+    def medir(self, nome):
+        return Cronometro(self.fase(nome))
+
+    def exportar(self):
+        """Todas as métricas no formato de exposição em texto do Prometheus"""
+        linhas = [
+            "# HELP api_requisicoes_total Requisições HTTP atendidas",
+            "# TYPE api_requisicoes_total counter",
+        ]
+        for (metodo, rota, status), contagem in sorted(self.requisicoes.items()):
+            linhas.append(
+                f"api_requisicoes_total{_rotulos(metodo=metodo, rota=rota, status=status)} {contagem}")
+        linhas += [
+            "# HELP api_admissao_total Decisões do controle de admissão (limite de taxa e descarte de carga)",
+            "# TYPE api_admissao_total counter",
+        ]
+        for (grupo, resultado), contagem in sorted(self.admissoes.items()):
+            linhas.append(f"api_admissao_total{_rotulos(grupo=grupo, resultado=resultado)} {contagem}")
+        linhas += [
+            "# HELP api_requisicao_duracao_segundos Latência das requisições HTTP",
+            "# TYPE api_requisicao_duracao_segundos histogram",
+        ]
+        for (metodo, rota), histograma in sorted(self.latencias.items()):
+            self._exportar_histograma(
+                linhas, "api_requisicao_duracao_segundos", histograma, metodo=metodo, rota=rota)
+        linhas += [
+            "# HELP api_fase_duracao_segundos Duração das fases internas das requisições",
+            "# TYPE api_fase_duracao_segundos histogram",
+        ]
+        for nome, histograma in sorted(self.fases.items()):
+            self._exportar_histograma(linhas, "api_fase_duracao_segundos", histograma, fase=nome)
+        if self.commit_lote.total:
+            linhas += [
+                "# HELP api_commit_lote_registros Registros gravados por lote do group commit",
+                "# TYPE api_commit_lote_registros histogram",
+            ]
+            self._exportar_histograma(linhas, "api_commit_lote_registros", self.commit_lote)
+            linhas += [
+                "# HELP api_commit_latencia_segundos Chegada do registro ao group commit até o fsync",
+                "# TYPE api_commit_latencia_segundos histogram",
+            ]
+            self._exportar_histograma(linhas, "api_commit_latencia_segundos", self.commit_latencia)
+        return "\n".join(linhas) + "\n"
+
+    @staticmethod
+    def _exportar_histograma(linhas, nome, histograma, **rotulos):
+        for limite, contagem in histograma.acumulado():
+            linhas.append(
+                f"{nome}_bucket{_rotulos(**rotulos, le=_formatar_limite(limite))} {contagem}")
+        sufixo = _rotulos(**rotulos) if rotulos else ""
+        linhas.append(f"{nome}_sum{sufixo} {histograma.soma!r}")
+        linhas.append(f"{nome}_count{sufixo} {histograma.total}")
+
+
+class Cronometro:
+    """Context manager que registra a duração do bloco em um histograma"""
+    __slots__ = ("histograma", "inicio")
+
+    def __init__(self, histograma):
+        self.histograma = histograma
+
+    def __enter__(self):
+        self.inicio = perf_counter()
+        return self
+
+    def __exit__(self, *excecao):
+        self.histograma.observar(perf_counter() - self.inicio)
+        return False
+
+
+def medir_metodos(objeto, metricas, fase, nomes):
+    """Substitui os métodos assíncronos `nomes` de `objeto` por versões cronometradas"""
+    histograma = metricas.fase(fase)
+    for nome in nomes:
+        metodo = getattr(objeto, nome, None)
+        if metodo is not None:
+            setattr(objeto, nome, _cronometrado(metodo, histograma))
+    return objeto
+
+
+def _cronometrado(metodo, histograma):
+    @functools.wraps(metodo)
+    async def cronometrado(*args, **kwargs):
+        inicio = perf_counter()
+        try:
+            return await metodo(*args, **kwargs)
+        finally:
+            histograma.observar(perf_counter() - inicio)
+    return cronometrado
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI: conta e cronometra cada requisição HTTP
+
+    O rótulo de rota é o modelo do caminho (`/api/v1/conta/saldo`), preenchido
+    pelo roteamento no escopo; caminhos sem rota ficam como "desconhecida" para
+    não multiplicar séries.
+    """
+
+    def __init__(self, app, metricas):
+        self.app = app
+        self.metricas = metricas
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = perf_counter()
+        status = 500
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            rota = scope.get("route")
+            self.metricas.observar_requisicao(
+                scope["method"],
+                getattr(rota, "path", ROTA_DESCONHECIDA),
+                status,
+                perf_counter() - inicio
+            )
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+"""
+Migração única de usuarios.json/contas.json (+ journal) para o banco SQLite
+
+Uso: python migrar_para_sqlite.py [--forcar]
+O destino é lido de URL_BANCO (padrão: sqlite+aiosqlite:///banco.db).
+Com --forcar, os dados já existentes no banco são substituídos.
+"""
+
+import asyncio
+import sys
+
+from api import (
+    ARQUIVO_CONTAS, ARQUIVO_JOURNAL, ARQUIVO_USUARIOS, TAMANHO_POOL, URL_BANCO
+)
+from armazenamento import ArmazenamentoJSON
+from armazenamento_sqlite import ArmazenamentoSQLite
+
+
+async def migrar(forcar=False):
+    origem = ArmazenamentoJSON(ARQUIVO_USUARIOS, ARQUIVO_CONTAS, ARQUIVO_JOURNAL)
+    destino = ArmazenamentoSQLite(URL_BANCO, TAMANHO_POOL)
+    await destino.iniciar()
+    try:
+        if await destino.contar_contas() and not forcar:
+            print(f"O banco {URL_BANCO} já possui contas. Use --forcar para substituí-las.")
+            return False
+
+        usuarios = await origem.carregar_usuarios()
+        contas = await origem.carregar_contas()
+        await destino.salvar_usuarios(usuarios)
+        await destino.salvar_contas(contas)
+
+        transacoes = sum(len(c.get('historico_transacoes', [])) for c in contas.values())
+        print(f"Migrados {len(usuarios)} usuários, {len(contas)} contas e {transacoes} transações para {URL_BANCO}")
+        return True
+    finally:
+        await destino.encerrar()
+
+
+if __name__ == "__main__":
+    sucesso = asyncio.run(migrar(forcar="--forcar" in sys.argv))
+    sys.exit(0 if sucesso else 1)
@@ -0,0 +1,183 @@
+"""
+Perfilamento sob demanda de requisições (cProfile)
+
+Desligado por padrão. Com `PERFIL_AMOSTRAGEM=N`, uma em cada N requisições roda
+sob o cProfile; com `CHAVE_ADMIN` definida, o cabeçalho `X-Perfilar: <chave>`
+força o perfil de uma requisição específica. Cada perfil vira um arquivo pstats
+no diretório de perfis, cujo nome guarda os metadados (início, duração, status,
+método e rota); acima de `max_arquivos` os mais antigos são apagados.
+
+O cProfile mede a thread inteira, então o perfil inclui as corrotinas de outras
+requisições que rodaram no event loop enquanto aquela estava em andamento. Só
+um perfil fica ativo por vez: requisições sorteadas durante outro perfil seguem
+sem perfilamento.
+"""
+
+import cProfile
+import hmac
+import os
+import pstats
+import time
+from urllib.parse import quote, unquote
+
+from concorrencia import executar_em_thread
+
+CABECALHO_PERFILAR = b"x-perfilar"
+EXTENSAO = ".prof"
+
+
+def chave_confere(recebida, esperada):
+    return bool(esperada) and recebida is not None and hmac.compare_digest(recebida, esperada)
+
+
+def nome_arquivo(inicio, duracao, status, metodo, rota):
+    return (f"{int(inicio * 1000)}_{int(duracao * 1_000_000)}_{status}_"
+            f"{metodo}_{quote(rota, safe='')}{EXTENSAO}")
+
+
+def ler_nome(nome):
+    """Metadados codificados no nome do arquivo; None se não for um perfil"""
+    if not nome.endswith(EXTENSAO):
+        return None
+    try:
+        inicio, duracao, status, metodo, rota = nome[:-len(EXTENSAO)].split("_", 4)
+        return {
+            "arquivo": nome,
+            "inicio": int(inicio) / 1000,
+            "duracao_ms": int(duracao) / 1000,
+            "status": int(status),
+            "metodo": metodo,
+            "rota": unquote(rota),
+        }
+    except ValueError:
+        return None
+
+
+class Perfilador:
+    def __init__(self, diretorio, amostragem=0, max_arquivos=200, chave=None, ignorar=()):
+        self.diretorio = diretorio
+        self.amostragem = amostragem
+        self.max_arquivos = max_arquivos
+        self.chave = chave
+        self.ignorar = tuple(ignorar)  # Prefixos de caminho nunca perfilados
+        self.capturados = 0
+        self.ignorados = 0
+        self._contador = 0
+        self._ativo = False
+
+    @property
+    def habilitado(self):
+        return self.amostragem > 0 or bool(self.chave)
+
+    def sortear(self, caminho, cabecalhos):
+        """Decide se a requisição com este caminho e cabeçalhos ASGI deve ser perfilada"""
+        if caminho.startswith(self.ignorar):
+            return False
+        escolhida = False
+        if self.amostragem > 0:
+            self._contador += 1
+            escolhida = self._contador % self.amostragem == 0
+        if not escolhida and self.chave:
+            for nome, valor in cabecalhos:
+                if nome == CABECALHO_PERFILAR:
+                    escolhida = chave_confere(valor.decode("latin-1"), self.chave)
+                    break
+        if escolhida and self._ativo:
+            self.ignorados += 1
+            return False
+        return escolhida
+
+    def _gravar(self, perfil, nome):
+        os.makedirs(self.diretorio, exist_ok=True)
+        perfil.dump_stats(os.path.join(self.diretorio, nome))
+        self._rotacionar()
+
+    def _rotacionar(self):
+        # O prefixo é o início em milissegundos: ordem numérica = ordem cronológica
+        arquivos = sorted(
+            (n for n in os.listdir(self.diretorio) if ler_nome(n) is not None),
+            key=lambda n: int(n.split("_", 1)[0])
+        )
+        for nome in arquivos[:max(0, len(arquivos) - self.max_arquivos)]:
+            try:
+                os.remove(os.path.join(self.diretorio, nome))
+            except FileNotFoundError:
+                pass  # Outro worker já apagou
+
+    def listar(self, rota=None, limite=20):
+        """Perfis gravados, do mais lento para o mais rápido"""
+        try:
+            nomes = os.listdir(self.diretorio)
+        except FileNotFoundError:
+            return []
+        perfis = [p for p in map(ler_nome, nomes)
+                  if p is not None and (rota is None or p["rota"] == rota)]
+        perfis.sort(key=lambda p: p["duracao_ms"], reverse=True)
+        return perfis[:limite]
+
+    def agregar(self, perfis, funcoes=30):
+        """Soma os perfis indicados e retorna as funções com maior tempo próprio"""
+        caminhos = [os.path.join(self.diretorio, p["arquivo"]) for p in perfis]
+        caminhos = [c for c in caminhos if os.path.exists(c)]
+        if not caminhos:
+            return []
+        estatisticas = pstats.Stats(*caminhos).stats
+        mais_lentas = sorted(estatisticas.items(), key=lambda item: item[1][2], reverse=True)
+        return [
+            {
+                "funcao": f"{arquivo}:{linha}({nome})",
+                "chamadas": chamadas,
+                "tempo_proprio_ms": round(proprio * 1000, 3),
+                "tempo_acumulado_ms": round(acumulado * 1000, 3),
+            }
+            for (arquivo, linha, nome), (_, chamadas, proprio, acumulado, _)
+            in mais_lentas[:funcoes]
+        ]
+
+    def estatisticas(self):
+        return {
+            "amostragem": self.amostragem,
+            "capturados": self.capturados,
+            "ignorados": self.ignorados,
+            "diretorio": self.diretorio,
+        }
+
+
+class MiddlewarePerfil:
+    """Middleware ASGI: roda as requisições sorteadas sob o cProfile"""
+
+    def __init__(self, app, perfilador):
+        self.app = app
+        self.perfilador = perfilador
+
+    async def __call__(self, scope, receive, send):
+        perfilador = self.perfilador
+        if (scope["type"] != "http" or not perfilador.habilitado
+                or not perfilador.sortear(scope["path"], scope["headers"])):
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            await send(mensagem)
+
+        perfilador._ativo = True
+        perfil = cProfile.Profile()
+        inicio = time.time()
+        relogio = time.perf_counter()
+        perfil.enable()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            perfil.disable()
+            duracao = time.perf_counter() - relogio
+            perfilador._ativo = False
+            perfilador.capturados += 1
+            rota = getattr(scope.get("route"), "path", scope["path"])
+            nome = nome_arquivo(inicio, duracao, status, scope["method"], rota)
+            # Serializar e apagar arquivos antigos é I/O: fora do event loop
+            await executar_em_thread(None, perfilador._gravar, perfil, nome)
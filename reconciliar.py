@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Reconciliação de saldos: recalcula o saldo de todas as contas a partir do histórico
+
+Os históricos de todas as contas são concatenados em arrays contíguos de
+centavos e os saldos recalculados em uma única passada vetorizada (NumPy, se
+instalado; senão `array('q')` com somas por trecho). As contas cujo saldo
+gravado difere da soma do histórico são listadas.
+
+Uso: python reconciliar.py
+O backend é escolhido por ARMAZENAMENTO, como na API. Sai com código 1 se
+houver divergências.
+"""
+
+import asyncio
+import operator
+import sys
+import time
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from transacoes import SINAIS, para_reais
+
+
+def concatenar(contas):
+    """Junta os históricos em (cpfs, saldos gravados, fronteiras, tipos, valores)
+
+    O histórico da i-ésima conta ocupa as posições fronteiras[i]:fronteiras[i + 1].
+    """
+    cpfs = list(contas)
+    registrados = array('q', (contas[cpf]['saldo_centavos'] for cpf in cpfs))
+    fronteiras = array('q', [0])
+    tipos = bytearray()
+    valores = array('q')
+    for cpf in cpfs:
+        historico = contas[cpf]['historico_transacoes']
+        tipos += historico.tipos
+        valores += historico.valores
+        fronteiras.append(len(valores))
+    return cpfs, registrados, fronteiras, tipos, valores
+
+
+def recalcular_saldos(fronteiras, tipos, valores):
+    """Saldo de cada conta = soma dos valores com o sinal do tipo da transação"""
+    if np is not None:
+        assinados = np.asarray(SINAIS, dtype=np.int64)[np.frombuffer(tipos, dtype=np.uint8)]
+        assinados *= np.frombuffer(valores, dtype=np.int64)
+        # Soma acumulada com um zero à frente: saldo = acumulado[fim] - acumulado[inicio]
+        acumulado = np.zeros(len(valores) + 1, dtype=np.int64)
+        np.cumsum(assinados, out=acumulado[1:])
+        limites = np.frombuffer(fronteiras, dtype=np.int64)
+        return acumulado[limites[1:]] - acumulado[limites[:-1]]
+    sinais = SINAIS.__getitem__
+    return array('q', (
+        sum(map(operator.mul, map(sinais, tipos[inicio:fim]), valores[inicio:fim]))
+        for inicio, fim in zip(fronteiras, fronteiras[1:])
+    ))
+
+
+def reconciliar(contas):
+    """Lista de (cpf, saldo gravado, saldo recalculado), em centavos, das contas divergentes"""
+    cpfs, registrados, fronteiras, tipos, valores = concatenar(contas)
+    calculados = recalcular_saldos(fronteiras, tipos, valores)
+    if np is not None:
+        gravados = np.frombuffer(registrados, dtype=np.int64)
+        divergentes = np.flatnonzero(gravados != calculados).tolist()
+    else:
+        divergentes = [i for i, (g, c) in enumerate(zip(registrados, calculados)) if g != c]
+    return [(cpfs[i], registrados[i], int(calculados[i])) for i in divergentes]
+
+
+async def main():
+    # Importado aqui: a configuração do backend vem das mesmas variáveis da API
+    from api import TIPO_ARMAZENAMENTO, criar_armazenamento
+
+    armazenamento = criar_armazenamento(TIPO_ARMAZENAMENTO)
+    await armazenamento.iniciar()
+    try:
+        inicio = time.perf_counter()
+        contas = await armazenamento.carregar_contas()
+        carga = time.perf_counter() - inicio
+    finally:
+        await armazenamento.encerrar()
+
+    inicio = time.perf_counter()
+    divergencias = reconciliar(contas)
+    duracao = time.perf_counter() - inicio
+
+    transacoes = sum(len(c['historico_transacoes']) for c in contas.values())
+    print(f"{len(contas)} contas, {transacoes} transações "
+          f"(carga {carga:.2f}s, reconciliação {duracao:.2f}s, "
+          f"{'NumPy' if np is not None else 'array'})")
+    for cpf, gravado, calculado in divergencias:
+        print(f"  DIVERGENTE {cpf}: gravado R$ {para_reais(gravado):.2f}, "
+              f"histórico R$ {para_reais(calculado):.2f}")
+    print(f"{len(divergencias)} conta(s) divergente(s)")
+    return not divergencias
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,29 @@
+"""
+Classe de resposta JSON padrão da API
+
+Usa o orjson quando instalado (serialização em Rust, bytes direto) e, sem ele,
+o `json` da biblioteca padrão no mesmo formato compacto da `JSONResponse` do
+Starlette. Os endpoints quentes montam o conteúdo já em tipos JSON (dict, list,
+str, int, float) e devolvem a resposta pronta, sem modelos intermediários.
+"""
+
+import json
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def serializar(conteudo):
+    if orjson is not None:
+        return orjson.dumps(conteudo, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(conteudo, ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+class RespostaJSON(JSONResponse):
+    def render(self, content):
+        return serializar(content)
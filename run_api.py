@@ -2,35 +2,85 @@
 """
 Script para iniciar a API Bancária com FastAPI
 Execute este arquivo para começar o servidor
+
+Desenvolvimento: python run_api.py (um processo, com --reload)
+Produção:        python run_api.py --producao [--workers N] (um worker por núcleo, sem reload)
 """
 
+import argparse
+import asyncio
+import os
 import subprocess
 import sys
 import webbrowser
 import time
 
+def preparar_armazenamento():
+    """Cria ou migra o esquema uma única vez, antes de os workers subirem juntos"""
+    from api import TIPO_ARMAZENAMENTO, criar_armazenamento
+
+    async def preparar():
+        armazenamento = criar_armazenamento(TIPO_ARMAZENAMENTO)
+        await armazenamento.iniciar()
+        await armazenamento.encerrar()
+
+    asyncio.run(preparar())
+
+def configurar_producao(workers):
+    # Os workers herdam estas variáveis; as definidas pelo usuário prevalecem
+    if workers > 1:
+        # O backend JSON mantém o estado em memória de um único processo
+        os.environ.setdefault("ARMAZENAMENTO", "sqlite")
+        if os.environ["ARMAZENAMENTO"] == "json":
+            print("❌ ARMAZENAMENTO=json não suporta vários workers; use sqlite ou --workers 1")
+            sys.exit(1)
+        # Cada worker tem o seu cache de tokens: revogações feitas em outro worker
+        # valem aqui em até TTL_CACHE_TOKENS segundos
+        os.environ.setdefault("TTL_CACHE_TOKENS", "5")
+        # O cache de clientes guarda saldos: sem como saber das gravações de outro worker
+        os.environ.setdefault("TAMANHO_CACHE_CLIENTES", "0")
+    # Cada worker tem o seu pool de bcrypt: divide os núcleos em vez de multiplicá-los
+    os.environ.setdefault("PROCESSOS_SENHA", str(max(1, (os.cpu_count() or 1) // workers)))
+    preparar_armazenamento()
+
 def main():
+    parser = argparse.ArgumentParser(description="Inicia a API Bancária")
+    parser.add_argument("--producao", action="store_true",
+                        help="vários workers, sem --reload")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processos uvicorn no modo produção (padrão: um por núcleo)")
+    parser.add_argument("--porta", type=int, default=8000)
+    argumentos = parser.parse_args()
+
     print("\n" + "="*60)
     print("🚀 INICIANDO API BANCÁRIA DIO")
     print("="*60 + "\n")
-    
+
     print("📋 Informações:")
-    print("  • API: http://localhost:8000")
-    print("  • Documentação Swagger: http://localhost:8000/docs")
-    print("  • Documentação ReDoc: http://localhost:8000/redoc")
-    print("  • Teste: python test_api.py")
+    print(f"  • API: http://localhost:{argumentos.porta}")
+    print(f"  • Documentação Swagger: http://localhost:{argumentos.porta}/docs")
+    print(f"  • Documentação ReDoc: http://localhost:{argumentos.porta}/redoc")
+    print(f"  • Teste de carga: python benchmarks/carga_api.py --url http://localhost:{argumentos.porta}")
+
+    comando = [
+        sys.executable, "-m", "uvicorn",
+        "api:app",
+        "--host", "0.0.0.0",
+        "--port", str(argumentos.porta),
+        "--log-level", "info"
+    ]
+    if argumentos.producao:
+        configurar_producao(argumentos.workers)
+        comando += ["--workers", str(argumentos.workers)]
+        print(f"  • Modo produção: {argumentos.workers} worker(s), "
+              f"armazenamento {os.getenv('ARMAZENAMENTO', 'json')}")
+    else:
+        comando.append("--reload")
     print("\n⏳ Iniciando servidor...\n")
-    
+
     try:
         # Executar o servidor uvicorn
-        subprocess.run([
-            sys.executable, "-m", "uvicorn",
-            "api:app",
-            "--reload",
-            "--host", "0.0.0.0",
-            "--port", "8000",
-            "--log-level", "info"
-        ])
+        subprocess.run(comando)
     except KeyboardInterrupt:
         print("\n\n✋ Servidor interrompido pelo usuário")
     except Exception as e:
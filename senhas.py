@@ -0,0 +1,78 @@
+"""
+Hash de senhas com bcrypt executado em um pool de processos
+
+O bcrypt é propositalmente lento; rodá-lo dentro dos handlers `async def`
+travaria o event loop. As operações vão para um ProcessPoolExecutor com uma
+fila limitada: quando ela enche, `FilaCheia` é levantada para que a API
+responda 503 em vez de acumular requisições.
+"""
+
+import asyncio
+import hmac
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+PREFIXOS_BCRYPT = ("$2a$", "$2b$", "$2y$")
+
+
+class FilaCheia(Exception):
+    pass
+
+
+def eh_hash(senha_armazenada):
+    """Senhas antigas foram gravadas em texto puro; hashes bcrypt têm prefixo próprio"""
+    return senha_armazenada.startswith(PREFIXOS_BCRYPT)
+
+
+def _bytes(senha):
+    # O bcrypt considera apenas os primeiros 72 bytes
+    return senha.encode('utf-8')[:72]
+
+
+# Executadas nos processos do pool
+
+def gerar_hash(senha, custo):
+    return bcrypt.hashpw(_bytes(senha), bcrypt.gensalt(custo)).decode()
+
+
+def conferir_hash(senha, senha_hash):
+    return bcrypt.checkpw(_bytes(senha), senha_hash.encode())
+
+
+class PoolSenhas:
+    def __init__(self, processos=2, limite_fila=64, custo=12):
+        self.processos = processos
+        self.limite_fila = limite_fila
+        self.custo = custo
+        self.em_andamento = 0
+        self.rejeitadas = 0
+        self._executor = None
+
+    async def _executar(self, funcao, *args):
+        if self.em_andamento >= self.limite_fila:
+            self.rejeitadas += 1
+            raise FilaCheia()
+        if self._executor is None:
+            # "spawn" evita herdar threads e o event loop do processo da API
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processos, mp_context=multiprocessing.get_context("spawn"))
+        self.em_andamento += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, funcao, *args)
+        finally:
+            self.em_andamento -= 1
+
+    async def gerar_hash(self, senha):
+        return await self._executar(gerar_hash, senha, self.custo)
+
+    async def verificar(self, senha, senha_armazenada):
+        if not eh_hash(senha_armazenada):
+            return hmac.compare_digest(senha.encode('utf-8'), senha_armazenada.encode('utf-8'))
+        return await self._executar(conferir_hash, senha, senha_armazenada)
+
+    def encerrar(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,1380 @@
+"""
+Teste de estresse de concorrência da API Bancária
+Dispara depósitos e saques simultâneos em várias contas e confere os saldos finais,
+em processo e com vários workers uvicorn sobre o mesmo banco SQLite
+
+Execute com: python -m pytest test_concorrencia.py
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+import api
+from armazenamento import ArmazenamentoJSON
+from cache_clientes import CacheClientes
+from grupo_commit import GrupoCommit
+from senhas import PoolSenhas
+from transacoes import INTERVALO_SALDOS, MAX_CENTAVOS, HistoricoTransacoes, Transacao
+
+N_CONTAS = 8
+DEPOSITOS_POR_CONTA = 50
+SAQUES_POR_CONTA = 10
+TRANSFERENCIAS = 400
+SALDO_TRANSFERENCIAS = 100.0
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+DURACAO_LEITURAS = 5.0
+
+
+def criar_backend(tipo, diretorio):
+    if tipo == "sqlite":
+        pytest.importorskip("aiosqlite")
+        from armazenamento_sqlite import ArmazenamentoSQLite
+        return ArmazenamentoSQLite(f"sqlite+aiosqlite:///{diretorio / 'banco.db'}")
+    return ArmazenamentoJSON(
+        str(diretorio / "usuarios.json"),
+        str(diretorio / "contas.json"),
+        str(diretorio / "journal.jsonl")
+    )
+
+
+def copiar_em_disco(origem, destino):
+    """Arquivos do backend JSON como estão no disco agora: uma queda sem checkpoint"""
+    destino.mkdir()
+    for nome in ("usuarios.json", "contas.json", "journal.jsonl"):
+        if (origem / nome).exists():
+            shutil.copy(origem / nome, destino / nome)
+    return destino
+
+
+async def reabrir(tipo, diretorio):
+    """Backend novo sobre os arquivos do diretório: (contas, linhas do journal antes de reaplicar)"""
+    journal = diretorio / "journal.jsonl"
+    linhas = [json.loads(l) for l in journal.read_text().splitlines()] if journal.exists() else []
+    armazenamento = criar_backend(tipo, diretorio)
+    await armazenamento.iniciar()
+    try:
+        return await armazenamento.carregar_contas(), linhas
+    finally:
+        await armazenamento.encerrar()
+
+
+async def registrar_e_logar(cliente, indice):
+    cpf = f"{indice:011d}"
+    resposta = await cliente.post("/api/v1/usuarios/registrar", json={
+        "nome": f"Cliente {indice}",
+        "cpf": cpf,
+        "data_nascimento": "01-01-1990",
+        "endereco": "Rua Teste, 1",
+        "senha": "senha123"
+    })
+    assert resposta.status_code == 200, resposta.text
+    resposta = await cliente.post("/api/v1/auth/login", json={"cpf": cpf, "senha": "senha123"})
+    return {"Authorization": f"Bearer {resposta.json()['access_token']}"}
+
+
+async def executar_cenario(armazenamento):
+    await armazenamento.iniciar()
+    transporte = httpx.ASGITransport(app=api.app)
+    try:
+        async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+            # Registros simultâneos: cada conta recebe um número próprio
+            cabecalhos = await asyncio.gather(*[registrar_e_logar(cliente, i + 1) for i in range(N_CONTAS)])
+
+            depositos = await asyncio.gather(*[
+                cliente.post("/api/v1/transacoes/depositar", json={"valor": 10.0}, headers=h)
+                for _ in range(DEPOSITOS_POR_CONTA)
+                for h in cabecalhos
+            ])
+            assert all(r.status_code == 200 for r in depositos)
+
+            saques = await asyncio.gather(*[
+                cliente.post("/api/v1/transacoes/sacar", json={"valor": 1.0}, headers=h)
+                for _ in range(SAQUES_POR_CONTA)
+                for h in cabecalhos
+            ])
+            aceitos = sum(1 for r in saques if r.status_code == 200)
+            assert aceitos == N_CONTAS * api.LIMITE_SAQUES
+
+            for h in cabecalhos:
+                extrato = (await cliente.get("/api/v1/extrato", headers=h)).json()
+                assert extrato['saldo'] == DEPOSITOS_POR_CONTA * 10.0 - api.LIMITE_SAQUES * 1.0
+                assert len(extrato['transacoes']) == DEPOSITOS_POR_CONTA + api.LIMITE_SAQUES
+                assert extrato['saldo_final'] == extrato['saldo']
+                assert set(extrato['transacoes'][0]) == {"tipo", "valor", "data"}
+                saldo = (await cliente.get("/api/v1/conta/saldo", headers=h)).json()
+                assert saldo['saldo'] == extrato['saldo'] and "em" not in saldo
+                csv_exportado = await cliente.get("/api/v1/extrato/exportar", headers=h)
+                linhas = csv_exportado.text.splitlines()
+                assert linhas[0] == "data,tipo,valor,saldo"
+                assert len(linhas) == 1 + len(extrato['transacoes'])
+                assert float(linhas[-1].split(",")[-1]) == extrato['saldo']
+                ndjson = await cliente.get("/api/v1/extrato/exportar", params={"formato": "ndjson"}, headers=h)
+                assert ndjson.headers["content-type"] == "application/x-ndjson"
+                assert [json.loads(l)['saldo'] for l in ndjson.text.splitlines()][-1] == extrato['saldo']
+                historico = (await cliente.get(
+                    "/api/v1/conta/saldo", params={"em": "01-01-2000"}, headers=h)).json()
+                assert historico['saldo'] == 0.0
+
+            metricas = await cliente.get("/api/v1/metrics")
+            assert metricas.headers["content-type"].startswith("text/plain")
+            linhas = metricas.text.splitlines()
+            depositos_ok = 'api_requisicoes_total{metodo="POST",rota="/api/v1/transacoes/depositar",status="200"}'
+            assert any(l.startswith(depositos_ok) and int(l.split()[-1]) >= len(depositos) for l in linhas)
+            for fase in ("verificar_token", "armazenamento_leitura", "armazenamento_gravacao"):
+                assert any(l.startswith(f'api_fase_duracao_segundos_count{{fase="{fase}"}}') for l in linhas)
+    finally:
+        await armazenamento.encerrar()
+
+
+@pytest.mark.parametrize("tipo", ["json", "sqlite"])
+def test_operacoes_concorrentes_sem_perda_de_atualizacao(tipo, tmp_path, monkeypatch):
+    armazenamento = api.instrumentar_armazenamento(criar_backend(tipo, tmp_path))
+    monkeypatch.setattr(api, "armazenamento", armazenamento)
+    monkeypatch.setattr(api, "cache_clientes", CacheClientes())
+    # Páginas pequenas: a exportação do extrato atravessa várias
+    monkeypatch.setattr(api, "PAGINA_EXPORTACAO", 16)
+    # Custo baixo do bcrypt: o hash de senhas não é o foco deste teste
+    pool_senhas = PoolSenhas(processos=2, custo=4)
+    monkeypatch.setattr(api, "pool_senhas", pool_senhas)
+    try:
+        asyncio.run(executar_cenario(armazenamento))
+    finally:
+        pool_senhas.encerrar()
+
+    # Os saldos também precisam sobreviver à reinicialização
+    recarregado = criar_backend(tipo, tmp_path)
+
+    async def conferir():
+        await recarregado.iniciar()
+        try:
+            contas = await recarregado.carregar_contas()
+        finally:
+            await recarregado.encerrar()
+        return contas
+
+    contas = asyncio.run(conferir())
+    assert len(contas) == N_CONTAS
+    assert sorted(c['numero'] for c in contas.values()) == [f"{i + 1:06d}" for i in range(N_CONTAS)]
+    for conta in contas.values():
+        assert conta['saldo_centavos'] == DEPOSITOS_POR_CONTA * 1000 - api.LIMITE_SAQUES * 100
+        assert len(conta['historico_transacoes']) == DEPOSITOS_POR_CONTA + api.LIMITE_SAQUES
+
+
+async def repetir_deposito(cliente, cabecalho, simultaneas):
+    """Envia o mesmo depósito com a mesma Idempotency-Key várias vezes ao mesmo tempo"""
+    h = {**cabecalho, "Idempotency-Key": "deposito-1"}
+    respostas = await asyncio.gather(*[
+        cliente.post("/api/v1/transacoes/depositar", json={"valor": 25.0}, headers=h)
+        for _ in range(simultaneas)
+    ])
+    assert all(r.status_code == 200 for r in respostas)
+    assert len({r.text for r in respostas}) == 1
+    outra = await cliente.post("/api/v1/transacoes/depositar", json={"valor": 30.0}, headers=h)
+    assert outra.status_code == 422
+    return respostas
+
+
+@pytest.mark.parametrize("tipo", ["json", "sqlite"])
+def test_idempotency_key_aplica_uma_vez(tipo, tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "cache_clientes", CacheClientes())
+    pool_senhas = PoolSenhas(processos=1, custo=4)
+    monkeypatch.setattr(api, "pool_senhas", pool_senhas)
+
+    async def cenario(primeira_vez):
+        # Backend e cache novos a cada vez: a segunda rodada simula um reinício
+        armazenamento = criar_backend(tipo, tmp_path)
+        monkeypatch.setattr(api, "armazenamento", armazenamento)
+        monkeypatch.setattr(api, "cache_idempotencia", api.CacheIdempotencia())
+        await armazenamento.iniciar()
+        try:
+            transporte = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                if primeira_vez:
+                    cabecalho = await registrar_e_logar(cliente, 1)
+                else:
+                    resposta = await cliente.post(
+                        "/api/v1/auth/login", json={"cpf": f"{1:011d}", "senha": "senha123"})
+                    cabecalho = {"Authorization": f"Bearer {resposta.json()['access_token']}"}
+                respostas = await repetir_deposito(cliente, cabecalho, 10)
+                if primeira_vez and tipo == "json":
+                    copiar_em_disco(tmp_path, tmp_path / "queda")
+                saldo = (await cliente.get("/api/v1/conta/saldo", headers=cabecalho)).json()
+                assert saldo['saldo'] == 25.0
+                return respostas
+        finally:
+            await armazenamento.encerrar()
+
+    try:
+        originais = asyncio.run(cenario(True))
+        repetidas = asyncio.run(cenario(False))
+    finally:
+        pool_senhas.encerrar()
+    assert repetidas[0].json() == originais[0].json()
+    assert all(r.headers.get("idempotent-replayed") == "true" for r in repetidas)
+
+    if tipo == "json":
+        # Cada linha do journal leva só a chave que registrou; a queda não perde a chave
+        contas, linhas = asyncio.run(reabrir(tipo, tmp_path / "queda"))
+        transacoes = [l for l in linhas if l["op"] == "transacao"]
+        assert len(transacoes) == 1 and "idempotencia" not in transacoes[0]
+        assert list(transacoes[0]["idempotencia_nova"]) == ["deposito-1"]
+        assert list(contas[f"{1:011d}"]["idempotencia"]) == ["deposito-1"]
+
+
+async def logar(cliente, indice):
+    resposta = await cliente.post("/api/v1/auth/login", json={"cpf": f"{indice:011d}", "senha": "senha123"})
+    assert resposta.status_code == 200, resposta.text
+    return {"Authorization": f"Bearer {resposta.json()['access_token']}"}
+
+
+async def status_saldo(cliente, cabecalho):
+    return (await cliente.get("/api/v1/conta/saldo", headers=cabecalho)).status_code
+
+
+@pytest.mark.parametrize("tipo", ["json", "sqlite"])
+def test_logout_e_revogacao_de_sessoes(tipo, tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "cache_clientes", CacheClientes())
+    pool_senhas = PoolSenhas(processos=1, custo=4)
+    monkeypatch.setattr(api, "pool_senhas", pool_senhas)
+
+    async def cenario(primeira_vez, sessoes):
+        # Backend e cache de tokens novos a cada vez: a segunda rodada simula um reinício
+        armazenamento = criar_backend(tipo, tmp_path)
+        monkeypatch.setattr(api, "armazenamento", armazenamento)
+        monkeypatch.setattr(api, "cache_tokens", api.CacheTokens())
+        await armazenamento.iniciar()
+        try:
+            transporte = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                if primeira_vez:
+                    # Dois aparelhos no mesmo segundo: tokens distintos
+                    celular = await registrar_e_logar(cliente, 1)
+                    notebook = await logar(cliente, 1)
+                    assert celular != notebook
+                    assert await status_saldo(cliente, celular) == 200
+                    assert (await cliente.post("/api/v1/auth/logout", headers=celular)).status_code == 200
+                    assert await status_saldo(cliente, celular) == 401
+                    assert await status_saldo(cliente, notebook) == 200
+                    # Novo login logo após o logout: não herda a revogação
+                    novo = await logar(cliente, 1)
+                    assert await status_saldo(cliente, novo) == 200
+                    return celular, notebook, novo
+                celular, notebook, novo = sessoes
+                # Após o reinício o logout continua valendo, e as demais sessões também
+                assert await status_saldo(cliente, celular) == 401
+                assert await status_saldo(cliente, notebook) == 200
+                resposta = await cliente.post("/api/v1/auth/revogar-sessoes", headers=novo)
+                assert resposta.status_code == 200
+                assert await status_saldo(cliente, notebook) == 401
+                assert await status_saldo(cliente, novo) == 401
+                assert await status_saldo(cliente, await logar(cliente, 1)) == 200
+                return sessoes
+        finally:
+            await armazenamento.encerrar()
+
+    try:
+        sessoes = asyncio.run(cenario(True, None))
+        asyncio.run(cenario(False, sessoes))
+    finally:
+        pool_senhas.encerrar()
+
+    # Lista local de revogados: limitada, sem os já expirados
+    cache = api.CacheTokens(max_revogados=2)
+    agora = time.time()
+    cache.revogar("a", "a", agora - 1)
+    for jti in "bcd":
+        cache.revogar(jti, jti, agora + 60)
+    assert cache.estatisticas()["revogados"] == 2
+    assert not cache.revogado("a") and cache.revogado("d")
+
+
+def test_grupo_commit_agrupa_e_confirma_apos_gravar():
+    gravados, lotes = [], []
+
+    def gravar(registros):
+        time.sleep(0.01)
+        if "falha" in registros:
+            raise OSError("disco cheio")
+        gravados.extend(registros)
+        lotes.append(len(registros))
+
+    async def enviar(grupo, registro):
+        await grupo.enviar(registro)
+        # Confirmado só depois de gravado
+        assert registro in gravados
+
+    async def cenario():
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            # Tudo o que chega na janela vira um único lote
+            grupo = GrupoCommit(gravar, executor, janela=0.05, max_registros=100)
+            await asyncio.gather(*[enviar(grupo, i) for i in range(50)])
+            assert lotes == [50]
+            # Com max_registros pendentes o lote sai sem esperar a janela
+            grupo.janela = 10.0
+            inicio = time.perf_counter()
+            await asyncio.gather(*[enviar(grupo, i) for i in range(50, 150)])
+            assert lotes == [50, 100] and time.perf_counter() - inicio < 5
+            grupo.janela = 0.05
+            # Uma falha chega a todas as requisições do lote, e só a elas
+            resultados = await asyncio.gather(
+                *[grupo.enviar(r) for r in ("a", "falha", "b")], return_exceptions=True)
+            assert all(isinstance(r, OSError) for r in resultados)
+            await enviar(grupo, "c")
+            estatisticas = grupo.estatisticas()
+            await grupo.encerrar()
+            return estatisticas
+        finally:
+            executor.shutdown()
+
+    estatisticas = asyncio.run(cenario())
+    assert estatisticas["lotes"] == 3 and estatisticas["registros"] == 151
+    assert estatisticas["maior_lote"] == 100 and estatisticas["falhas"] == 1
+    assert "a" not in gravados and "b" not in gravados
+
+
+class FsyncFalho:
+    """os.fsync que falha nas próximas `falhas` chamadas sobre o journal; a escrita já chegou ao arquivo"""
+
+    def __init__(self, arquivo_journal):
+        self.arquivo_journal = arquivo_journal
+        self.falhas = 0
+        self._fsync = os.fsync
+
+    def __call__(self, fd):
+        if self.falhas and os.path.exists(self.arquivo_journal) and os.path.samestat(
+                os.fstat(fd), os.stat(self.arquivo_journal)):
+            self.falhas -= 1
+            raise OSError("disco cheio")
+        self._fsync(fd)
+
+
+def test_falha_no_journal_desfaz_a_operacao(tmp_path, monkeypatch):
+    armazenamento = api.instrumentar_armazenamento(criar_backend("json", tmp_path))
+    monkeypatch.setattr(api, "armazenamento", armazenamento)
+    monkeypatch.setattr(api, "cache_clientes", CacheClientes())
+    monkeypatch.setattr(api, "cache_idempotencia", api.CacheIdempotencia())
+    pool_senhas = PoolSenhas(processos=1, custo=4)
+    monkeypatch.setattr(api, "pool_senhas", pool_senhas)
+    fsync = FsyncFalho(armazenamento.arquivo_journal)
+    monkeypatch.setattr(os, "fsync", fsync)
+
+    async def cenario():
+        await armazenamento.iniciar()
+        try:
+            transporte = httpx.ASGITransport(app=api.app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                cabecalho = await registrar_e_logar(cliente, 1)
+                depositar = "/api/v1/transacoes/depositar"
+                assert (await cliente.post(depositar, json={"valor": 10.0}, headers=cabecalho)).status_code == 200
+                assert (await cliente.post("/api/v1/transacoes/sacar", json={"valor": 1.0},
+                                           headers=cabecalho)).status_code == 200
+
+                h = {**cabecalho, "Idempotency-Key": "deposito-falho"}
+                fsync.falhas = 1
+                assert (await cliente.post(depositar, json={"valor": 5.0}, headers=h)).status_code == 500
+                fsync.falhas = 1
+                resposta = await cliente.post("/api/v1/transacoes/sacar", json={"valor": 1.0}, headers=cabecalho)
+                assert resposta.status_code == 500
+
+                # Nada da operação recusada ficou na memória nem no journal
+                extrato = (await cliente.get("/api/v1/extrato", headers=cabecalho)).json()
+                assert extrato['saldo'] == 9.0 and len(extrato['transacoes']) == 2
+                assert armazenamento.falha_journal is None
+
+                # A mesma chave é aplicada de novo, e o limite de saques não contou o saque recusado
+                resposta = await cliente.post(depositar, json={"valor": 5.0}, headers=h)
+                assert resposta.status_code == 200 and resposta.json()['saldo_atual'] == 14.0
+                for _ in range(api.LIMITE_SAQUES - 1):
+                    resposta = await cliente.post("/api/v1/transacoes/sacar", json={"valor": 1.0},
+                                                  headers=cabecalho)
+                    assert resposta.status_code == 200
+                copiar_em_disco(tmp_path, tmp_path / "queda")
+
+                linhas = (await cliente.get("/api/v1/metrics")).text.splitlines()
+                assert any(l.startswith("api_commit_lote_registros_count ") for l in linhas)
+                assert any(l.startswith('api_commit_latencia_segundos_bucket{le="+Inf"}') for l in linhas)
+
+                # Se nem o corte do journal confirma, o backend recusa gravações até reiniciar
+                fsync.falhas = 2
+                assert (await cliente.post(depositar, json={"valor": 7.0}, headers=cabecalho)).status_code == 500
+                assert armazenamento.estatisticas()["falha_journal"] == "disco cheio"
+                assert (await cliente.post(depositar, json={"valor": 7.0}, headers=cabecalho)).status_code == 500
+                assert (await cliente.get("/api/v1/conta/saldo", headers=cabecalho)).json()['saldo'] == 14.0 - (
+                    api.LIMITE_SAQUES - 1)
+        finally:
+            await armazenamento.encerrar()
+
+    try:
+        asyncio.run(cenario())
+    finally:
+        pool_senhas.encerrar()
+
+    saldo_esperado = (10 + 5 - api.LIMITE_SAQUES) * 100
+    for diretorio in (tmp_path / "queda", tmp_path):
+        contas, _ = asyncio.run(reabrir("json", diretorio))
+        conta = contas[f"{1:011d}"]
+        assert conta['saldo_centavos'] == saldo_esperado
+        assert len(conta['historico_transacoes']) == 2 + api.LIMITE_SAQUES
+        assert list(conta['idempotencia']) == ["deposito-falho"]
+
+
+def test_logouts_simultaneos_em_dois_workers_nao_se_perdem(tmp_path, monkeypatch):
+    # Dois backends sobre o mesmo banco, como dois workers: o outro grava um logout
+    # entre a leitura e a gravação do logout feito pela API
+    armazenamento = criar_backend("sqlite", tmp_path)
+    outro_worker = criar_backend("sqlite", tmp_path)
+    monkeypatch.setattr(api, "armazenamento", armazenamento)
+    monkeypatch.setattr(api, "cache_clientes", CacheClientes())
+    monkeypatch.setattr(api, "cache_tokens", api.CacheTokens())
+    pool_senhas = PoolSenhas(processos=1, custo=4)
+    monkeypatch.setattr(api, "pool_senhas", pool_senhas)
+    cpf = f"{1:011d}"
+    atualizar_usuario = armazenamento.atualizar_usuario
+    interferiu = False
+
+    async def logout_no_outro_worker(jti):
+        usuario = await outro_worker.obter_usuario(cpf)
+        revogados = dict(usuario["tokens_revogados"] or {})
+        revogados[jti] = time.time() + 600
+        await outro_worker.atualizar_usuario(cpf, {"tokens_revogados": revogados}, versao=usuario["versao"])
+
+    async def atualizar_depois_do_outro(cpf_usuario, campos, versao=None):
+        # Só na primeira tentativa: a repetição relê o usuário e grava as duas revogações
+        nonlocal interferiu
+        if versao is not None and not interferiu:
+            interferiu = True
+            await logout_no_outro_worker("outro-worker")
+        return await atualizar_usuario(cpf_usuario, campos, versao)
+
+    monkeypatch.setattr(armazenamento, "atualizar_usuario", atualizar_depois_do_outro)
+
+    async def cenario():
+        await armazenamento.iniciar()
+        await outro_worker.iniciar()
+        try:
+            transporte = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                celular = await registrar_e_logar(cliente, 1)
+                notebook = await logar(cliente, 1)
+                assert (await cliente.post("/api/v1/auth/logout", headers=celular)).status_code == 200
+                revogados = (await outro_worker.obter_usuario(cpf))["tokens_revogados"]
+                assert len(revogados) == 2 and "outro-worker" in revogados
+
+                # Um terceiro worker, sem cache, também recusa o token encerrado
+                monkeypatch.setattr(api, "cache_tokens", api.CacheTokens())
+                assert await status_saldo(cliente, celular) == 401
+                assert await status_saldo(cliente, notebook) == 200
+
+                # A versão lida ficou velha: a gravação condicional recusa sem alterar nada
+                usuario = await armazenamento.obter_usuario(cpf)
+                await logout_no_outro_worker("mais-um")
+                with pytest.raises(api.ConflitoConcorrencia):
+                    await atualizar_usuario(cpf, {"tokens_revogados": {}}, versao=usuario["versao"])
+                assert len((await outro_worker.obter_usuario(cpf))["tokens_revogados"]) == 3
+        finally:
+            await outro_worker.encerrar()
+            await armazenamento.encerrar()
+
+    try:
+        asyncio.run(cenario())
+    finally:
+        pool_senhas.encerrar()
+    assert armazenamento.estatisticas()["conflitos"] == 2
+
+
+@pytest.mark.parametrize("tipo", ["json", "sqlite"])
+def test_senha_em_texto_puro_vira_hash_no_login(tipo, tmp_path, monkeypatch):
+    armazenamento = criar_backend(tipo, tmp_path)
+    monkeypatch.setattr(api, "armazenamento", armazenamento)
+    monkeypatch.setattr(api, "cache_clientes", CacheClientes())
+    pool_senhas = PoolSenhas(processos=1, custo=4)
+    monkeypatch.setattr(api, "pool_senhas", pool_senhas)
+    cpf = f"{1:011d}"
+
+    async def cenario():
+        await armazenamento.iniciar()
+        try:
+            transporte = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                await registrar_e_logar(cliente, 1)
+                # Registro de uma versão anterior, com a senha gravada em texto puro
+                await armazenamento.atualizar_usuario(cpf, {"senha": "senha123"})
+                await logar(cliente, 1)
+                senha = (await armazenamento.obter_usuario(cpf))["senha"]
+                assert senha != "senha123" and senha.startswith("$2b$")
+                await logar(cliente, 1)
+                resposta = await cliente.post("/api/v1/auth/login", json={"cpf": cpf, "senha": "errada1"})
+                assert resposta.status_code == 401
+        finally:
+            await armazenamento.encerrar()
+
+    try:
+        asyncio.run(cenario())
+    finally:
+        pool_senhas.encerrar()
+
+
+def test_fila_de_senhas_cheia_responde_503(tmp_path, monkeypatch):
+    armazenamento = criar_backend("json", tmp_path)
+    monkeypatch.setattr(api, "armazenamento", armazenamento)
+    monkeypatch.setattr(api, "cache_clientes", CacheClientes())
+    pool_senhas = PoolSenhas(processos=1, limite_fila=1, custo=4)
+    monkeypatch.setattr(api, "pool_senhas", pool_senhas)
+
+    async def cenario():
+        await armazenamento.iniciar()
+        try:
+            transporte = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                await registrar_e_logar(cliente, 1)
+                # Um hash lento ocupa a única vaga da fila
+                pool_senhas.custo = 14
+                ocupante = asyncio.create_task(pool_senhas.gerar_hash("ocupante"))
+                while pool_senhas.em_andamento == 0:
+                    await asyncio.sleep(0.001)
+                respostas = [
+                    await cliente.post("/api/v1/auth/login", json={"cpf": f"{1:011d}", "senha": "senha123"}),
+                    await cliente.post("/api/v1/usuarios/registrar", json={
+                        "nome": "Cliente 2", "cpf": f"{2:011d}", "data_nascimento": "01-01-1990",
+                        "endereco": "Rua Teste, 1", "senha": "senha123"}),
+                ]
+                await ocupante
+                pool_senhas.custo = 4
+                # Com a fila livre, o mesmo login passa
+                await logar(cliente, 1)
+                return respostas
+        finally:
+            await armazenamento.encerrar()
+
+    try:
+        respostas = asyncio.run(cenario())
+    finally:
+        pool_senhas.encerrar()
+    for resposta in respostas:
+        assert resposta.status_code == 503
+        assert resposta.headers["retry-after"] == str(api.RETRY_AFTER_SEGUNDOS)
+    assert pool_senhas.rejeitadas == 2
+
+
+async def semear_transacoes(armazenamento, cpf, horarios):
+    """Depósitos de 1, 2, 3... reais com os horários dados, gravados direto no armazenamento"""
+    conta = await armazenamento.obter_conta(cpf)
+    for i, horario in enumerate(horarios, 1):
+        conta["saldo_centavos"] += i * 100
+        await armazenamento.registrar_transacao(cpf, conta, Transacao("Deposito", i * 100, int(horario.timestamp())))
+
+
+async def paginar_extrato(cliente, cabecalho, **filtros):
+    """Segue proximo_cursor com páginas de 2 até o fim: valores de todas as páginas"""
+    valores, cursor, paginas = [], None, 0
+    while True:
+        params = {"limit": 2, **filtros, **({"cursor": cursor} if cursor else {})}
+        resposta = await cliente.get("/api/v1/extrato", params=params, headers=cabecalho)
+        assert resposta.status_code == 200, resposta.text
+        corpo = resposta.json()
+        assert len(corpo["transacoes"]) <= 2
+        valores += [t["valor"] for t in corpo["transacoes"]]
+        paginas += 1
+        cursor = corpo["proximo_cursor"]
+        if cursor is None:
+            return valores, paginas
+
+
+@pytest.mark.parametrize("tipo", ["json", "sqlite"])
+def test_extrato_paginado_e_filtrado_por_periodo(tipo, tmp_path, monkeypatch):
+    armazenamento = criar_backend(tipo, tmp_path)
+    monkeypatch.setattr(api, "armazenamento", armazenamento)
+    monkeypatch.setattr(api, "cache_clientes", CacheClientes())
+    pool_senhas = PoolSenhas(processos=1, custo=4)
+    monkeypatch.setattr(api, "pool_senhas", pool_senhas)
+    # Uma transação por hora a partir das 10h; duas no mesmo segundo, às 13h
+    horarios = [datetime(2026, 3, 9, hora) for hora in (10, 11, 12, 13, 13, 14, 15)]
+
+    async def cenario():
+        await armazenamento.iniciar()
+        try:
+            transporte = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                cabecalho = await registrar_e_logar(cliente, 1)
+                await semear_transacoes(armazenamento, f"{1:011d}", horarios)
+
+                # Páginas de 2 até o fim: nenhuma transação falta nem se repete
+                valores, paginas = await paginar_extrato(cliente, cabecalho)
+                assert valores == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0] and paginas == 4
+
+                # Limites inclusivos, com hora exata e com dia inteiro
+                valores, _ = await paginar_extrato(
+                    cliente, cabecalho, desde="09-03-2026 12:00:00", ate="09-03-2026 13:00:00")
+                assert valores == [3.0, 4.0, 5.0]
+                valores, _ = await paginar_extrato(cliente, cabecalho, desde="09-03-2026 13:00:01")
+                assert valores == [6.0, 7.0]
+                valores, _ = await paginar_extrato(cliente, cabecalho, ate="09-03-2026 10:00:00")
+                assert valores == [1.0]
+                valores, _ = await paginar_extrato(cliente, cabecalho, desde="09-03-2026", ate="09-03-2026")
+                assert len(valores) == 7
+                valores, _ = await paginar_extrato(cliente, cabecalho, desde="10-03-2026")
+                assert valores == []
+
+                for filtros in ({"desde": "31-02-2026"}, {"ate": "2026-03-09"}, {"desde": "09-03-2026 25:00:00"}):
+                    resposta = await cliente.get("/api/v1/extrato", params=filtros, headers=cabecalho)
+                    assert resposta.status_code == 400
+
+                # Só cursores entregues pelo próprio backend são aceitos
+                for forjado in ([1, 2], [0, 1], 3.5, True, "x"):
+                    resposta = await cliente.get(
+                        "/api/v1/extrato", params={"cursor": api.codificar_cursor(forjado)}, headers=cabecalho)
+                    assert resposta.status_code == 400, forjado
+                resposta = await cliente.get("/api/v1/extrato", params={"cursor": "não é base64"}, headers=cabecalho)
+                assert resposta.status_code == 400
+        finally:
+            await armazenamento.encerrar()
+
+    try:
+        asyncio.run(cenario())
+    finally:
+        pool_senhas.encerrar()
+
+
+@pytest.mark.parametrize("tipo", ["json", "sqlite"])
+def test_saldo_historico_entre_checkpoints(tipo, tmp_path, monkeypatch):
+    armazenamento = criar_backend(tipo, tmp_path)
+    monkeypatch.setattr(api, "armazenamento", armazenamento)
+    monkeypatch.setattr(api, "cache_clientes", CacheClientes())
+    pool_senhas = PoolSenhas(processos=1, custo=4)
+    monkeypatch.setattr(api, "pool_senhas", pool_senhas)
+    # Mais de dois intervalos de saldos acumulados; um depósito por minuto, de 1, 2, 3... reais
+    inicio = datetime(2026, 3, 9, 8, 0)
+    horarios = [inicio + timedelta(minutes=i) for i in range(2 * INTERVALO_SALDOS + 30)]
+
+    def saldo_apos(n):
+        return n * (n + 1) / 2
+
+    def data(horario):
+        return horario.strftime("%d-%m-%Y %H:%M:%S")
+
+    async def cenario():
+        await armazenamento.iniciar()
+        try:
+            transporte = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                cabecalho = await registrar_e_logar(cliente, 1)
+                await semear_transacoes(armazenamento, f"{1:011d}", horarios)
+
+                # Entre o 1º e o 2º saldo acumulado, no instante de uma transação e entre duas
+                for n, horario in ((INTERVALO_SALDOS + 36, horarios[INTERVALO_SALDOS + 35]),
+                                   (INTERVALO_SALDOS + 36, horarios[INTERVALO_SALDOS + 35] + timedelta(seconds=30)),
+                                   (INTERVALO_SALDOS, horarios[INTERVALO_SALDOS - 1]),
+                                   (INTERVALO_SALDOS - 1, horarios[INTERVALO_SALDOS - 1] - timedelta(seconds=1)),
+                                   (2 * INTERVALO_SALDOS + 7, horarios[2 * INTERVALO_SALDOS + 6])):
+                    resposta = await cliente.get("/api/v1/conta/saldo", params={"em": data(horario)},
+                                                 headers=cabecalho)
+                    assert resposta.json()["saldo"] == saldo_apos(n), n
+
+                # Saldos de abertura e fechamento de um período no meio do histórico
+                desde, ate = horarios[INTERVALO_SALDOS + 10], horarios[2 * INTERVALO_SALDOS + 3]
+                extrato = (await cliente.get("/api/v1/extrato", params={
+                    "desde": data(desde), "ate": data(ate), "limit": 1000}, headers=cabecalho)).json()
+                assert extrato["saldo_inicial"] == saldo_apos(INTERVALO_SALDOS + 10)
+                assert extrato["saldo_final"] == saldo_apos(2 * INTERVALO_SALDOS + 4)
+                movimento = sum(t["valor"] for t in extrato["transacoes"])
+                assert extrato["saldo_inicial"] + movimento == extrato["saldo_final"]
+        finally:
+            await armazenamento.encerrar()
+
+    try:
+        asyncio.run(cenario())
+    finally:
+        pool_senhas.encerrar()
+
+
+async def transferir_em_massa(cliente, cabecalhos, numeros):
+    """Transferências simultâneas entre pares de contas, nos dois sentidos ao mesmo tempo"""
+    depositos = await asyncio.gather(*[
+        cliente.post("/api/v1/transacoes/depositar", json={"valor": SALDO_TRANSFERENCIAS}, headers=h)
+        for h in cabecalhos
+    ])
+    assert all(r.status_code == 200 for r in depositos)
+    pedidos = []
+    for i in range(TRANSFERENCIAS):
+        origem = i % N_CONTAS
+        # Pares vizinhos nos dois sentidos: os mesmos dois locks pedidos em ordens opostas
+        destino = (origem + (1 if i % 2 else N_CONTAS - 1)) % N_CONTAS
+        corpo = {"valor": round(1 + (i * 37 % 500) / 100, 2)}
+        if i % 5 == 0:
+            corpo["cpf_destino"] = f"{destino + 1:011d}"
+        else:
+            corpo["numero_conta_destino"] = numeros[destino]
+        pedidos.append(cliente.post("/api/v1/transacoes/transferir", json=corpo, headers=cabecalhos[origem]))
+    respostas = await asyncio.gather(*pedidos)
+    # Recusas só por saldo insuficiente; nunca conflito nem erro interno
+    assert {r.status_code for r in respostas} <= {200, 400}, {r.text for r in respostas}
+    assert sum(1 for r in respostas if r.status_code == 200) > TRANSFERENCIAS // 2
+    saldos = [(await cliente.get("/api/v1/conta/saldo", headers=h)).json()['saldo'] for h in cabecalhos]
+    assert all(saldo >= 0 for saldo in saldos)
+    assert round(sum(saldos), 2) == N_CONTAS * SALDO_TRANSFERENCIAS
+
+
+def conferir_dinheiro_conservado(contas):
+    assert len(contas) == N_CONTAS
+    assert sum(c['saldo_centavos'] for c in contas.values()) == N_CONTAS * SALDO_TRANSFERENCIAS * 100
+    for conta in contas.values():
+        # O saldo gravado bate com o histórico: débito e crédito gravados juntos
+        assert conta['historico_transacoes'].saldo_acumulado == conta['saldo_centavos']
+
+
+@pytest.mark.parametrize("tipo", ["json", "sqlite"])
+def test_transferencias_conservam_dinheiro(tipo, tmp_path, monkeypatch):
+    armazenamento = criar_backend(tipo, tmp_path)
+    monkeypatch.setattr(api, "armazenamento", armazenamento)
+    monkeypatch.setattr(api, "cache_clientes", CacheClientes())
+    pool_senhas = PoolSenhas(processos=2, custo=4)
+    monkeypatch.setattr(api, "pool_senhas", pool_senhas)
+
+    async def cenario():
+        await armazenamento.iniciar()
+        try:
+            transporte = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                cabecalhos = [await registrar_e_logar(cliente, i + 1) for i in range(N_CONTAS)]
+                numeros = [(await cliente.get("/api/v1/conta/saldo", headers=h)).json()['numero_conta']
+                           for h in cabecalhos]
+                # Tempo limite: um deadlock entre os locks das contas trava o gather
+                await asyncio.wait_for(transferir_em_massa(cliente, cabecalhos, numeros), 60)
+        finally:
+            await armazenamento.encerrar()
+
+    async def recarregar():
+        recarregado = criar_backend(tipo, tmp_path)
+        await recarregado.iniciar()
+        try:
+            return await recarregado.carregar_contas()
+        finally:
+            await recarregado.encerrar()
+
+    try:
+        asyncio.run(cenario())
+    finally:
+        pool_senhas.encerrar()
+    conferir_dinheiro_conservado(asyncio.run(recarregar()))
+
+
+@pytest.mark.parametrize("tipo", ["json", "sqlite"])
+def test_lote_atomico_e_parcial(tipo, tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "armazenamento", criar_backend(tipo, tmp_path))
+    monkeypatch.setattr(api, "cache_clientes", CacheClientes())
+    pool_senhas = PoolSenhas(processos=1, custo=4)
+    monkeypatch.setattr(api, "pool_senhas", pool_senhas)
+
+    def operacoes(*pares):
+        return [{"tipo": tipo_operacao, "valor": valor} for tipo_operacao, valor in pares]
+
+    async def cenario():
+        await api.armazenamento.iniciar()
+        try:
+            transporte = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                cabecalho = await registrar_e_logar(cliente, 1)
+                lote = "/api/v1/transacoes/lote"
+
+                # Atômico: uma operação inválida recusa o lote inteiro, com o resultado de cada uma
+                resposta = await cliente.post(lote, headers=cabecalho, json={
+                    "operacoes": operacoes(("deposito", 50.0), ("saque", 1000.0), ("saque", 10.0))})
+                assert resposta.status_code == 400
+                resultados = resposta.json()["detail"]["resultados"]
+                assert [r["sucesso"] for r in resultados] == [True, False, True]
+                assert resultados[1]["erro"].startswith("Saldo insuficiente")
+                assert resultados[2]["saldo"] == 40.0
+                extrato = (await cliente.get("/api/v1/extrato", headers=cabecalho)).json()
+                assert extrato["saldo"] == 0.0 and extrato["transacoes"] == []
+
+                # Parcial: aplica só as válidas, na ordem
+                resposta = await cliente.post(lote, headers=cabecalho, json={
+                    "atomico": False,
+                    "operacoes": operacoes(("deposito", 50.0), ("saque", 1000.0), ("saque", 10.0))})
+                assert resposta.status_code == 200
+                corpo = resposta.json()
+                assert (corpo["aplicadas"], corpo["rejeitadas"], corpo["saldo_atual"]) == (2, 1, 40.0)
+
+                # O limite diário conta os saques já feitos e os anteriores do mesmo lote
+                resposta = await cliente.post(lote, headers=cabecalho, json={
+                    "atomico": False, "operacoes": operacoes(*[("saque", 1.0)] * (api.LIMITE_SAQUES + 1))})
+                assert resposta.status_code == 200
+                corpo = resposta.json()
+                assert corpo["aplicadas"] == api.LIMITE_SAQUES - 1
+                assert corpo["rejeitadas"] == 2
+                assert corpo["resultados"][-1]["erro"] == f"Limite de {api.LIMITE_SAQUES} saques por dia excedido"
+                resposta = await cliente.post(lote, headers=cabecalho, json={
+                    "operacoes": operacoes(("deposito", 5.0), ("saque", 1.0))})
+                assert resposta.status_code == 400
+                if tipo == "json":
+                    copiar_em_disco(tmp_path, tmp_path / "queda")
+        finally:
+            await api.armazenamento.encerrar()
+
+    try:
+        asyncio.run(cenario())
+    finally:
+        pool_senhas.encerrar()
+
+    # Após reiniciar (no JSON, também sem checkpoint: só o journal), os lotes aceitos estão lá
+    diretorios = [tmp_path, tmp_path / "queda"] if tipo == "json" else [tmp_path]
+    for diretorio in diretorios:
+        contas, linhas = asyncio.run(reabrir(tipo, diretorio))
+        conta = contas[f"{1:011d}"]
+        assert conta["saldo_centavos"] == 4000 - (api.LIMITE_SAQUES - 1) * 100
+        assert len(conta["historico_transacoes"]) == 2 + api.LIMITE_SAQUES - 1
+        assert conta["contadores_saque"]["dia"][1] == api.LIMITE_SAQUES
+        if diretorio.name == "queda":
+            assert [l["op"] for l in linhas if l["op"] == "lote"] == ["lote", "lote"]
+
+
+@pytest.mark.parametrize("com_orjson", [True, False])
+def test_respostas_com_e_sem_orjson(com_orjson, tmp_path, monkeypatch):
+    import respostas
+    if com_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(respostas, "orjson", None)
+    conteudo = {"titular": "João Ação", "saldo": 0.1 + 0.2, "valores": [1, 2.5, None, True], 7: "chave int"}
+    assert respostas.serializar(conteudo) == (
+        '{"titular":"João Ação","saldo":0.30000000000000004,"valores":[1,2.5,null,true],"7":"chave int"}'
+    ).encode("utf-8")
+
+    monkeypatch.setattr(api, "armazenamento", criar_backend("json", tmp_path))
+    monkeypatch.setattr(api, "cache_clientes", CacheClientes())
+    pool_senhas = PoolSenhas(processos=1, custo=4)
+    monkeypatch.setattr(api, "pool_senhas", pool_senhas)
+
+    async def cenario():
+        await api.armazenamento.iniciar()
+        try:
+            transporte = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                cabecalho = await registrar_e_logar(cliente, 1)
+                await cliente.post("/api/v1/transacoes/depositar", json={"valor": 12.34}, headers=cabecalho)
+                return await cliente.get("/api/v1/extrato", headers=cabecalho)
+        finally:
+            await api.armazenamento.encerrar()
+
+    try:
+        resposta = asyncio.run(cenario())
+    finally:
+        pool_senhas.encerrar()
+    assert resposta.headers["content-type"] == "application/json"
+    extrato = resposta.json()
+    assert extrato["titular"] == "Cliente 1" and extrato["saldo"] == 12.34
+    assert extrato["transacoes"][0]["tipo"] == "Deposito"
+
+
+def test_perfilamento_sob_demanda(tmp_path, monkeypatch):
+    diretorio = tmp_path / "perfis"
+    monkeypatch.setattr(api, "armazenamento", criar_backend("json", tmp_path))
+    monkeypatch.setattr(api.perfilador, "diretorio", str(diretorio))
+    monkeypatch.setattr(api.perfilador, "amostragem", 1)
+    monkeypatch.setattr(api.perfilador, "max_arquivos", 3)
+    monkeypatch.setattr(api.perfilador, "chave", None)
+    monkeypatch.setattr(api.perfilador, "capturados", 0)
+    monkeypatch.setattr(api, "CHAVE_ADMIN", "chave-admin")
+
+    def perfis_gravados():
+        return sorted(os.listdir(diretorio)) if diretorio.exists() else []
+
+    async def cenario():
+        await api.armazenamento.iniciar()
+        try:
+            transporte = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                # Amostragem 1: toda requisição é perfilada; acima de max_arquivos, os mais antigos saem
+                for _ in range(5):
+                    assert (await cliente.get("/api/v1/health")).status_code == 200
+                    await asyncio.sleep(0.002)
+                assert api.perfilador.capturados == 5
+                assert len(perfis_gravados()) == 3
+
+                # Sem amostragem, só o X-Perfilar com a chave certa força o perfil
+                api.perfilador.amostragem = 0
+                api.perfilador.chave = "chave-admin"
+                await cliente.get("/api/v1/health")
+                await cliente.get("/api/v1/health", headers={"X-Perfilar": "errada"})
+                assert api.perfilador.capturados == 5
+                await cliente.get("/api/v1/health", headers={"X-Perfilar": "chave-admin"})
+                assert api.perfilador.capturados == 6
+                assert len(perfis_gravados()) == 3
+
+                # Endpoint de administração: 403 sem a chave certa, e nunca é perfilado
+                for cabecalhos in ({}, {"X-Chave-Admin": "errada"}):
+                    resposta = await cliente.get("/api/v1/admin/perfis", headers=cabecalhos)
+                    assert resposta.status_code == 403
+                resposta = await cliente.get(
+                    "/api/v1/admin/perfis", params={"rota": "/api/v1/health"},
+                    headers={"X-Chave-Admin": "chave-admin", "X-Perfilar": "chave-admin"})
+                assert resposta.status_code == 200
+                corpo = resposta.json()
+                assert api.perfilador.capturados == 6
+                assert sorted(p["arquivo"] for p in corpo["perfis"]) == perfis_gravados()
+                assert all(p["rota"] == "/api/v1/health" and p["status"] == 200 for p in corpo["perfis"])
+                assert corpo["funcoes"]
+        finally:
+            await api.armazenamento.encerrar()
+
+    asyncio.run(cenario())
+
+
+def corromper_armazenamento(tipo, diretorio, cpf_saldo, cpf_historico):
+    """Altera direto no disco o saldo gravado de uma conta e uma transação do histórico de outra"""
+    if tipo == "sqlite":
+        import sqlite3
+        with sqlite3.connect(diretorio / "banco.db") as conexao:
+            conexao.execute("UPDATE contas SET saldo_centavos = saldo_centavos + 1 WHERE cpf = ?", (cpf_saldo,))
+            conexao.execute(
+                "UPDATE transacoes SET valor_centavos = valor_centavos + 500 "
+                "WHERE id = (SELECT MIN(id) FROM transacoes WHERE cpf = ?)", (cpf_historico,))
+        return
+    arquivo = diretorio / "contas.json"
+    contas = json.loads(arquivo.read_text(encoding="utf-8"))
+    contas[cpf_saldo]["saldo_centavos"] += 1
+    contas[cpf_historico]["historico_transacoes"][0]["valor_centavos"] += 500
+    arquivo.write_text(json.dumps(contas), encoding="utf-8")
+
+
+@pytest.mark.parametrize("vetorizado", [True, False])
+@pytest.mark.parametrize("tipo", ["json", "sqlite"])
+def test_reconciliacao_aponta_divergencias(tipo, vetorizado, tmp_path, monkeypatch, capsys):
+    import reconciliar
+    if not vetorizado:
+        monkeypatch.setattr(reconciliar, "np", None)
+    elif reconciliar.np is None:
+        pytest.skip("NumPy não instalado")
+    monkeypatch.setattr(api, "armazenamento", criar_backend(tipo, tmp_path))
+    monkeypatch.setattr(api, "cache_clientes", CacheClientes())
+    monkeypatch.setattr(api, "criar_armazenamento", lambda _: criar_backend(tipo, tmp_path))
+    pool_senhas = PoolSenhas(processos=1, custo=4)
+    monkeypatch.setattr(api, "pool_senhas", pool_senhas)
+
+    async def cenario():
+        await api.armazenamento.iniciar()
+        try:
+            transporte = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                for indice in (1, 2, 3):
+                    cabecalho = await registrar_e_logar(cliente, indice)
+                    for valor in (10.0, 20.0):
+                        await cliente.post("/api/v1/transacoes/depositar", json={"valor": valor}, headers=cabecalho)
+                    await cliente.post("/api/v1/transacoes/sacar", json={"valor": 5.0}, headers=cabecalho)
+        finally:
+            await api.armazenamento.encerrar()
+
+    try:
+        asyncio.run(cenario())
+    finally:
+        pool_senhas.encerrar()
+
+    # Armazenamento íntegro: nada a apontar
+    contas, _ = asyncio.run(reabrir(tipo, tmp_path))
+    assert reconciliar.reconciliar(contas) == []
+    assert asyncio.run(reconciliar.main())
+    assert "0 conta(s) divergente(s)" in capsys.readouterr().out
+
+    corromper_armazenamento(tipo, tmp_path, f"{1:011d}", f"{3:011d}")
+    contas, _ = asyncio.run(reabrir(tipo, tmp_path))
+    assert sorted(reconciliar.reconciliar(contas)) == [
+        (f"{1:011d}", 2501, 2500),
+        (f"{3:011d}", 2500, 3000),
+    ]
+    assert not asyncio.run(reconciliar.main())
+    saida = capsys.readouterr().out
+    assert f"DIVERGENTE {1:011d}: gravado R$ 25.01, histórico R$ 25.00" in saida
+    assert "2 conta(s) divergente(s)" in saida
+
+
+def test_limites_de_saque_por_dia_e_hora_do_calendario(monkeypatch):
+    monkeypatch.setattr(api, "LIMITE_SAQUES_HORA", 2)
+    conta = {"saldo_centavos": 100000, "limite_centavos": 50000, "limite_saques": 3,
+             "contadores_saque": None}
+    historico = HistoricoTransacoes()
+
+    def sacar(agora):
+        historico.anexar(api.aplicar_saque(conta, 100, agora))
+
+    def recusado(agora):
+        with pytest.raises(api.HTTPException) as erro:
+            api.aplicar_saque(conta, 100, agora)
+        return erro.value.detail
+
+    sacar(datetime(2026, 3, 9, 22, 58))
+    sacar(datetime(2026, 3, 9, 22, 59, 59))
+    assert recusado(datetime(2026, 3, 9, 22, 59, 59)) == "Limite de 2 saques por hora excedido"
+    # A hora cheia seguinte é outro balde, mesmo um segundo depois
+    sacar(datetime(2026, 3, 9, 23, 0))
+    assert recusado(datetime(2026, 3, 9, 23, 59, 59)) == "Limite de 3 saques por dia excedido"
+    # O dia seguinte recomeça à meia-noite, não 24 h após o primeiro saque
+    sacar(datetime(2026, 3, 10, 0, 0))
+    assert conta["contadores_saque"] == {"dia": ["10-03-2026", 1], "hora": ["10-03-2026 00", 1]}
+
+    # A recontagem a partir do histórico (contas sem contadores) usa os mesmos baldes
+    assert api.calcular_contadores_saque(historico, datetime(2026, 3, 9, 23, 30)) == {
+        "dia": ["09-03-2026", 3], "hora": ["09-03-2026 23", 1]}
+    assert api.calcular_contadores_saque(historico, datetime(2026, 3, 10, 0, 30)) == {
+        "dia": ["10-03-2026", 1], "hora": ["10-03-2026 00", 1]}
+
+
+@pytest.mark.parametrize("tipo", ["json", "sqlite"])
+def test_valores_acima_do_limite_nao_corrompem_a_conta(tipo, tmp_path, monkeypatch):
+    armazenamento = criar_backend(tipo, tmp_path)
+    monkeypatch.setattr(api, "armazenamento", armazenamento)
+    monkeypatch.setattr(api, "cache_clientes", CacheClientes())
+    pool_senhas = PoolSenhas(processos=1, custo=4)
+    monkeypatch.setattr(api, "pool_senhas", pool_senhas)
+
+    async def cenario():
+        await armazenamento.iniciar()
+        try:
+            transporte = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                cabecalho = await registrar_e_logar(cliente, 1)
+                await registrar_e_logar(cliente, 2)
+                depositar = "/api/v1/transacoes/depositar"
+                assert (await cliente.post(depositar, json={"valor": 10.0}, headers=cabecalho)).status_code == 200
+
+                # Acima de VALOR_MAXIMO: 422 antes de qualquer alteração na conta
+                for valor in (1e20, "1000000000000.01"):
+                    resposta = await cliente.post(depositar, json={"valor": valor}, headers=cabecalho)
+                    assert resposta.status_code == 422
+                resposta = await cliente.post("/api/v1/transacoes/lote", headers=cabecalho, json={
+                    "atomico": False,
+                    "operacoes": [{"tipo": "deposito", "valor": 5.0}, {"tipo": "deposito", "valor": 1e20}]})
+                assert resposta.status_code == 422
+                resposta = await cliente.post("/api/v1/transacoes/transferir", headers=cabecalho,
+                                              json={"valor": 1e20, "cpf_destino": f"{2:011d}"})
+                assert resposta.status_code == 422
+
+                extrato = await cliente.get("/api/v1/extrato", headers=cabecalho)
+                assert extrato.status_code == 200
+                assert extrato.json()["saldo"] == 10.0 and len(extrato.json()["transacoes"]) == 1
+                resposta = await cliente.post(depositar, json={"valor": str(api.VALOR_MAXIMO)}, headers=cabecalho)
+                assert resposta.status_code == 200
+                assert resposta.json()["saldo_atual"] == 10.0 + float(api.VALOR_MAXIMO)
+
+                if tipo == "json":
+                    # Um valor que o histórico recusa desfaz o que a API já aplicou na conta
+                    cpf = f"{1:011d}"
+                    conta = await armazenamento.obter_conta(cpf)
+                    saldo = conta["saldo_centavos"]
+                    conta["saldo_centavos"] += MAX_CENTAVOS
+                    with pytest.raises(OverflowError):
+                        await armazenamento.registrar_transacao(
+                            cpf, conta, Transacao("Deposito", MAX_CENTAVOS, int(time.time())))
+                    assert conta["saldo_centavos"] == saldo
+                    assert len(conta["historico_transacoes"]) == 2
+        finally:
+            await armazenamento.encerrar()
+
+    try:
+        asyncio.run(cenario())
+    finally:
+        pool_senhas.encerrar()
+
+    # O histórico confere os limites antes de tocar nas colunas, e estender é tudo ou nada
+    historico = HistoricoTransacoes()
+    historico.anexar(Transacao("Deposito", 100, 1))
+    with pytest.raises(OverflowError):
+        historico.estender([Transacao("Deposito", 1, 2), Transacao("Deposito", MAX_CENTAVOS, 3)])
+    assert (len(historico.ts), len(historico.tipos), len(historico.valores)) == (1, 1, 1)
+    assert historico.saldo_acumulado == 100 and historico.saldo_em(3) == 100
+    with pytest.raises(api.HTTPException) as erro:
+        api.aplicar_deposito({"saldo_centavos": MAX_CENTAVOS - 1}, 2, datetime.now())
+    assert erro.value.status_code == 400
+
+
+def test_arquivamento_durante_depositos(tmp_path, monkeypatch):
+    armazenamento = criar_backend("json", tmp_path)
+    armazenamento.minimo_arquivamento = 1
+    monkeypatch.setattr(api, "armazenamento", armazenamento)
+    monkeypatch.setattr(api, "cache_clientes", CacheClientes())
+    pool_senhas = PoolSenhas(processos=1, custo=4)
+    monkeypatch.setattr(api, "pool_senhas", pool_senhas)
+
+    async def depositar(cliente, cabecalhos):
+        respostas = await asyncio.gather(*[
+            cliente.post("/api/v1/transacoes/depositar", json={"valor": 10.0}, headers=h)
+            for _ in range(DEPOSITOS_POR_CONTA)
+            for h in cabecalhos
+        ])
+        assert all(r.status_code == 200 for r in respostas)
+
+    async def extrato_completo(cliente, h):
+        transacoes, cursor = [], None
+        while True:
+            params = {"limit": 7, **({"cursor": cursor} if cursor else {})}
+            pagina = (await cliente.get("/api/v1/extrato", params=params, headers=h)).json()
+            transacoes += pagina['transacoes']
+            cursor = pagina['proximo_cursor']
+            if cursor is None:
+                return transacoes, pagina
+
+    async def cenario():
+        await armazenamento.iniciar()
+        try:
+            transporte = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                cabecalhos = [await registrar_e_logar(cliente, i + 1) for i in range(N_CONTAS)]
+                await depositar(cliente, cabecalhos)
+                # Arquiva tudo o que já existe enquanto novos depósitos chegam ao fim do histórico
+                _, movidas = await asyncio.gather(
+                    depositar(cliente, cabecalhos), armazenamento.arquivar(agora=time.time() + 1))
+                assert movidas >= N_CONTAS * DEPOSITOS_POR_CONTA
+                for h in cabecalhos:
+                    transacoes, ultima = await extrato_completo(cliente, h)
+                    assert len(transacoes) == 2 * DEPOSITOS_POR_CONTA
+                    assert ultima['saldo_final'] == 2 * DEPOSITOS_POR_CONTA * 10.0
+                    historico = (await cliente.get(
+                        "/api/v1/conta/saldo", params={"em": transacoes[0]['data']}, headers=h)).json()
+                    assert historico['saldo'] > 0
+        finally:
+            await armazenamento.encerrar()
+
+    try:
+        asyncio.run(cenario())
+    finally:
+        pool_senhas.encerrar()
+
+    async def recarregar():
+        recarregado = criar_backend("json", tmp_path)
+        await recarregado.iniciar()
+        try:
+            quentes = sum(len(c['historico_transacoes']) for c in recarregado.contas.values())
+            return quentes, await recarregado.carregar_contas()
+        finally:
+            await recarregado.encerrar()
+
+    quentes, contas = asyncio.run(recarregar())
+    assert quentes <= N_CONTAS * DEPOSITOS_POR_CONTA
+    for conta in contas.values():
+        assert len(conta['historico_transacoes']) == 2 * DEPOSITOS_POR_CONTA
+        assert conta['historico_transacoes'].saldo_acumulado == conta['saldo_centavos']
+
+
+def test_limite_de_taxa_e_descarte_de_carga(tmp_path, monkeypatch):
+    armazenamento = criar_backend("json", tmp_path)
+    monkeypatch.setattr(api, "armazenamento", armazenamento)
+    monkeypatch.setattr(api, "cache_clientes", CacheClientes())
+    monkeypatch.setattr(api.metricas, "admissoes", {})
+    monkeypatch.setattr(api, "limitadores_taxa", api.criar_limitadores({
+        "login": {"cpf": "2/60", "ip": "4/60"},
+        "transacoes": {"cpf": "5/60"},
+    }))
+    pool_senhas = PoolSenhas(processos=1, custo=4)
+    monkeypatch.setattr(api, "pool_senhas", pool_senhas)
+
+    async def logar(cliente, indice):
+        return await cliente.post("/api/v1/auth/login", json={"cpf": f"{indice:011d}", "senha": "senha123"})
+
+    async def cenario():
+        await armazenamento.iniciar()
+        try:
+            transporte = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                cabecalho = await registrar_e_logar(cliente, 1)
+                await registrar_e_logar(cliente, 2)
+                assert (await logar(cliente, 1)).status_code == 200
+                # Terceiro login do CPF: recusado sem gastar o orçamento do IP
+                recusado = await logar(cliente, 1)
+                assert recusado.status_code == 429 and int(recusado.headers["retry-after"]) >= 1
+                await registrar_e_logar(cliente, 3)
+                # Quinto login do mesmo IP, com CPF novo: recusado pelo IP
+                resposta = await cliente.post("/api/v1/usuarios/registrar", json={
+                    "nome": "Cliente 4", "cpf": f"{4:011d}", "data_nascimento": "01-01-1990",
+                    "endereco": "Rua Teste, 1", "senha": "senha123"})
+                assert resposta.status_code == 200
+                assert (await logar(cliente, 4)).status_code == 429
+
+                depositos = await asyncio.gather(*[
+                    cliente.post("/api/v1/transacoes/depositar", json={"valor": 10.0}, headers=cabecalho)
+                    for _ in range(8)
+                ])
+                assert sorted(r.status_code for r in depositos) == [200] * 5 + [429] * 3
+                saldo = (await cliente.get("/api/v1/conta/saldo", headers=cabecalho)).json()
+                assert saldo['saldo'] == 50.0
+
+                # Event loop atrasado: transações descartadas, saúde e métricas seguem no ar
+                monkeypatch.setattr(api.controle_carga, "limite_atraso", 0.05)
+                monkeypatch.setattr(api.controle_carga, "atraso", 0.5)
+                descartado = await cliente.post(
+                    "/api/v1/transacoes/sacar", json={"valor": 1.0}, headers=cabecalho)
+                assert descartado.status_code == 503
+                assert descartado.headers["retry-after"] == str(api.RETRY_AFTER_SEGUNDOS)
+                saude = await cliente.get("/api/v1/health")
+                assert saude.status_code == 200 and saude.json()['carga']['atraso_loop_ms'] == 500.0
+                linhas = (await cliente.get("/api/v1/metrics")).text.splitlines()
+        finally:
+            await armazenamento.encerrar()
+        return linhas
+
+    try:
+        linhas = asyncio.run(cenario())
+    finally:
+        pool_senhas.encerrar()
+    for grupo, resultado, contagem in (("login", "admitida", 4), ("login", "limitada", 2),
+                                       ("transacoes", "admitida", 5), ("transacoes", "limitada", 3),
+                                       ("transacoes", "descartada", 1)):
+        assert f'api_admissao_total{{grupo="{grupo}",resultado="{resultado}"}} {contagem}' in linhas
+
+
+# --- Vários workers ---
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def preparar_sqlite(diretorio):
+    """Cria o esquema antes dos workers, como faz `run_api.py --producao`"""
+    from armazenamento_sqlite import ArmazenamentoSQLite
+    url = f"sqlite+aiosqlite:///{diretorio / 'banco.db'}"
+
+    async def preparar():
+        banco = ArmazenamentoSQLite(url)
+        await banco.iniciar()
+        await banco.encerrar()
+
+    asyncio.run(preparar())
+    return url
+
+
+def iniciar_workers(diretorio, url, workers):
+    porta = porta_livre()
+    ambiente = {**os.environ, "PYTHONPATH": RAIZ, "ARMAZENAMENTO": "sqlite", "URL_BANCO": url,
+                "CUSTO_BCRYPT": "4", "PROCESSOS_SENHA": "1", "TTL_CACHE_TOKENS": "5",
+                "TAMANHO_CACHE_CLIENTES": "0"}
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--port", str(porta),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=diretorio, env=ambiente)
+    url_api = f"http://127.0.0.1:{porta}"
+    for _ in range(200):
+        try:
+            if httpx.get(f"{url_api}/api/v1/health").status_code == 200:
+                return servidor, url_api
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    servidor.terminate()
+    raise RuntimeError("uvicorn não respondeu em 20 s")
+
+
+async def processos_atendendo(url_api, requisicoes=50):
+    """PIDs dos workers que responderam, cada requisição em uma conexão nova"""
+    async def perguntar():
+        async with httpx.AsyncClient(base_url=url_api) as cliente:
+            return (await cliente.get("/api/v1/health")).json()["processo"]
+    return set(await asyncio.gather(*[perguntar() for _ in range(requisicoes)]))
+
+
+def test_varios_workers_sem_perda_de_atualizacao(tmp_path):
+    pytest.importorskip("aiosqlite")
+    url = preparar_sqlite(tmp_path)
+    servidor, url_api = iniciar_workers(tmp_path, url, workers=2)
+
+    async def cenario():
+        assert len(await processos_atendendo(url_api)) == 2
+        async with httpx.AsyncClient(base_url=url_api, timeout=60.0) as cliente:
+            cabecalhos = await asyncio.gather(*[registrar_e_logar(cliente, i + 1) for i in range(N_CONTAS)])
+            depositos = await asyncio.gather(*[
+                cliente.post("/api/v1/transacoes/depositar", json={"valor": 10.0}, headers=h)
+                for _ in range(DEPOSITOS_POR_CONTA)
+                for h in cabecalhos
+            ])
+            assert all(r.status_code == 200 for r in depositos), {r.status_code for r in depositos}
+            saques = await asyncio.gather(*[
+                cliente.post("/api/v1/transacoes/sacar", json={"valor": 1.0}, headers=h)
+                for _ in range(SAQUES_POR_CONTA)
+                for h in cabecalhos
+            ])
+            # O limite diário de saques também vale somando os dois workers
+            assert sum(1 for r in saques if r.status_code == 200) == N_CONTAS * api.LIMITE_SAQUES
+
+    try:
+        asyncio.run(cenario())
+    finally:
+        servidor.terminate()
+        servidor.wait(timeout=30)
+
+    from armazenamento_sqlite import ArmazenamentoSQLite
+
+    async def conferir():
+        banco = ArmazenamentoSQLite(url)
+        await banco.iniciar()
+        try:
+            return await banco.carregar_contas()
+        finally:
+            await banco.encerrar()
+
+    contas = asyncio.run(conferir())
+    assert len(contas) == N_CONTAS
+    assert sorted(c['numero'] for c in contas.values()) == [f"{i + 1:06d}" for i in range(N_CONTAS)]
+    for conta in contas.values():
+        assert conta['saldo_centavos'] == DEPOSITOS_POR_CONTA * 1000 - api.LIMITE_SAQUES * 100
+        assert len(conta['historico_transacoes']) == DEPOSITOS_POR_CONTA + api.LIMITE_SAQUES
+
+
+def contar_leituras(url_api, cabecalhos, duracao, conexoes=16):
+    """Executado em um processo cliente: consultas de saldo concluídas em `duracao` s"""
+    async def medir():
+        fim = time.perf_counter() + duracao
+        async with httpx.AsyncClient(base_url=url_api, timeout=60.0) as cliente:
+            async def repetir(h):
+                feitas = 0
+                while time.perf_counter() < fim:
+                    resposta = await cliente.get("/api/v1/conta/saldo", headers=h)
+                    assert resposta.status_code == 200
+                    feitas += 1
+                return feitas
+            return sum(await asyncio.gather(*[
+                repetir(cabecalhos[i % len(cabecalhos)]) for i in range(conexoes)]))
+    return asyncio.run(medir())
+
+
+def vazao_leituras(diretorio, workers, clientes):
+    url = preparar_sqlite(diretorio)
+    servidor, url_api = iniciar_workers(diretorio, url, workers)
+    try:
+        async def preparar():
+            async with httpx.AsyncClient(base_url=url_api, timeout=60.0) as cliente:
+                return [await registrar_e_logar(cliente, i + 1) for i in range(N_CONTAS)]
+        cabecalhos = asyncio.run(preparar())
+        with ProcessPoolExecutor(clientes, mp_context=multiprocessing.get_context("spawn")) as pool:
+            leituras = sum(pool.map(
+                contar_leituras, [url_api] * clientes, [cabecalhos] * clientes,
+                [DURACAO_LEITURAS] * clientes))
+        return leituras / DURACAO_LEITURAS
+    finally:
+        servidor.terminate()
+        servidor.wait(timeout=30)
+
+
+@pytest.mark.skipif((os.cpu_count() or 1) < 4, reason="precisa de ao menos 4 núcleos")
+def test_leituras_escalam_com_workers(tmp_path):
+    pytest.importorskip("aiosqlite")
+    # Metade dos núcleos para os workers e metade para os processos clientes
+    workers = (os.cpu_count() or 1) // 2
+    (tmp_path / "um").mkdir()
+    (tmp_path / "varios").mkdir()
+    um = vazao_leituras(tmp_path / "um", 1, workers)
+    varios = vazao_leituras(tmp_path / "varios", workers, workers)
+    print(f"\nsaldo: 1 worker {um:.0f} req/s, {workers} workers {varios:.0f} req/s "
+          f"({varios / um:.2f}x)")
+    assert varios >= 0.6 * workers * um
@@ -0,0 +1,221 @@
+"""
+Representação compacta das transações em memória
+
+Cada conta guarda o histórico em colunas (`array` de timestamps e de valores
+em centavos e um `bytearray` com o código do tipo) em vez de uma lista de
+dicts com a data formatada: cerca de 17 bytes por transação em vez de
+algumas centenas. Valores monetários são sempre centavos inteiros; a
+conversão de/para reais acontece só na borda da API.
+
+A cada `INTERVALO_SALDOS` transações o histórico guarda o saldo acumulado, de
+modo que o saldo em qualquer data sai de uma busca binária na coluna de
+timestamps mais a reaplicação de no máximo `INTERVALO_SALDOS - 1` transações.
+A data no formato "dd-mm-aaaa hh:mm:ss" só é produzida na borda da API e na
+gravação dos snapshots, que continuam no formato JSON original.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
+from typing import NamedTuple
+
+FORMATO_DATA = "%d-%m-%Y %H:%M:%S"
+
+# Novos tipos entram no fim: os códigos são as posições nesta tupla
+TIPOS = ("Deposito", "Saque", "TransferenciaEnviada", "TransferenciaRecebida")
+CODIGOS_TIPO = {tipo: codigo for codigo, tipo in enumerate(TIPOS)}
+# Efeito de cada tipo sobre o saldo, na mesma ordem de TIPOS
+SINAIS = (1, -1, -1, 1)
+
+# Um saldo acumulado a cada tantas transações (8 bytes a cada 64 transações)
+INTERVALO_SALDOS = 64
+# Maior valor e maior saldo, em centavos, que cabem nas colunas array('q') (int64)
+MAX_CENTAVOS = 2 ** 63 - 1
+
+
+def para_centavos(valor):
+    """Converte reais (float, Decimal ou str) em centavos inteiros, sem erro de arredondamento binário"""
+    return int((Decimal(str(valor)) * 100).to_integral_value(ROUND_HALF_UP))
+
+
+def para_reais(centavos):
+    return centavos / 100
+
+
+def timestamp_da_data(data):
+    """Converte a data gravada nas transações em timestamp epoch (horário local)"""
+    try:
+        # Caminho rápido para o formato fixo; strptime é ~10x mais lento
+        return int(datetime(int(data[6:10]), int(data[3:5]), int(data[0:2]),
+                            int(data[11:13]), int(data[14:16]), int(data[17:19])).timestamp())
+    except (ValueError, IndexError):
+        return int(datetime.strptime(data, FORMATO_DATA).timestamp())
+
+
+@lru_cache(maxsize=4096)
+def _prefixo_minuto(minuto):
+    return datetime.fromtimestamp(minuto * 60).strftime("%d-%m-%Y %H:%M:")
+
+
+def formatar_data(ts):
+    # Fusos e horários de verão mudam em minutos cheios: só os segundos variam dentro
+    # do minuto, e o prefixo em cache evita o strftime nos extratos longos
+    return f"{_prefixo_minuto(ts // 60)}{ts % 60:02d}"
+
+
+class Transacao(NamedTuple):
+    tipo: str
+    valor_centavos: int
+    ts: int
+
+    @property
+    def data(self):
+        return formatar_data(self.ts)
+
+    def para_dict(self):
+        """Formato usado nos snapshots JSON"""
+        return {"tipo": self.tipo, "valor_centavos": self.valor_centavos, "data": self.data}
+
+    @classmethod
+    def de_registro(cls, registro):
+        """Aceita o dict dos snapshots/journal (com 'data' ou 'ts') ou a lista [tipo, valor, ts]
+
+        Registros anteriores aos centavos inteiros trazem `valor` em reais (float).
+        """
+        if isinstance(registro, dict):
+            ts = registro.get("ts")
+            if ts is None:
+                ts = timestamp_da_data(registro["data"])
+            centavos = registro.get("valor_centavos")
+            if centavos is None:
+                centavos = para_centavos(registro["valor"])
+            return cls(registro["tipo"], centavos, ts)
+        tipo, valor, ts = registro
+        return cls(tipo, para_centavos(valor) if isinstance(valor, float) else valor, ts)
+
+
+class HistoricoTransacoes:
+    """Histórico de uma conta em ordem cronológica, armazenado em colunas
+
+    Com o arquivamento (arquivo_frio.py) as colunas guardam só a parte quente: as
+    `arquivadas` transações mais antigas estão no segmento da conta e
+    `saldo_arquivado` é o saldo logo após elas. `len()` e as posições contam só a
+    parte quente; `total` inclui as arquivadas.
+    """
+
+    __slots__ = ("ts", "tipos", "valores", "saldos", "saldo_acumulado", "arquivadas", "saldo_arquivado")
+
+    def __init__(self, arquivadas=0, saldo_arquivado=0):
+        self.ts = array('q')
+        self.tipos = bytearray()
+        self.valores = array('q')
+        self.saldos = array('q')     # saldos[k]: saldo após as primeiras (k + 1) * INTERVALO_SALDOS transações
+        self.arquivadas = arquivadas
+        self.saldo_arquivado = saldo_arquivado
+        self.saldo_acumulado = saldo_arquivado
+
+    @classmethod
+    def de_lista(cls, registros, arquivadas=0, saldo_arquivado=0):
+        historico = cls(arquivadas, saldo_arquivado)
+        historico.estender(Transacao.de_registro(r) for r in registros)
+        return historico
+
+    def __len__(self):
+        return len(self.ts)
+
+    @property
+    def total(self):
+        return self.arquivadas + len(self.ts)
+
+    def __getitem__(self, posicao):
+        if isinstance(posicao, slice):
+            return [self[i] for i in range(*posicao.indices(len(self.ts)))]
+        return Transacao(TIPOS[self.tipos[posicao]], self.valores[posicao], self.ts[posicao])
+
+    def __iter__(self):
+        for codigo, valor, ts in zip(self.tipos, self.valores, self.ts):
+            yield Transacao(TIPOS[codigo], valor, ts)
+
+    def anexar(self, transacao):
+        codigo = CODIGOS_TIPO[transacao.tipo]
+        saldo = self.saldo_acumulado + SINAIS[codigo] * transacao.valor_centavos
+        # Confere antes de tocar nas colunas: uma falha no meio as deixaria com tamanhos diferentes
+        if not (0 <= transacao.valor_centavos <= MAX_CENTAVOS and -MAX_CENTAVOS <= saldo <= MAX_CENTAVOS):
+            raise OverflowError(f"Valor fora do limite do histórico: {transacao.valor_centavos} centavos")
+        self.ts.append(transacao.ts)
+        self.tipos.append(codigo)
+        self.valores.append(transacao.valor_centavos)
+        self.saldo_acumulado = saldo
+        if len(self.ts) % INTERVALO_SALDOS == 0:
+            self.saldos.append(self.saldo_acumulado)
+
+    def estender(self, transacoes):
+        """Anexa todas as transações ou nenhuma"""
+        anexadas = 0
+        try:
+            for transacao in transacoes:
+                self.anexar(transacao)
+                anexadas += 1
+        except Exception:
+            self.descartar_fim(anexadas)
+            raise
+
+    def copiar(self):
+        copia = HistoricoTransacoes(self.arquivadas, self.saldo_arquivado)
+        copia.ts = array('q', self.ts)
+        copia.tipos = bytearray(self.tipos)
+        copia.valores = array('q', self.valores)
+        copia.saldos = array('q', self.saldos)
+        copia.saldo_acumulado = self.saldo_acumulado
+        return copia
+
+    def saldo_em(self, ts):
+        """Saldo em centavos após todas as transações com timestamp <= ts
+
+        Datas anteriores à parte quente devolvem `saldo_arquivado`: quem tem o
+        arquivo frio consulta o segmento nesse caso.
+        """
+        return self._saldo_apos(bisect_right(self.ts, ts))
+
+    def _saldo_apos(self, n):
+        """Saldo após as n primeiras transações da parte quente"""
+        blocos = n // INTERVALO_SALDOS
+        saldo = self.saldos[blocos - 1] if blocos else self.saldo_arquivado
+        for i in range(blocos * INTERVALO_SALDOS, n):
+            saldo += SINAIS[self.tipos[i]] * self.valores[i]
+        return saldo
+
+    def descartar_inicio(self, n):
+        """Tira da parte quente as n transações mais antigas, já gravadas no arquivo frio"""
+        self.saldo_arquivado = self._saldo_apos(n)
+        self.arquivadas += n
+        self.ts = self.ts[n:]
+        self.tipos = self.tipos[n:]
+        self.valores = self.valores[n:]
+        # Os saldos acumulados são por posição: recalculados a partir do novo início
+        self.saldos = array('q')
+        saldo = self.saldo_arquivado
+        for i, (codigo, valor) in enumerate(zip(self.tipos, self.valores), 1):
+            saldo += SINAIS[codigo] * valor
+            if i % INTERVALO_SALDOS == 0:
+                self.saldos.append(saldo)
+
+    def descartar_fim(self, n):
+        """Desfaz as n últimas anexações (a gravação delas falhou)"""
+        fim = len(self.ts) - n
+        del self.ts[fim:]
+        del self.tipos[fim:]
+        del self.valores[fim:]
+        del self.saldos[fim // INTERVALO_SALDOS:]
+        self.saldo_acumulado = self._saldo_apos(fim)
+
+    def contar(self, tipo, desde, ate):
+        """Quantidade de transações do tipo com timestamp em [desde, ate)"""
+        inicio, fim = bisect_left(self.ts, desde), bisect_left(self.ts, ate)
+        return self.tipos[inicio:fim].count(CODIGOS_TIPO[tipo])
+
+    def para_lista(self):
+        """Lista de dicts no formato dos snapshots JSON"""
+        return [t.para_dict() for t in self]